@@ -0,0 +1 @@
+"""Benchmark harness for the backend (fake upstreams, load generator, reports)."""
@@ -0,0 +1,398 @@
+"""
+Offline accuracy and throughput evaluation.
+
+Runs a labeled JSONL dataset through one or more analysis tiers in batch
+mode, in-process (no HTTP), and reports per category (urgency, threat,
+sensitive_request) precision, recall and false-safe rate together with
+items/sec and latency percentiles. When a baseline report is given,
+accuracy and performance are compared and the process exits non-zero on a
+regression beyond the tolerance.
+
+Dataset lines:
+    {"id": "...", "api_spec": {"endpoint": "/payments", "method": "POST"},
+     "user_intent": "...", "payload": {...},
+     "labels": {"urgency": false, "threat": false, "sensitive_request": true}}
+
+Tiers:
+    rules       safety_service.analyze_request
+    llm         LLMService.analyze_safety; LLM_PROVIDER defaults to replay, so
+                responses must have been recorded first (LLM_REPLAY_MODE=record)
+    classifier  rules plus the classifier model (CLASSIFIER_MODEL_PATH)
+    cascade     classifier, escalating to llm when below CLASSIFIER_CONFIDENCE;
+                the escalation rate is reported
+
+Usage:
+    python -m bench.evaluate --tiers rules --output eval_results.json
+    python -m bench.evaluate --tiers rules,llm --env LLM_REPLAY_PATH=replay/eval.bin \
+        --baseline eval_baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bench.loadgen import percentile
+from bench.run import _git_rev
+
+CATEGORIES = ("urgency", "threat", "sensitive_request")
+DEFAULT_DATASET = Path(__file__).resolve().parent / "data" / "eval_sample.jsonl"
+
+# Evaluated settings; applied before the app modules are imported (see main)
+DEFAULT_ENV = {
+    "LLM_PROVIDER": "replay",
+    "CACHE_ENABLED": "0",  # Measure the tier, not the shared cache
+    "AUDIT_SPOOL_ENABLED": "0",
+}
+
+Verdict = Dict[str, Any]
+Tier = Callable[[Dict[str, Any]], Awaitable[Verdict]]
+
+# name -> factory returning the tier's analyze coroutine function. Factories run
+# only for selected tiers, so unused tiers never import their dependencies.
+TIERS: Dict[str, Callable[[], Tier]] = {}
+
+
+def register_tier(name: str) -> Callable[[Callable[[], Tier]], Callable[[], Tier]]:
+    """Register a tier factory under `name`."""
+    def decorator(factory: Callable[[], Tier]) -> Callable[[], Tier]:
+        TIERS[name] = factory
+        return factory
+    return decorator
+
+
+def _api_spec(item: Dict[str, Any]) -> str:
+    return f"{item['api_spec']['method']} {item['api_spec']['endpoint']}"
+
+
+@register_tier("rules")
+def _rules_tier() -> Tier:
+    from services.safety_service import analyze_request
+
+    async def analyze(item: Dict[str, Any]) -> Verdict:
+        return analyze_request(
+            api_spec=_api_spec(item),
+            user_intent=item["user_intent"],
+            example_payloads=[],
+            constructed_input=item.get("payload") or {}
+        )
+    return analyze
+
+
+@register_tier("llm")
+def _llm_tier() -> Tier:
+    from services.llm_service import get_llm_service
+
+    service = get_llm_service()
+
+    async def analyze(item: Dict[str, Any]) -> Verdict:
+        return await service.analyze_safety(
+            api_spec=_api_spec(item),
+            user_intent=item["user_intent"],
+            example_payloads=[],
+            constructed_input=item.get("payload") or {}
+        )
+    return analyze
+
+
+def _classifier():
+    from services.classifier_service import get_classifier_service
+
+    classifier = get_classifier_service()
+    if classifier is None or classifier.current_model() is None:
+        raise RuntimeError("No classifier model; train one with train_classifier.py")
+    return classifier
+
+
+@register_tier("classifier")
+def _classifier_tier() -> Tier:
+    from services.classifier_service import merge_classification
+
+    classifier = _classifier()
+    rules = _rules_tier()
+
+    async def analyze(item: Dict[str, Any]) -> Verdict:
+        result = classifier.classify(_api_spec(item), item["user_intent"], (item.get("payload") or {}).keys())
+        return merge_classification(await rules(item), result)
+    return analyze
+
+
+@register_tier("cascade")
+def _cascade_tier() -> Tier:
+    classifier = _classifier()
+    combined = _classifier_tier()
+    llm = _llm_tier()
+
+    async def analyze(item: Dict[str, Any]) -> Verdict:
+        result = classifier.classify(_api_spec(item), item["user_intent"], (item.get("payload") or {}).keys())
+        if result.escalate:
+            return {**await llm(item), "escalated": True}
+        return await combined(item)
+    return analyze
+
+
+def load_dataset(path: str) -> List[Dict[str, Any]]:
+    """Read and validate a labeled JSONL dataset."""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            labels = item.get("labels", {})
+            missing = [c for c in CATEGORIES if not isinstance(labels.get(c), bool)]
+            if missing or "api_spec" not in item or "user_intent" not in item:
+                raise ValueError(f"{path}:{line_no}: needs api_spec, user_intent and boolean labels {missing}")
+            item.setdefault("id", f"line-{line_no}")
+            items.append(item)
+    return items
+
+
+async def run_tier(tier: Tier, items: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Analyze every item (up to `concurrency` at a time); returns predictions and timings."""
+    from services.safety_service import get_conservative_verdict
+
+    predictions: List[Optional[Verdict]] = [None] * len(items)
+    latencies_ms: List[float] = [0.0] * len(items)
+    errors = escalations = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors, escalations
+        while next_index < len(items):
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                verdict = await tier(items[i])
+            except Exception as e:
+                # Score a crashed tier the way the app would answer: fail closed
+                print(f"[eval] {items[i]['id']}: {e}", file=sys.stderr)
+                verdict = get_conservative_verdict()
+                verdict["detected_patterns"] = ["analysis_error"]
+            latencies_ms[i] = (time.perf_counter() - started) * 1000
+            if "analysis_error" in verdict.get("detected_patterns", []):
+                errors += 1
+            escalations += bool(verdict.get("escalated"))
+            predictions[i] = verdict
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return {
+        "predictions": predictions, "latencies_ms": latencies_ms, "errors": errors,
+        "escalations": escalations, "elapsed_s": elapsed,
+    }
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def score(items: List[Dict[str, Any]], predictions: List[Verdict], max_ids: int = 20) -> Dict[str, Any]:
+    """
+    Per-category confusion counts, precision, recall and false-safe rate.
+
+    false_safe_rate is the share of positive items the tier called safe for that
+    category (1 - recall); false_safe_ids lists them for keyword tuning. The
+    "any" entry treats an item as unsafe when any category is labeled, and
+    counts it false-safe only when the tier raised no flag at all.
+    """
+    categories: Dict[str, Any] = {}
+    for category in CATEGORIES:
+        tp = fp = fn = tn = 0
+        false_safe_ids = []
+        for item, verdict in zip(items, predictions):
+            label = item["labels"][category]
+            predicted = bool(verdict.get(category, False))
+            if label and predicted:
+                tp += 1
+            elif label:
+                fn += 1
+                false_safe_ids.append(item["id"])
+            elif predicted:
+                fp += 1
+            else:
+                tn += 1
+        categories[category] = {
+            "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+            "precision": _ratio(tp, tp + fp),
+            "recall": _ratio(tp, tp + fn),
+            "false_safe_rate": _ratio(fn, tp + fn),
+            "false_safe_ids": false_safe_ids[:max_ids],
+        }
+
+    unsafe = missed = exact = 0
+    for item, verdict in zip(items, predictions):
+        flags = [bool(verdict.get(c, False)) for c in CATEGORIES]
+        labels = [item["labels"][c] for c in CATEGORIES]
+        exact += flags == labels
+        if any(labels):
+            unsafe += 1
+            missed += not any(flags)
+    categories["any"] = {
+        "unsafe_items": unsafe,
+        "false_safe_rate": _ratio(missed, unsafe),
+        "exact_match": _ratio(exact, len(items)),
+    }
+    return categories
+
+
+def evaluate(tier_name: str, items: List[Dict[str, Any]], concurrency: int, repeat: int) -> Dict[str, Any]:
+    """Run one tier `repeat` times (for stable timings) and summarize."""
+    async def run_all() -> List[Dict[str, Any]]:
+        # One event loop for every pass; SDK clients are bound to the loop they start on
+        tier = TIERS[tier_name]()
+        return [await run_tier(tier, items, concurrency) for _ in range(max(1, repeat))]
+
+    runs = asyncio.run(run_all())
+    latencies = sorted(ms for run in runs for ms in run["latencies_ms"])
+    elapsed = sum(run["elapsed_s"] for run in runs)
+    return {
+        "items": len(items),
+        "errors": runs[-1]["errors"],
+        "escalations": runs[-1]["escalations"],
+        "categories": score(items, runs[-1]["predictions"]),
+        "perf": {
+            "items_per_sec": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 4),
+            "p95_ms": round(percentile(latencies, 95), 4),
+            "p99_ms": round(percentile(latencies, 99), 4),
+            "max_ms": round(latencies[-1], 4) if latencies else 0.0,
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare a report against a baseline.
+    Accuracy may drop (and false-safe rates rise) by `tolerance` in absolute terms;
+    latency and throughput by `tolerance` relative to the baseline.
+    Returns human-readable regression lines (empty when within tolerance).
+    """
+    regressions = []
+    for name, result in report["tiers"].items():
+        base = baseline.get("tiers", {}).get(name)
+        if not base:
+            continue
+        for category in CATEGORIES:
+            now, then = result["categories"][category], base["categories"].get(category, {})
+            for metric in ("precision", "recall"):
+                if then.get(metric) is not None and now[metric] is not None and now[metric] < then[metric] - tolerance:
+                    regressions.append(f"{name} {category} {metric}: {then[metric]:.3f} -> {now[metric]:.3f}")
+            if then.get("false_safe_rate") is not None and now["false_safe_rate"] is not None \
+                    and now["false_safe_rate"] > then["false_safe_rate"] + tolerance:
+                regressions.append(
+                    f"{name} {category} false_safe_rate: {then['false_safe_rate']:.3f} -> {now['false_safe_rate']:.3f}"
+                )
+        now_any, then_any = result["categories"]["any"], base["categories"].get("any", {})
+        if then_any.get("false_safe_rate") is not None and now_any["false_safe_rate"] is not None \
+                and now_any["false_safe_rate"] > then_any["false_safe_rate"] + tolerance:
+            regressions.append(
+                f"{name} any false_safe_rate: {then_any['false_safe_rate']:.3f} -> {now_any['false_safe_rate']:.3f}"
+            )
+        for metric in ("p95_ms", "p99_ms"):
+            if base["perf"][metric] and result["perf"][metric] > base["perf"][metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {base['perf'][metric]:.3f} -> {result['perf'][metric]:.3f}")
+        if base["perf"]["items_per_sec"] and \
+                result["perf"]["items_per_sec"] < base["perf"]["items_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name} items_per_sec: {base['perf']['items_per_sec']:.2f} -> {result['perf']['items_per_sec']:.2f}"
+            )
+    return regressions
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "   -" if value is None else f"{value:.2f}"
+
+
+def print_summary(name: str, result: Dict[str, Any]) -> None:
+    perf = result["perf"]
+    print(
+        f"[eval] {name}: {result['items']} items, {result['errors']} errors, {result['escalations']} escalated, "
+        f"{perf['items_per_sec']:.1f} items/s, p50 {perf['p50_ms']:.3f}ms "
+        f"p95 {perf['p95_ms']:.3f}ms p99 {perf['p99_ms']:.3f}ms"
+    )
+    for category in CATEGORIES:
+        c = result["categories"][category]
+        print(
+            f"       {category:<18} precision {_fmt(c['precision'])}  recall {_fmt(c['recall'])}  "
+            f"false-safe {_fmt(c['false_safe_rate'])}  (tp {c['tp']} fp {c['fp']} fn {c['fn']})"
+        )
+    overall = result["categories"]["any"]
+    print(f"       {'any':<18} false-safe {_fmt(overall['false_safe_rate'])}  exact {_fmt(overall['exact_match'])}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate analysis tiers against a labeled dataset")
+    parser.add_argument("--dataset", default=str(DEFAULT_DATASET), help="Labeled JSONL dataset")
+    parser.add_argument("--tiers", default="rules", help="Comma-separated tier names")
+    parser.add_argument("--concurrency", type=int, default=8, help="Items in flight per tier")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the dataset per tier (timings only)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Allowed accuracy drop (absolute) and latency/throughput regression (relative)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="App setting for the evaluated tiers (repeatable)")
+    parser.add_argument("--verbose", action="store_true", help="Show the tiers' own logging")
+    args = parser.parse_args()
+
+    # Settings are read when config is first imported, which the tier factories do lazily
+    env = {**DEFAULT_ENV, **dict(item.split("=", 1) for item in args.env)}
+    os.environ.update(env)
+
+    tiers = [t.strip() for t in args.tiers.split(",") if t.strip()]
+    unknown = [t for t in tiers if t not in TIERS]
+    if unknown:
+        parser.error(f"Unknown tier(s): {', '.join(unknown)}; available: {', '.join(sorted(TIERS))}")
+
+    items = load_dataset(args.dataset)
+    report: Dict[str, Any] = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "dataset": args.dataset,
+            "items": len(items),
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "env": env,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "tiers": {},
+    }
+
+    for name in tiers:
+        print(f"[eval] {name}: {len(items)} items x {args.repeat}, concurrency {args.concurrency}...", flush=True)
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            result = evaluate(name, items, args.concurrency, args.repeat)
+        report["tiers"][name] = result
+        print_summary(name, result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[eval] Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("[eval] Regressions beyond tolerance:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("[eval] No regressions beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Fake upstream servers for benchmarking.
+
+A single FastAPI app that stands in for the OpenAI chat completions API,
+the Gemini generateContent REST API and Supabase's PostgREST endpoint.
+Each upstream has configurable latency, jitter and error injection so the
+backend can be load-tested without keys, network access or a database.
+
+Run standalone:
+    python -m bench.fakes --port 8900 --llm-latency-ms 300 --llm-error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+THREAT_WORDS = ("exploit", "attack", "breach", "hack", "injection", "bypass", "malicious")
+SENSITIVE_WORDS = ("card_number", "cvv", "ssn", "password", "secret", "api_key", "token")
+URGENCY_WORDS = ("urgent", "immediate", "asap", "emergency", "critical")
+# Streamed responses: share of the latency spent before the first chunk, and chunk size
+STREAM_FIRST_CHUNK_SHARE = 0.2
+STREAM_CHUNK_CHARS = 16
+
+
+@dataclass
+class FakeConfig:
+    """Latency and fault injection knobs for the fake upstreams."""
+    llm_latency_ms: float = 250.0
+    llm_jitter_ms: float = 50.0
+    llm_error_rate: float = 0.0
+    llm_throttle_rate: float = 0.0
+    db_latency_ms: float = 20.0
+    db_jitter_ms: float = 5.0
+    db_error_rate: float = 0.0
+    seed: int = 0
+
+
+def _fake_verdict(prompt: str) -> Dict[str, Any]:
+    """Deterministic verdict derived from keywords in the prompt."""
+    text = prompt.lower()
+    threat = any(w in text for w in THREAT_WORDS)
+    sensitive = any(w in text for w in SENSITIVE_WORDS)
+    urgency = any(w in text for w in URGENCY_WORDS)
+    score = 9 if threat else 6 if sensitive else 4 if urgency else 2
+    return {
+        "urgency": urgency,
+        "threat": threat,
+        "sensitive_request": sensitive,
+        "explanation": "Synthetic verdict from bench fake LLM.",
+        "risk_score": score,
+        "recommendations": ["Review before executing"] if score > 4 else [],
+        "detected_patterns": [w for w in THREAT_WORDS + SENSITIVE_WORDS if w in text]
+    }
+
+
+def _fake_ui_suggestion(prompt: str) -> Dict[str, Any]:
+    """Deterministic UI suggestion payload."""
+    locked = '"threat": true' in prompt.lower()
+    return {
+        "suggested_components": ["EndpointList", "SafetyInspector"] if locked
+        else ["EndpointList", "RequestBuilder", "ResponseViewer"],
+        "component_configs": {},
+        "warnings": ["Threat detected"] if locked else [],
+        "field_restrictions": {"execute_requests": not locked}
+    }
+
+
+def _completion_text(prompt: str) -> str:
+    if "suggest appropriate UI components" in prompt:
+        return json.dumps(_fake_ui_suggestion(prompt))
+    return json.dumps(_fake_verdict(prompt))
+
+
+def create_fake_app(config: FakeConfig) -> FastAPI:
+    """Build the fake upstream app for the given configuration."""
+    app = FastAPI(title="bench-fakes")
+    rng = random.Random(config.seed)
+    stats = {"llm_calls": 0, "llm_errors": 0, "db_calls": 0, "db_errors": 0}
+
+    async def _delay(base_ms: float, jitter_ms: float) -> None:
+        delay = max(0.0, base_ms + rng.uniform(-jitter_ms, jitter_ms))
+        await asyncio.sleep(delay / 1000)
+
+    def _llm_fault() -> Optional[JSONResponse]:
+        roll = rng.random()
+        if roll < config.llm_throttle_rate:
+            stats["llm_errors"] += 1
+            return JSONResponse(status_code=429, content={"error": {"message": "rate limited"}})
+        if roll < config.llm_throttle_rate + config.llm_error_rate:
+            stats["llm_errors"] += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "injected failure"}})
+        return None
+
+    async def _sse(text: str, wrap) -> Any:
+        """Server-sent events carrying `text` in chunks, spread over the configured latency."""
+        pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        total_ms = max(0.0, config.llm_latency_ms + rng.uniform(-config.llm_jitter_ms, config.llm_jitter_ms))
+        await asyncio.sleep(total_ms * STREAM_FIRST_CHUNK_SHARE / 1000)
+        gap_s = total_ms * (1 - STREAM_FIRST_CHUNK_SHARE) / 1000 / max(1, len(pieces))
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(gap_s)
+            yield f"data: {json.dumps(wrap(piece, index == len(pieces) - 1))}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        stats["llm_calls"] += 1
+        fault = _llm_fault()
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        if body.get("stream") and not fault:
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+            def wrap(piece: str, last: bool) -> Dict[str, Any]:
+                return {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": "stop" if last else None}]
+                }
+
+            async def events():
+                async for event in _sse(_completion_text(prompt), wrap):
+                    yield event
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await _delay(config.llm_latency_ms, config.llm_jitter_ms)
+        if fault:
+            return fault
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": _completion_text(prompt)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 64, "total_tokens": len(prompt) // 4 + 64}
+        }
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate(model: str, request: Request):
+        body = await request.json()
+        stats["llm_calls"] += 1
+        await _delay(config.llm_latency_ms, config.llm_jitter_ms)
+        fault = _llm_fault()
+        if fault:
+            return fault
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": _completion_text(prompt)}], "role": "model"},
+                "finishReason": 1,
+                "index": 0
+            }]
+        }
+
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def gemini_stream(model: str, request: Request):
+        body = await request.json()
+        stats["llm_calls"] += 1
+        fault = _llm_fault()
+        if fault:
+            await _delay(config.llm_latency_ms * STREAM_FIRST_CHUNK_SHARE, 0)
+            return fault
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+        )
+
+        def wrap(piece: str, last: bool) -> Dict[str, Any]:
+            candidate = {"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}
+            if last:
+                candidate["finishReason"] = 1
+            return {"candidates": [candidate]}
+
+        return StreamingResponse(_sse(_completion_text(prompt), wrap), media_type="text/event-stream")
+
+    @app.post("/rest/v1/{table}")
+    async def postgrest_insert(table: str, request: Request):
+        body = await request.json()
+        stats["db_calls"] += 1
+        await _delay(config.db_latency_ms, config.db_jitter_ms)
+        if rng.random() < config.db_error_rate:
+            stats["db_errors"] += 1
+            return JSONResponse(status_code=503, content={"message": "injected failure"})
+        rows: List[Dict[str, Any]] = body if isinstance(body, list) else [body]
+        return JSONResponse(
+            status_code=201,
+            content=[{"id": row.get("id") or str(uuid.uuid4()), **row} for row in rows]
+        )
+
+    @app.get("/rest/v1/{table}")
+    async def postgrest_select(table: str):
+        stats["db_calls"] += 1
+        await _delay(config.db_latency_ms, config.db_jitter_ms)
+        return []
+
+    @app.get("/_stats")
+    async def fake_stats():
+        return {"config": asdict(config), **stats}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run fake OpenAI/Gemini/PostgREST upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    for field, default in asdict(FakeConfig()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    config = FakeConfig(**{f: getattr(args, f) for f in asdict(FakeConfig())})
+
+    import uvicorn
+    uvicorn.run(create_fake_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Closed-loop load generator for the backend endpoints.
+
+Workers pull requests from a deterministic workload mix and record
+per-endpoint latencies; summaries report throughput and percentiles.
+"""
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+INTENTS = [
+    "Explore a payments API",
+    "List users for the admin dashboard",
+    "Urgent: refund the last transaction now",
+    "Try an injection attack against the search endpoint",
+    "Update my password and api_key",
+    "Fetch the weather forecast",
+    "Bypass the rate limit to export all records",
+    "Check order status",
+]
+
+SPECS = [
+    {"endpoint": "/payments", "method": "POST"},
+    {"endpoint": "/users", "method": "GET"},
+    {"endpoint": "/users/{id}/password", "method": "PUT"},
+    {"endpoint": "/search", "method": "GET"},
+    {"endpoint": "/orders/{id}", "method": "GET"},
+    {"endpoint": "/cards/card_number", "method": "POST"},
+]
+
+# Share of /analyze-api requests in each mode; the remainder go to /generate-ui-plan.
+# In "mixed" mode half the UI plan requests omit api_spec and take the rules path.
+MODES = {
+    "rules": {"local_mode": True, "analyze_share": 0.7, "ui_rules_share": 1.0},
+    "llm": {"local_mode": False, "analyze_share": 0.7, "ui_rules_share": 0.0},
+    "mixed": {"local_mode": False, "analyze_share": 0.5, "ui_rules_share": 0.5},
+}
+
+
+def build_request(mode: str, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    """Pick the next (path, json body) for a mode."""
+    profile = MODES[mode]
+    spec = rng.choice(SPECS)
+    intent = rng.choice(INTENTS)
+
+    if rng.random() < profile["analyze_share"]:
+        return "/analyze-api", {"api_spec": spec, "user_intent": intent}
+
+    body: Dict[str, Any] = {
+        "urgency": "urgent" in intent.lower(),
+        "threat": rng.random() < 0.2,
+        "sensitive_request": rng.random() < 0.4,
+    }
+    if rng.random() >= profile["ui_rules_share"]:
+        body["api_spec"] = f"{spec['method']} {spec['endpoint']}"
+    return "/generate-ui-plan", body
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class EndpointStats:
+    """Latency samples and error counts for one endpoint."""
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_counts: Dict[int, int] = field(default_factory=dict)
+
+    def summary(self, elapsed_s: float) -> Dict[str, Any]:
+        values = sorted(self.latencies_ms)
+        count = len(values)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "status_counts": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "throughput_rps": round(count / elapsed_s, 2) if elapsed_s else 0.0,
+            "mean_ms": round(sum(values) / count, 3) if count else 0.0,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+
+
+async def run_load(
+    base_url: str,
+    mode: str,
+    concurrency: int,
+    duration_s: float,
+    warmup_s: float = 1.0,
+    seed: int = 0,
+    timeout_s: float = 30.0,
+) -> Dict[str, Any]:
+    """
+    Drive closed-loop load against base_url and return a summary dict.
+    Requests completing during the warmup window are not recorded.
+    """
+    rng = random.Random(seed)
+    stats: Dict[str, EndpointStats] = {}
+    start = time.perf_counter()
+    record_from = start + warmup_s
+    stop_at = record_from + duration_s
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout_s, limits=limits) as client:
+
+        async def worker() -> None:
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    return
+                path, body = build_request(mode, rng)
+                sent = time.perf_counter()
+                status = 0
+                try:
+                    response = await client.post(path, json=body)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = -1
+                done = time.perf_counter()
+                if sent < record_from:
+                    continue
+                entry = stats.setdefault(path, EndpointStats())
+                entry.latencies_ms.append((done - sent) * 1000)
+                entry.status_counts[status] = entry.status_counts.get(status, 0) + 1
+                if status != 200:
+                    entry.errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    elapsed = max(time.perf_counter() - record_from, 1e-9)
+    overall = EndpointStats()
+    for entry in stats.values():
+        overall.latencies_ms.extend(entry.latencies_ms)
+        overall.errors += entry.errors
+        for code, n in entry.status_counts.items():
+            overall.status_counts[code] = overall.status_counts.get(code, 0) + n
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": overall.summary(elapsed),
+        "endpoints": {path: entry.summary(elapsed) for path, entry in sorted(stats.items())},
+    }
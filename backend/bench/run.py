@@ -0,0 +1,246 @@
+"""
+Benchmark runner.
+
+Starts the fake upstreams and the FastAPI app (as separate processes),
+drives load in each requested mode and writes a JSON report. When a
+baseline report is given, p50/p95/p99 and throughput are compared and the
+process exits non-zero on a regression beyond the tolerance.
+
+Usage:
+    python -m bench.run --modes rules,llm,mixed --concurrency 32 --duration 20 \
+        --output bench_results.json --baseline bench_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.fakes import FakeConfig
+from bench.loadgen import MODES, run_load
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout_s: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _start_fakes(port: int, config: FakeConfig) -> subprocess.Popen:
+    args = [sys.executable, "-m", "bench.fakes", "--port", str(port)]
+    for key, value in asdict(config).items():
+        args += [f"--{key.replace('_', '-')}", str(value)]
+    proc = subprocess.Popen(args, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _wait_ready(f"http://127.0.0.1:{port}/_stats")
+    return proc
+
+
+def _start_app(
+    port: int, fakes_url: str, mode: str, provider: str, workers: int, extra_env: Dict[str, str]
+) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LOCAL_MODE": "1" if MODES[mode]["local_mode"] else "0",
+        "LLM_PROVIDER": provider,
+        "LLM_MODEL": "gpt-4o-mini" if provider == "openai" else "gemini-1.5-flash",
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{fakes_url}/v1",
+        "GEMINI_API_KEY": "bench-key",
+        "GEMINI_API_ENDPOINT": fakes_url,
+        "SUPABASE_URL": fakes_url,
+        "SUPABASE_KEY": "bench-key",
+        # Fresh shared cache per run so modes don't warm each other
+        "CACHE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-cache-"), "cache.sqlite3"),
+        "AUDIT_SPOOL_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-spool-"), "spool.sqlite3"),
+        "WEB_CONCURRENCY": str(workers),
+        "ALLOW_PER_WORKER_STATE": "1",  # Load generators are the only clients
+        "AUDIT_API_KEY": "bench-key",
+        **extra_env,
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    _wait_ready(f"http://127.0.0.1:{port}/openapi.json")
+    return proc
+
+
+def _tree_rss_bytes(root_pid: int) -> Optional[int]:
+    """Total RSS of a process and its direct children (Linux /proc only)."""
+    try:
+        pids = [root_pid]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == root_pid:
+                        pids.append(int(entry))
+        total = 0
+        for pid in pids:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        return total
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare a report against a baseline.
+    Returns human-readable regression lines (empty when within tolerance).
+    """
+    regressions = []
+    for mode, result in report["modes"].items():
+        base_mode = baseline.get("modes", {}).get(mode)
+        if not base_mode:
+            continue
+        for path, summary in result["endpoints"].items():
+            base = base_mode["endpoints"].get(path)
+            if not base:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if base[metric] and summary[metric] > base[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{mode} {path} {metric}: {base[metric]:.2f} -> {summary[metric]:.2f}"
+                    )
+            if base["throughput_rps"] and summary["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{mode} {path} throughput_rps: {base['throughput_rps']:.2f} -> {summary['throughput_rps']:.2f}"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /analyze-api and /generate-ui-plan")
+    parser.add_argument("--modes", default="rules,llm,mixed", help="Comma-separated: rules, llm, mixed")
+    parser.add_argument("--provider", default="openai", choices=["openai", "gemini"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per mode")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unrecorded seconds per mode")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the app process (repeatable)")
+    # Fake upstream knobs; --seed also seeds the workload mix
+    for key, default in asdict(FakeConfig()).items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"Unknown mode(s): {', '.join(unknown)}")
+
+    fake_config = FakeConfig(**{k: getattr(args, k) for k in asdict(FakeConfig())})
+    extra_env = dict(item.split("=", 1) for item in args.app_env)
+
+    fakes_port = _free_port()
+    fakes_url = f"http://127.0.0.1:{fakes_port}"
+    report: Dict[str, Any] = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "provider": args.provider,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "fakes": asdict(fake_config),
+            "app_env": extra_env,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "modes": {},
+    }
+
+    fakes = _start_fakes(fakes_port, fake_config)
+    try:
+        for mode in modes:
+            app_port = _free_port()
+            app = _start_app(app_port, fakes_url, mode, args.provider, args.workers, extra_env)
+            try:
+                print(f"[bench] {mode}: {args.concurrency} workers for {args.duration:.0f}s...", flush=True)
+                result = asyncio.run(run_load(
+                    f"http://127.0.0.1:{app_port}", mode, args.concurrency,
+                    args.duration, warmup_s=args.warmup, seed=args.seed,
+                ))
+                result["app_metrics"] = httpx.get(
+                    f"http://127.0.0.1:{app_port}/metrics", headers={"X-Audit-Key": "bench-key"}
+                ).json()
+                result["app_rss_bytes"] = _tree_rss_bytes(app.pid)
+                report["modes"][mode] = result
+                overall = result["overall"]
+                print(
+                    f"[bench] {mode}: {overall['throughput_rps']} req/s "
+                    f"p50={overall['p50_ms']}ms p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms "
+                    f"errors={overall['errors']} "
+                    f"cache_hit_rate={result['app_metrics']['cache'].get('hit_rate', '-')}",
+                    flush=True,
+                )
+            finally:
+                _stop(app)
+        report["upstream"] = httpx.get(f"{fakes_url}/_stats").json()
+    finally:
+        _stop(fakes)
+
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"[bench] Report written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"[bench] Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("[bench] No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Cold-start report and import-time budget check.
+
+Imports `main` in fresh interpreters with `-X importtime`, reports the
+slowest modules and which provider/storage SDKs were loaded, and measures
+process-start-to-ready time under uvicorn. Exits non-zero when the import
+budget is exceeded or a forbidden SDK is imported, so it can gate CI.
+
+Usage:
+    python -m bench.startup                      # rules-only worker (LOCAL_MODE=1)
+    python -m bench.startup --budget-ms 600 --runs 5 --output startup.json
+    python -m bench.startup --local-mode 0 --forbid ""
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from bench.run import BACKEND_DIR, _free_port, _stop, _wait_ready
+
+# SDKs a rules-only worker should never import
+DEFAULT_FORBIDDEN = "openai,supabase,postgrest,google.generativeai"
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _import_profile(env: Dict[str, str]) -> Dict[str, Any]:
+    """Import main in a fresh interpreter and parse -X importtime output."""
+    probe = "import sys, json, main; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    modules: Dict[str, Dict[str, int]] = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules[name] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"main_us": modules.get("main", {}).get("cumulative_us", 0), "modules": modules, "loaded": loaded}
+
+
+def _boot_to_ready_ms(env: Dict[str, str]) -> float:
+    """Wall time from spawning uvicorn until the app answers HTTP."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/openapi.json")
+        return (time.perf_counter() - started) * 1000
+    finally:
+        _stop(proc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report backend cold-start and import time")
+    parser.add_argument("--local-mode", default="1", choices=["0", "1"])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if median import of main exceeds this")
+    parser.add_argument("--forbid", default=None,
+                        help=f"Comma-separated modules that must not be imported (default for LOCAL_MODE=1: {DEFAULT_FORBIDDEN})")
+    parser.add_argument("--skip-boot", action="store_true", help="Only measure imports")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    env = {**os.environ, "LOCAL_MODE": args.local_mode}
+    forbid_arg = args.forbid if args.forbid is not None else (DEFAULT_FORBIDDEN if args.local_mode == "1" else "")
+    forbidden = [m.strip() for m in forbid_arg.split(",") if m.strip()]
+
+    profiles = [_import_profile(env) for _ in range(max(1, args.runs))]
+    import_ms = [p["main_us"] / 1000 for p in profiles]
+    median_import_ms = statistics.median(import_ms)
+
+    # Slowest modules by self time, from the fastest (least noisy) run
+    fastest = min(profiles, key=lambda p: p["main_us"])
+    top: List[Dict[str, Any]] = sorted(
+        ({"module": name, "self_ms": v["self_us"] / 1000, "cumulative_ms": v["cumulative_us"] / 1000}
+         for name, v in fastest["modules"].items()),
+        key=lambda row: row["self_ms"], reverse=True,
+    )[:args.top]
+
+    loaded_forbidden = sorted({
+        name for name in fastest["loaded"]
+        for root in forbidden if name == root or name.startswith(root + ".")
+    })
+
+    report: Dict[str, Any] = {
+        "local_mode": args.local_mode,
+        "import_main_ms": {"median": round(median_import_ms, 1), "runs": [round(v, 1) for v in import_ms]},
+        "modules_loaded": len(fastest["loaded"]),
+        "slowest_modules": top,
+        "forbidden_loaded": loaded_forbidden,
+    }
+    if not args.skip_boot:
+        report["boot_to_ready_ms"] = round(_boot_to_ready_ms(env), 1)
+
+    print(f"[startup] LOCAL_MODE={args.local_mode} import main: {median_import_ms:.1f}ms median of {len(import_ms)}")
+    if "boot_to_ready_ms" in report:
+        print(f"[startup] uvicorn spawn to first response: {report['boot_to_ready_ms']:.1f}ms")
+    print(f"[startup] {report['modules_loaded']} modules loaded; slowest (self time):")
+    for row in top:
+        print(f"  {row['self_ms']:8.1f}ms  {row['module']}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    failures = []
+    if loaded_forbidden:
+        failures.append(f"forbidden modules imported: {', '.join(loaded_forbidden[:10])}")
+    if args.budget_ms is not None and median_import_ms > args.budget_ms:
+        failures.append(f"import of main took {median_import_ms:.1f}ms, budget {args.budget_ms:.1f}ms")
+    for failure in failures:
+        print(f"[startup] FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,14 +16,94 @@ class Settings:
     LOCAL_MODE = int(os.getenv("LOCAL_MODE", 1)) == 1
     
     # LLM Configuration
-    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")  # "openai" or "gemini"
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")  # "openai", "gemini" or "replay"
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")  # Default model
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # Optional override (proxies, bench fakes)
+    GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")  # Optional override, uses REST transport
+
+    # Replay provider (LLM_PROVIDER=replay)
+    LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", "replay/llm_replay.bin")
+    LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "replay")  # "replay" or "record"
+    LLM_REPLAY_UPSTREAM = os.getenv("LLM_REPLAY_UPSTREAM", "openai")  # Provider to record from
+    LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", 1.0))  # 0 disables delays
     
     # Server
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", 8000))
+    WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))  # >1 runs multiple worker processes, no reload
+    # Sessions, supersede keys, client buckets and abuse counts live in each worker;
+    # WORKERS>1 refuses to start until this acknowledges it (see README, Multi-worker)
+    ALLOW_PER_WORKER_STATE = int(os.getenv("ALLOW_PER_WORKER_STATE", 0)) == 1
+    RELOAD = int(os.getenv("RELOAD", 1)) == 1  # Dev auto-reload (single worker only)
+    # Proxies whose X-Forwarded-For is trusted for the client IP ("*" behind a platform router)
+    FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    # Shared cache (SQLite WAL file shared by all workers on a host)
+    CACHE_ENABLED = int(os.getenv("CACHE_ENABLED", 1)) == 1
+    CACHE_PATH = os.getenv("CACHE_PATH", "cache/shared_cache.sqlite3")
+    CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 3600))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 50000))
+
+    # LLM admission control (per worker process)
+    ADMISSION_ENABLED = int(os.getenv("ADMISSION_ENABLED", 1)) == 1
+    CLIENT_RATE_PER_SEC = float(os.getenv("CLIENT_RATE_PER_SEC", 2.0))  # Sustained LLM calls per client
+    CLIENT_BURST = float(os.getenv("CLIENT_BURST", 10))
+    ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))  # Tracked token buckets
+    LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", 8))
+    LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", 1))
+    LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", 64))
+    LLM_LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", 2.0))  # x baseline before backing off
+
+    # LLM priority scheduler (classes: interactive, background, replay)
+    SCHED_WEIGHTS = os.getenv("SCHED_WEIGHTS", "interactive=8,background=2,replay=1")
+    SCHED_MAX_WAIT_MS = os.getenv("SCHED_MAX_WAIT_MS", "interactive=2000,background=30000,replay=30000")
+    SCHED_STARVATION_MS = int(os.getenv("SCHED_STARVATION_MS", 5000))  # Oldest waiter served after this
+
+    # Abuse detection in SafetyMiddleware (per worker process, fixed memory)
+    ABUSE_DETECTION_ENABLED = int(os.getenv("ABUSE_DETECTION_ENABLED", 1)) == 1
+    ABUSE_WINDOW_SECONDS = float(os.getenv("ABUSE_WINDOW_SECONDS", 60))
+    ABUSE_SKETCH_WIDTH = int(os.getenv("ABUSE_SKETCH_WIDTH", 8192))  # Counters per row (power of two); overcount ~ events per window / width
+    ABUSE_SKETCH_DEPTH = int(os.getenv("ABUSE_SKETCH_DEPTH", 4))
+    ABUSE_CLIENT_MAX_REQUESTS = int(os.getenv("ABUSE_CLIENT_MAX_REQUESTS", 600))  # Per client IP per window
+    ABUSE_ENDPOINT_MAX_REQUESTS = int(os.getenv("ABUSE_ENDPOINT_MAX_REQUESTS", 20000))  # Per path, all clients
+    ABUSE_SCAN_DISTINCT_PATHS = int(os.getenv("ABUSE_SCAN_DISTINCT_PATHS", 40))  # Per client IP per window
+    ABUSE_SCAN_NOT_FOUND = int(os.getenv("ABUSE_SCAN_NOT_FOUND", 20))  # 404/405 responses per client IP per window
+    ABUSE_HEAVY_HITTERS = int(os.getenv("ABUSE_HEAVY_HITTERS", 32))  # Top clients/paths tracked for /metrics
+
+    # Local classifier tier (hashed n-gram linear model; see train_classifier.py)
+    CLASSIFIER_ENABLED = int(os.getenv("CLASSIFIER_ENABLED", 1)) == 1  # Only used once the model file exists
+    CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", "models/safety_classifier.npz")
+    CLASSIFIER_CONFIDENCE = float(os.getenv("CLASSIFIER_CONFIDENCE", 0.9))  # Below this, escalate to the LLM
+    CLASSIFIER_RELOAD_SECONDS = float(os.getenv("CLASSIFIER_RELOAD_SECONDS", 5))  # Model file mtime check interval
+
+    # Request body limits, enforced while the body streams in (see middleware/body_limit_middleware.py)
+    BODY_LIMITS_KB = os.getenv("BODY_LIMITS_KB", "/analyze-api=1024,/analyze-api/stream=1024,/generate-ui-plan=256,*=1024")  # "*" = other routes
+    ANALYZE_SCAN_MAX_MB = float(os.getenv("ANALYZE_SCAN_MAX_MB", 1))  # Oversized analysis bodies are scanned up to this
+    ANALYZE_SCAN_MAX_SECONDS = float(os.getenv("ANALYZE_SCAN_MAX_SECONDS", 0.5))  # Wall-clock budget per scan
+    ANALYZE_SCAN_MAX_VALUE_KB = int(os.getenv("ANALYZE_SCAN_MAX_VALUE_KB", 4096))  # Longest single JSON value scanned
+
+    # Request tracing and profiling (off by default; see services/trace_service.py)
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.0))  # Share of requests (and audit shipments) traced
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces/spans.otlp.jsonl")  # OTLP/JSON, one trace per line
+    TRACE_EXPORT_MAX_MB = float(os.getenv("TRACE_EXPORT_MAX_MB", 64))  # Rotated to <path>.1 beyond this
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))  # Share of requests profiled (and traced)
+    PROFILE_HEADER_KEY = os.getenv("PROFILE_HEADER_KEY")  # When set, X-Profile: <key> profiles that request
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))  # Oldest .prof files beyond this are deleted
+
+    # Streaming analysis: lock the UI down as soon as the LLM reports this risk_score (or threat)
+    STREAM_LOCKDOWN_RISK = int(os.getenv("STREAM_LOCKDOWN_RISK", 8))
+
+    # Explorer WebSocket (/ws/explore)
+    WS_DEBOUNCE_MS = int(os.getenv("WS_DEBOUNCE_MS", 400))  # Input must settle this long before an LLM call
+    WS_MAX_MESSAGE_CHARS = int(os.getenv("WS_MAX_MESSAGE_CHARS", 65536))
+
+    # Chat sessions (per worker process)
+    SESSION_MAX = int(os.getenv("SESSION_MAX", 5000))
+    SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", 1800))
+    SESSION_CONTEXT_TURNS = int(os.getenv("SESSION_CONTEXT_TURNS", 4))  # Prior messages summarized for the LLM
     
     # CORS
     CORS_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -35,5 +115,16 @@ class Settings:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+    AUDIT_API_KEY = os.getenv("AUDIT_API_KEY")  # /audit/* and /metrics require it in X-Audit-Key; disabled (503) when unset
+
+    # Audit spool (local SQLite WAL buffer, shipped to Supabase in the background)
+    AUDIT_SPOOL_ENABLED = int(os.getenv("AUDIT_SPOOL_ENABLED", 1)) == 1
+    AUDIT_SPOOL_PATH = os.getenv("AUDIT_SPOOL_PATH", "spool/audit_spool.sqlite3")
+    AUDIT_SPOOL_FLUSH_MS = int(os.getenv("AUDIT_SPOOL_FLUSH_MS", 50))  # fsync batching window
+    AUDIT_SPOOL_SHIP_BATCH = int(os.getenv("AUDIT_SPOOL_SHIP_BATCH", 500))
+    AUDIT_SPOOL_MAX_MB = int(os.getenv("AUDIT_SPOOL_MAX_MB", 256))
+    AUDIT_SPOOL_RETENTION_HOURS = float(os.getenv("AUDIT_SPOOL_RETENTION_HOURS", 24))  # Shipped rows kept locally
+    AUDIT_SPOOL_MAX_PENDING = int(os.getenv("AUDIT_SPOOL_MAX_PENDING", 50000))  # Records queued in memory before the oldest are dropped
+
 
 settings = Settings()
@@ -1,9 +1,13 @@
-from fastapi import Request
+import hmac
 
+from fastapi import HTTPException
+from fastapi.requests import HTTPConnection
+
+from config import settings
 from services.analyzer import Analyzer
 
 
-def get_analyzer(request: Request) -> Analyzer:
+def get_analyzer(request: HTTPConnection) -> Analyzer:
     """
     Get analyzer instance from app state.
     Used as a dependency in route handlers.
@@ -11,8 +15,19 @@ def get_analyzer(request: Request) -> Analyzer:
     return request.app.state.analyzer
 
 
-def get_settings(request: Request):
+def get_settings(request: HTTPConnection):
     """
     Get app settings from app state.
     """
     return request.app.state.settings
+
+
+def require_audit_key(request: HTTPConnection) -> None:
+    """
+    Require AUDIT_API_KEY in the X-Audit-Key header (/audit/* and /metrics).
+    The endpoints are off until a key is set.
+    """
+    if not settings.AUDIT_API_KEY:
+        raise HTTPException(status_code=503, detail="Disabled: AUDIT_API_KEY is not set")
+    if not hmac.compare_digest(request.headers.get("x-audit-key", "").encode(), settings.AUDIT_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Audit-Key")
@@ -1,16 +1,46 @@
+import time
 from contextlib import asynccontextmanager
+
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
 
 from config import settings
-from middleware import setup_cors, LoggingMiddleware, ErrorMiddleware, SafetyMiddleware
-from routers import analyze_api_router, ui_plan_router
+from middleware import setup_cors, LoggingMiddleware, ErrorMiddleware, SafetyMiddleware, TracingMiddleware, BodyLimitMiddleware
+from routers import analyze_api_router, ui_plan_router, metrics_router, audit_router, explore_ws_router
+from services.analyzer import Analyzer
+from services.audit_spool import get_audit_spool, close_audit_spool
+
+
+PER_WORKER_STATE = (
+    "chat sessions (session_id), X-Supersede-Key, per-client LLM token buckets and abuse detection "
+    "are kept per worker process"
+)
+
+
+def check_worker_mode() -> None:
+    """Refuse several workers unless per-worker state has been acknowledged."""
+    if settings.WORKERS > 1 and not settings.ALLOW_PER_WORKER_STATE:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={settings.WORKERS}, but {PER_WORKER_STATE}: a client spread across workers "
+            "escapes the session ratchet, supersede and per-client limits. Run one worker, or set "
+            "ALLOW_PER_WORKER_STATE=1 to accept that."
+        )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
-    print("Policy-Aware AI API Explorer started")
+    check_worker_mode()
+    get_audit_spool()  # Start the writer/shipper threads before the first request
+    app.state.settings = settings
+    app.state.analyzer = Analyzer()
+    warmup_ms = app.state.analyzer.warmup()
+    print(f"[Analyzer] Warmed up: {', '.join(f'{stage} {ms:.0f}ms' for stage, ms in warmup_ms.items())}")
+    startup_ms = (time.perf_counter() - _IMPORT_STARTED) * 1000
+    print(f"Policy-Aware AI API Explorer started in {startup_ms:.0f}ms")
     yield
+    close_audit_spool()
     print("Policy-Aware AI API Explorer stopped")
 
 
@@ -22,16 +52,34 @@ app = FastAPI(
 )
 
 # Middleware
+app.add_middleware(BodyLimitMiddleware)  # Innermost: rejections still get CORS headers, logging and abuse counts
 setup_cors(app)
 app.add_middleware(ErrorMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(SafetyMiddleware)
+app.add_middleware(TracingMiddleware)  # Outermost: traces span the whole stack
 
-# Routes
+# Routes. Routers are imported eagerly because FastAPI builds the route table at
+# include time; they are thin and their SDK-backed services import lazily on first
+# use, which tests/test_startup.py enforces.
 app.include_router(analyze_api_router)
 app.include_router(ui_plan_router)
+app.include_router(metrics_router)
+app.include_router(audit_router)
+app.include_router(explore_ws_router)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host=settings.HOST, port=settings.PORT, reload=True, access_log=True)
+    check_worker_mode()
+    if settings.WORKERS > 1:
+        # Multi-worker mode; only the cache tier is shared between workers
+        uvicorn.run(
+            "main:app", host=settings.HOST, port=settings.PORT, workers=settings.WORKERS, access_log=True,
+            proxy_headers=True, forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
+        )
+    else:
+        uvicorn.run(
+            "main:app", host=settings.HOST, port=settings.PORT, reload=settings.RELOAD, access_log=True,
+            proxy_headers=True, forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
+        )
@@ -2,5 +2,7 @@ from middleware.cors import setup_cors
 from middleware.logging_middleware import LoggingMiddleware
 from middleware.error_middleware import ErrorMiddleware
 from middleware.safety_middleware import SafetyMiddleware
+from middleware.tracing_middleware import TracingMiddleware
+from middleware.body_limit_middleware import BodyLimitMiddleware
 
-__all__ = ["setup_cors", "LoggingMiddleware", "ErrorMiddleware", "SafetyMiddleware"]
+__all__ = ["setup_cors", "LoggingMiddleware", "ErrorMiddleware", "SafetyMiddleware", "TracingMiddleware", "BodyLimitMiddleware"]
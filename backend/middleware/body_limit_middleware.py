@@ -0,0 +1,206 @@
+"""
+Body Limit Middleware - Per-route request body limits, enforced as the body arrives.
+
+Limits come from BODY_LIMITS_KB ("/path=KB,...", with "*" for every other
+path). A request whose Content-Length is over its limit is answered before
+any of the body is read. A body sent without Content-Length (chunked) is
+counted as it streams and cut off once it passes the limit.
+
+Over-limit bodies on the analysis routes are not simply dropped. The body
+is scanned incrementally by services/request_scan.py, without building the
+document. Scanning stops at ANALYZE_SCAN_MAX_MB or after
+ANALYZE_SCAN_MAX_SECONDS, or as soon as a threat is found, since the verdict
+can't get stricter after that. The scanner is pure Python, so it works in
+SCAN_SLICE_BYTES slices and yields to the event loop between them. The client gets
+a 413 with a fail-closed verdict that says what the scan found (an NDJSON
+verdict event on the stream route), and the rejection is audited as
+"fail_closed". Other routes get a plain 413.
+
+A plain ASGI middleware, so it sees the body chunk by chunk and a request
+within its limit costs one header lookup.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from services.abuse_service import get_abuse_signals
+from services.request_scan import RequestScan
+from services.stream_json import StreamJSONError
+from services.trace_service import span
+from services.ui_service import get_conservative_ui_plan
+
+SCANNED_ROUTES = ("/analyze-api", "/analyze-api/stream")
+_DISCONNECTED = "client disconnected"
+# Bytes scanned between yields to the event loop (a few ms of parsing)
+SCAN_SLICE_BYTES = 16 * 1024
+
+# Process-wide counters for GET /metrics
+BODY_LIMIT_STATS = {"rejected": 0, "scanned": 0, "scanned_bytes": 0}
+
+
+def parse_body_limits(raw: str) -> Dict[str, int]:
+    """Parse "/analyze-api=1024,*=1024" (KB) into bytes per path."""
+    limits = {"*": 1024 * 1024}
+    for item in raw.split(","):
+        if "=" in item:
+            path, kb = item.rsplit("=", 1)
+            limits[path.strip()] = int(float(kb) * 1024)
+    return limits
+
+
+def _content_length(scope: Scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class _BodyTooLarge(Exception):
+    """Raised into the app when a streamed body passes its limit."""
+
+
+class BodyLimitMiddleware:
+    """Reject request bodies over their route's limit, scanning oversized analysis input."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.limits = parse_body_limits(settings.BODY_LIMITS_KB)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(scope["path"], self.limits["*"])
+        length = _content_length(scope)
+        if length is not None:
+            if length <= limit:
+                # The server never delivers more than Content-Length
+                await self.app(scope, receive, send)
+            else:
+                await self._reject(scope, receive, send, limit, length, [])
+            return
+
+        # Chunked: count as it streams; analysis routes keep their chunks for the scan
+        keep = scope["path"] in SCANNED_ROUTES
+        received = 0
+        chunks: List[Tuple[bytes, bool]] = []
+        overflowed = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, overflowed
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if keep:
+                    chunks.append((body, message.get("more_body", False)))
+                if received > limit:
+                    overflowed = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if not overflowed:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not overflowed:
+                raise
+        if overflowed:
+            await self._reject(scope, receive, send, limit, None, chunks if keep else [])
+
+    async def _reject(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        limit: int,
+        length: Optional[int],
+        chunks: List[Tuple[bytes, bool]]
+    ) -> None:
+        BODY_LIMIT_STATS["rejected"] += 1
+        path = scope["path"]
+        size = f"of {length} bytes " if length is not None else ""
+        reason = f"Request body {size}over the {limit}-byte limit for {path}"
+        print(f"[BodyLimit] {scope['method']} {path}: {reason}")
+
+        if path not in SCANNED_ROUTES or scope["method"] != "POST":
+            await JSONResponse({"error": reason, "blocked": True}, status_code=413)(scope, receive, send)
+            return
+
+        with span("body_limit.scan") as current:
+            scan = await self._scan(receive, chunks)
+            current.set("scan.bytes", scan.bytes)
+        if scan.stopped == _DISCONNECTED:
+            return
+
+        verdict = self._audit(scope, scan, scan.verdict(reason))
+        if path == "/analyze-api/stream":
+            line = json.dumps({"event": "verdict", "verdict": verdict, "ui_plan": get_conservative_ui_plan()}) + "\n"
+            response = Response(line, status_code=413, media_type="application/x-ndjson")
+        else:
+            response = JSONResponse(verdict, status_code=413)
+        await response(scope, receive, send)
+
+    async def _scan(self, receive: Receive, chunks: List[Tuple[bytes, bool]]) -> RequestScan:
+        """Scan what the app already received, then the rest of the body, within the scan budgets."""
+        scan = RequestScan(settings.ANALYZE_SCAN_MAX_VALUE_KB * 1024)
+        max_bytes = int(settings.ANALYZE_SCAN_MAX_MB * 1024 * 1024)
+        deadline = time.monotonic() + settings.ANALYZE_SCAN_MAX_SECONDS
+        BODY_LIMIT_STATS["scanned"] += 1
+        received = iter(chunks)
+        more = True
+        try:
+            while more and not scan.threats:
+                body, more = next(received, (None, more))
+                if body is None:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        scan.stopped = _DISCONNECTED
+                        break
+                    body, more = message.get("body", b""), message.get("more_body", False)
+                if not await self._feed(scan, body, more, max_bytes, deadline):
+                    break
+        except (StreamJSONError, UnicodeDecodeError) as e:
+            scan.stopped = f"malformed input: {e}"
+        BODY_LIMIT_STATS["scanned_bytes"] += scan.bytes
+        return scan
+
+    async def _feed(self, scan: RequestScan, body: bytes, more: bool, max_bytes: int, deadline: float) -> bool:
+        """Scan one received chunk slice by slice; False once a budget is spent or a threat is found."""
+        offset = 0
+        while True:
+            if scan.bytes >= max_bytes:
+                scan.stopped = f"scan limit of {settings.ANALYZE_SCAN_MAX_MB:g} MB reached"
+                return False
+            if time.monotonic() >= deadline:
+                scan.stopped = f"scan time limit of {settings.ANALYZE_SCAN_MAX_SECONDS:g}s reached"
+                return False
+            piece = body[offset:offset + min(SCAN_SLICE_BYTES, max_bytes - scan.bytes)]
+            offset += len(piece)
+            scan.feed(piece, final=not more and offset == len(body))
+            if scan.threats:
+                return False
+            if offset >= len(body):
+                return True
+            await asyncio.sleep(0)
+
+    def _audit(self, scope: Scope, scan: RequestScan, verdict: Dict[str, Any]) -> Dict[str, Any]:
+        """Add abuse signals and write the audit record through the app's Analyzer."""
+        analyzer = getattr(scope["app"].state, "analyzer", None)
+        if analyzer is None:
+            return verdict
+        inp = analyzer.normalize(scan.method, scan.endpoint, scan.intent_head)
+        return analyzer.overlay(inp, None, verdict, "fail_closed", get_abuse_signals(HTTPConnection(scope)))
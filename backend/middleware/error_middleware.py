@@ -6,6 +6,8 @@ from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from services.trace_service import span
+
 logger = logging.getLogger("policy-aware-api")
 
 
@@ -39,7 +41,8 @@ class ErrorMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         try:
-            return await call_next(request)
+            with span("middleware.error"):
+                return await call_next(request)
         except Exception as e:
             # Log the error
             logger.error(json.dumps({
@@ -4,6 +4,8 @@ from typing import Callable
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from services.trace_service import span
+
 # Configure logging to show in terminal
 logging.basicConfig(
     level=logging.INFO,
@@ -19,7 +21,8 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         start_time = time.time()
         
         # Process request
-        response = await call_next(request)
+        with span("middleware.logging"):
+            response = await call_next(request)
         
         # Calculate duration
         duration_ms = (time.time() - start_time) * 1000
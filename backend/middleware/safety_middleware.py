@@ -1,34 +1,35 @@
 """
-Safety Middleware - Logs and handles unsafe requests.
+Safety Middleware - Flags clients that flood or scan the API.
+
+Each request is counted by the abuse detector (see services/abuse_service),
+which works in fixed memory and O(1) per request. The resulting signals are
+attached as request.state.abuse_signals; the analysis routes fold them into
+the verdict.
 """
-import json
-import logging
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 
-logger = logging.getLogger("safety-middleware")
+from config import settings
+from services.abuse_service import get_abuse_detector
+from services.trace_service import span
 
 
 class SafetyMiddleware(BaseHTTPMiddleware):
-    """Middleware to log requests flagged as potentially unsafe."""
-    
+    """Middleware to count requests per client and path and flag abusive clients."""
+
     async def dispatch(self, request: Request, call_next) -> Response:
-        # Check for suspicious headers or patterns
-        user_agent = request.headers.get("user-agent", "")
-        
-        # Log suspicious user agents
-        suspicious_patterns = ["curl", "wget", "python-requests", "PostmanRuntime"]
-        is_suspicious = any(pattern.lower() in user_agent.lower() for pattern in suspicious_patterns)
-        
-        if is_suspicious:
-            logger.warning(json.dumps({
-                "event": "suspicious_request",
-                "path": str(request.url.path),
-                "method": request.method,
-                "user_agent": user_agent,
-                "client_ip": request.client.host if request.client else "unknown"
-            }))
-        
-        # Continue processing
-        response = await call_next(request)
-        return response
+        if not settings.ABUSE_DETECTION_ENABLED:
+            return await call_next(request)
+
+        with span("middleware.safety") as current:
+            detector = get_abuse_detector()
+            client_ip = request.client.host if request.client else "unknown"
+            signals = detector.observe(client_ip, request.url.path)
+            request.state.abuse_signals = signals
+            if signals.flags:
+                current.set("abuse.flags", ",".join(signals.flags))
+
+            # Continue processing
+            response = await call_next(request)
+            detector.record_status(client_ip, response.status_code)
+            return response
@@ -0,0 +1,68 @@
+"""
+Tracing Middleware - Opt-in trace and profile of sampled requests.
+
+Outermost layer, so the root span covers the whole middleware stack.
+Requests are traced at TRACE_SAMPLE_RATE and profiled (and traced) at
+PROFILE_SAMPLE_RATE or when they carry X-Profile: <PROFILE_HEADER_KEY>.
+Traced responses get an X-Trace-Id header; profiled ones also record the
+.prof file on the root span.
+
+A plain ASGI middleware rather than BaseHTTPMiddleware: an unsampled request
+costs a header scan and a random() call, not an extra task per request.
+"""
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from services import trace_service
+
+
+def _wants_profile(scope: Scope) -> bool:
+    if trace_service.sampled(settings.PROFILE_SAMPLE_RATE):
+        return True
+    if not settings.PROFILE_HEADER_KEY:
+        return False
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value.decode("latin-1") == settings.PROFILE_HEADER_KEY
+    return False
+
+
+class TracingMiddleware:
+    """Root span (and optional cProfile capture) for sampled HTTP requests."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = _wants_profile(scope)
+        if not profile and not trace_service.sampled(settings.TRACE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']} {scope['path']}"
+        client = scope.get("client")
+        with trace_service.start_trace(
+            name,
+            kind=trace_service.SPAN_KIND_SERVER,
+            **{"http.method": scope["method"], "url.path": scope["path"], "client.address": client[0] if client else None}
+        ) as root:
+            trace_header = (b"x-trace-id", root.trace_id.encode("ascii"))
+
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.set("http.status_code", message["status"])
+                    message = {**message, "headers": [*message.get("headers", []), trace_header]}
+                await send(message)
+
+            profiler = trace_service.start_profile() if profile else None
+            if profile and profiler is None:
+                root.set("profile.skipped", "another profile is running")
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                if profiler is not None:
+                    root.set("profile.file", trace_service.save_profile(profiler, name, root.trace_id))
@@ -1,5 +1,8 @@
 """Routers package for API endpoints."""
 from routers.analyze_api import router as analyze_api_router
 from routers.ui_plan import router as ui_plan_router
+from routers.metrics import router as metrics_router
+from routers.audit import router as audit_router
+from routers.explore_ws import router as explore_ws_router
 
-__all__ = ["analyze_api_router", "ui_plan_router"]
+__all__ = ["analyze_api_router", "ui_plan_router", "metrics_router", "audit_router", "explore_ws_router"]
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends
+import json
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
-from config import settings
-from services.safety_service import analyze_request, get_conservative_verdict
-from services.supabase_service import SupabaseService
-from services.llm_service import get_llm_service
+from dependencies import get_analyzer
+from services.analyzer import Analyzer
+from services.safety_service import get_conservative_verdict
+from services.inflight_service import RequestCancelled
+from services.abuse_service import get_abuse_signals
+from services.ui_service import generate_ui_plan, get_conservative_ui_plan
 
 router = APIRouter()
 
@@ -24,6 +28,8 @@ class AnalyzeRequest(BaseModel):
     threat: Optional[bool] = Field(default=False, description="Threat flag")
     sensitive_request: Optional[bool] = Field(default=False, description="Sensitive data flag")
     explanation: Optional[str] = Field(default="", description="Explanation")
+    session_id: Optional[str] = Field(default=None, max_length=128, description="Chat session to analyze incrementally")
+    reset_session: Optional[bool] = Field(default=False, description="Start the session over, clearing its verdict")
     
     model_config = {
         "json_schema_extra": {
@@ -33,7 +39,8 @@ class AnalyzeRequest(BaseModel):
                 "urgency": True,
                 "threat": False,
                 "sensitive_request": True,
-                "explanation": "API requests card number and CVV"
+                "explanation": "API requests card number and CVV",
+                "session_id": "chat-7f3a"
             }
         }
     }
@@ -58,15 +65,11 @@ class SafetyVerdict(BaseModel):
     }
 
 
-def get_supabase_service() -> SupabaseService:
-    """Dependency for Supabase service."""
-    return SupabaseService()
-
-
 @router.post("/analyze-api", response_model=SafetyVerdict)
 async def analyze_api(
     request: AnalyzeRequest,
-    supabase: SupabaseService = Depends(get_supabase_service)
+    http_request: Request,
+    analyzer: Analyzer = Depends(get_analyzer)
 ):
     """
     Analyze an API request for safety concerns.
@@ -74,54 +77,92 @@ async def analyze_api(
     
     When LOCAL_MODE=0, uses OpenAI LLM for enhanced analysis.
     When LOCAL_MODE=1, uses rules-based analysis only.
+    LLM calls are scheduled by X-Priority-Class (interactive/background/replay) and
+    X-Urgent; calls over the client limit or the class's max queue wait degrade to
+    the rules verdict. A cached LLM verdict is served without waiting for admission.
+
+    When a classifier model is loaded (see train_classifier.py), the LLM is only
+    called when the classifier is unsure; otherwise the rules and classifier
+    verdicts are combined. Clients flagged for flooding or scanning (see
+    SafetyMiddleware) get threat=true.
+
+    With session_id, only what is new in this turn is analyzed and the session
+    verdict can only get stricter until reset_session is sent.
+
+    The LLM call is cancelled if the client disconnects, or if a newer request
+    from the same client sends the same X-Supersede-Key. Cancelled requests are
+    not audited.
+
+    The stages live in services/analyzer.py.
     """
     try:
-        # Convert api_spec object to string for analysis
-        api_spec_str = f"{request.api_spec.method} {request.api_spec.endpoint}"
-        
-        # Use LLM-powered analysis when LOCAL_MODE is disabled
-        if not settings.LOCAL_MODE:
-            print(f"Using {settings.LLM_PROVIDER} LLM for safety analysis...", flush=True)
-            llm_service = get_llm_service()
-            verdict = await llm_service.analyze_safety(
-                api_spec=api_spec_str,
-                user_intent=request.user_intent,
-                example_payloads=[],
-                constructed_input={}
-            )
-            # Extract core verdict fields for response
-            verdict = {
-                "urgency": verdict.get("urgency", False),
-                "threat": verdict.get("threat", False),
-                "sensitive_request": verdict.get("sensitive_request", False),
-                "explanation": verdict.get("explanation", "")
-            }
-        else:
-            # Rules-based analysis (LOCAL_MODE=1)
-            verdict = analyze_request(
-                api_spec=api_spec_str,
-                user_intent=request.user_intent,
-                example_payloads=[],
-                constructed_input={}
-            )
-        
-        # Log to Supabase
-        spec_id = supabase.insert_api_spec(
-            name="API Spec",
-            spec_text=api_spec_str
-        )
-        
-        supabase.insert_verdict(
-            api_spec_id=spec_id,
-            user_intent=request.user_intent,
-            verdict=verdict,
-            ui_contract={},
-            risk_score=1.0 if verdict.get("threat") else 0.5 if verdict.get("sensitive_request") else 0.0
-        )
-        
+        inp = analyzer.normalize(request.api_spec.method, request.api_spec.endpoint, request.user_intent)
+        session = analyzer.open_session(http_request, request.session_id, reset=bool(request.reset_session))
+        verdict = await analyzer.analyze(http_request, inp, session, get_abuse_signals(http_request))
+        return SafetyVerdict(**verdict)
+    
+    except RequestCancelled as e:
+        # No verdict was delivered, so nothing is audited or folded into the session
+        print(f"analyze_api cancelled: {e.reason}")
+        verdict = get_conservative_verdict()
+        verdict["explanation"] = f"Analysis cancelled: {e.reason}"
         return SafetyVerdict(**verdict)
     
     except Exception as e:
         print(f"Error in analyze_api: {e}")
         return SafetyVerdict(**get_conservative_verdict())
 
+
+def _ndjson(event: Dict[str, Any]) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def _stream_analysis(request: AnalyzeRequest, http_request: Request, analyzer: Analyzer) -> AsyncIterator[str]:
+    lockdown_plan = None
+    try:
+        inp = analyzer.normalize(request.api_spec.method, request.api_spec.endpoint, request.user_intent)
+        session = analyzer.open_session(http_request, request.session_id, reset=bool(request.reset_session))
+        async for event in analyzer.stream(http_request, inp, session, get_abuse_signals(http_request)):
+            if event["event"] == "lockdown":
+                # Read-only plan right away; the explanation follows in the verdict event
+                lockdown_plan = generate_ui_plan({"threat": True})
+                yield _ndjson({"event": "lockdown", "verdict": event["verdict"], "ui_plan": lockdown_plan})
+                continue
+            verdict = SafetyVerdict(**event["verdict"]).model_dump()
+            # Once locked down, the plan stays locked down for this request
+            yield _ndjson({"event": "verdict", "verdict": verdict, "ui_plan": lockdown_plan or generate_ui_plan(verdict)})
+    
+    except RequestCancelled as e:
+        # As in analyze_api: nothing audited; a superseded client still gets a final event
+        print(f"analyze_api_stream cancelled: {e.reason}")
+        verdict = get_conservative_verdict()
+        verdict["explanation"] = f"Analysis cancelled: {e.reason}"
+        yield _ndjson({"event": "verdict", "verdict": verdict, "ui_plan": get_conservative_ui_plan()})
+    
+    except Exception as e:
+        print(f"Error in analyze_api_stream: {e}")
+        yield _ndjson({
+            "event": "verdict",
+            "verdict": get_conservative_verdict(),
+            "ui_plan": get_conservative_ui_plan()
+        })
+
+
+@router.post("/analyze-api/stream")
+async def analyze_api_stream(
+    request: AnalyzeRequest,
+    http_request: Request,
+    analyzer: Analyzer = Depends(get_analyzer)
+):
+    """
+    Streaming /analyze-api, returned as NDJSON (one JSON object per line).
+
+    - {"event": "lockdown", "verdict": {...}, "ui_plan": {...}}: sent as soon as the
+      streamed LLM output shows a threat or a risk_score >= STREAM_LOCKDOWN_RISK.
+      The verdict holds only the fields received so far. LLM mode only, at most once.
+    - {"event": "verdict", "verdict": SafetyVerdict, "ui_plan": {...}}: always last.
+
+    Malformed or failed LLM output yields the fail-closed verdict. The LLM call is
+    cancelled on disconnect or X-Supersede-Key as in /analyze-api, and not audited.
+    """
+    return StreamingResponse(_stream_analysis(request, http_request, analyzer), media_type="application/x-ndjson")
@@ -0,0 +1,100 @@
+"""
+Audit read API over the safety_verdicts log.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from dependencies import require_audit_key
+from services.supabase_service import get_supabase_service
+
+router = APIRouter(prefix="/audit")
+
+
+class VerdictPage(BaseModel):
+    """One page of audit verdicts."""
+    items: List[Dict[str, Any]] = Field(..., description="Verdicts, newest first")
+    next_cursor: Optional[str] = Field(default=None, description="Pass as ?cursor= for the next page")
+
+
+class RollupResponse(BaseModel):
+    """Hourly verdict counts per endpoint."""
+    items: List[Dict[str, Any]] = Field(..., description="Rollup rows, newest bucket first")
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        # Both values are interpolated into a PostgREST filter; validate their shape
+        datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        if not all(c in "0123456789abcdef-" for c in row_id.lower()):
+            raise ValueError("bad id")
+        return created_at, row_id
+    except (ValueError, TypeError, binascii.Error, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/verdicts", response_model=VerdictPage, dependencies=[Depends(require_audit_key)])
+def list_verdicts(
+    since: Optional[datetime] = Query(default=None, description="Inclusive lower bound on created_at"),
+    until: Optional[datetime] = Query(default=None, description="Exclusive upper bound on created_at"),
+    min_risk: Optional[float] = Query(default=None, ge=0),
+    max_risk: Optional[float] = Query(default=None, ge=0),
+    threat: Optional[bool] = Query(default=None),
+    sensitive: Optional[bool] = Query(default=None),
+    endpoint: Optional[str] = Query(default=None, description="Exact API endpoint path"),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page")
+):
+    """
+    List safety verdicts newest first with keyset (cursor) pagination.
+    Cost per page is independent of how deep the cursor is.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    rows = get_supabase_service().query_verdicts(
+        limit=limit + 1,
+        after=after,
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+        min_risk=min_risk,
+        max_risk=max_risk,
+        threat=threat,
+        sensitive=sensitive,
+        endpoint=endpoint
+    )
+    if rows is None:
+        raise HTTPException(status_code=503, detail="Audit store unavailable")
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return VerdictPage(items=page, next_cursor=next_cursor)
+
+
+@router.get("/rollups", response_model=RollupResponse, dependencies=[Depends(require_audit_key)])
+def list_rollups(
+    since: Optional[datetime] = Query(default=None, description="Inclusive lower bound on the hour bucket"),
+    until: Optional[datetime] = Query(default=None, description="Exclusive upper bound on the hour bucket"),
+    endpoint: Optional[str] = Query(default=None),
+    limit: int = Query(default=1000, ge=1, le=10000)
+):
+    """Hourly verdict counts per endpoint, maintained incrementally on insert."""
+    rows = get_supabase_service().query_verdict_rollups(
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+        endpoint=endpoint,
+        limit=limit
+    )
+    if rows is None:
+        raise HTTPException(status_code=503, detail="Audit store unavailable")
+    return RollupResponse(items=rows)
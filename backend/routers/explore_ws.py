@@ -0,0 +1,82 @@
+"""
+WebSocket live-analysis channel for the explorer.
+"""
+import asyncio
+import json
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+
+from config import settings
+from dependencies import get_analyzer
+from services.abuse_service import observe_connection
+from services.analyzer import Analyzer
+from services.explore_service import ExploreEdit, ExploreSession
+
+router = APIRouter()
+
+
+def origin_allowed(websocket: WebSocket) -> bool:
+    """
+    Browsers always send Origin on a WebSocket handshake and CORS does not
+    apply to WebSockets, so check it against the CORS allowlist here.
+    """
+    origin = websocket.headers.get("origin")
+    return origin is None or "*" in settings.CORS_ORIGINS or origin in settings.CORS_ORIGINS
+
+
+@router.websocket("/ws/explore")
+async def explore(websocket: WebSocket, analyzer: Analyzer = Depends(get_analyzer)):
+    """
+    Live analysis for one explorer session. Client messages (JSON text frames):
+
+    - {"type": "edit", "endpoint"?, "method"?, "user_intent"?, "payload"?}
+      Omitted fields keep their previous value.
+    - {"type": "analyze"}: run the LLM now instead of after the debounce window.
+
+    Server messages:
+
+    - {"type": "verdict", "source": "rules", "seq", "verdict", "ui_plan", "rules_us"}
+      after every edit.
+    - {"type": "verdict", "source", "seq", "verdict", "ui_plan"} once the input has been
+      unchanged for WS_DEBOUNCE_MS (LOCAL_MODE=0 only), from the /analyze-api pipeline;
+      source is "llm", "cache", "fail_closed", "classifier" or "rules" as in the audit log.
+    - {"type": "error", "detail"} for messages that can't be processed.
+
+    `seq` counts edits; anything older than the client's latest edit is stale.
+    Handshakes from an Origin outside ALLOWED_ORIGINS are refused (403).
+    """
+    if not origin_allowed(websocket):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    observe_connection(websocket)
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+
+    async def send(message: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(message))
+
+    session = ExploreSession(websocket, send, analyzer)
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            if len(raw) > settings.WS_MAX_MESSAGE_CHARS:
+                await send({"type": "error", "detail": f"Message over {settings.WS_MAX_MESSAGE_CHARS} characters"})
+                continue
+            try:
+                message = json.loads(raw)
+                kind = message.get("type") if isinstance(message, dict) else None
+                if kind == "edit":
+                    await session.edit(ExploreEdit(**{k: v for k, v in message.items() if k != "type"}))
+                elif kind == "analyze":
+                    session.analyze_now()
+                else:
+                    await send({"type": "error", "detail": f"Unknown message type: {kind!r}"})
+            except ValueError as e:
+                # Malformed JSON or an invalid edit (pydantic's ValidationError is a ValueError)
+                await send({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.close()
@@ -0,0 +1,56 @@
+"""
+Operational metrics for the running worker.
+"""
+import asyncio
+import os
+import resource
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from dependencies import get_analyzer, require_audit_key
+from services.analyzer import Analyzer
+from services.cache_service import get_shared_cache
+from services.admission_service import get_admission_controller
+from services.audit_spool import get_audit_spool
+from services.session_service import get_session_store
+from services.inflight_service import get_inflight_registry
+from services.explore_service import EXPLORE_STATS
+from services.abuse_service import get_abuse_detector
+from services.classifier_service import get_classifier_service
+from middleware.body_limit_middleware import BODY_LIMIT_STATS
+
+router = APIRouter()
+
+
+def _rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@router.get("/metrics", dependencies=[Depends(require_audit_key)])
+async def metrics(analyzer: Analyzer = Depends(get_analyzer)) -> Dict[str, Any]:
+    """
+    Worker metrics. Cache counters are host-wide (shared by all workers);
+    process fields describe the worker that answered. Requires X-Audit-Key.
+    """
+    cache = get_shared_cache()
+    spool = get_audit_spool()
+    classifier = get_classifier_service()
+    return {
+        "process": {"pid": os.getpid(), "rss_bytes": _rss_bytes()},
+        "analyzer": analyzer.snapshot(),
+        "cache": await asyncio.to_thread(cache.stats) if cache else {"backend": "disabled"},
+        "admission": get_admission_controller().snapshot(),
+        "audit_spool": await asyncio.to_thread(spool.snapshot) if spool else {"enabled": False},
+        "sessions": get_session_store().snapshot(),
+        "inflight": get_inflight_registry().snapshot(),
+        "explore_ws": dict(EXPLORE_STATS),
+        "abuse": get_abuse_detector().snapshot(),
+        "classifier": classifier.snapshot() if classifier else {"enabled": False},
+        "body_limits": dict(BODY_LIMIT_STATS),
+    }
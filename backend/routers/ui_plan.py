@@ -1,16 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Optional
 
+from dependencies import get_analyzer
+from services.analyzer import Analyzer
 from services.ui_service import generate_ui_plan, get_conservative_ui_plan
+from services.inflight_service import RequestCancelled
+from services.abuse_service import get_abuse_signals
 
 router = APIRouter()
 
 
-
-from config import settings
-from services.llm_service import get_llm_service
-
 class VerdictInput(BaseModel):
     """Input schema - safety verdict for UI plan generation."""
     urgency: bool = Field(..., description="Whether request shows urgency")
@@ -55,24 +55,28 @@ class UIPlanResponse(BaseModel):
 
 
 @router.post("/generate-ui-plan", response_model=UIPlanResponse)
-async def generate_ui_plan_endpoint(verdict: VerdictInput):
+async def generate_ui_plan_endpoint(
+    verdict: VerdictInput,
+    http_request: Request,
+    analyzer: Analyzer = Depends(get_analyzer)
+):
     """
     Generate a UI plan based on the safety verdict.
     When LOCAL_MODE=0 and api_spec is provided, uses AI to suggest components.
+    LLM calls are scheduled like /analyze-api and fall back to the rules plan when
+    not admitted. They are cancelled like /analyze-api on disconnect or X-Supersede-Key.
+    Clients flagged for flooding or scanning are planned for as threat=true.
     """
     try:
-        if not settings.LOCAL_MODE and verdict.api_spec:
-            print(f"Using {settings.LLM_PROVIDER} LLM for UI plan generation...", flush=True)
-            llm_service = get_llm_service()
-            suggestion = await llm_service.generate_ui_suggestions(
-                verdict={
-                    "urgency": verdict.urgency,
-                    "threat": verdict.threat,
-                    "sensitive_request": verdict.sensitive_request
-                },
-                api_spec=verdict.api_spec
-            )
-            
+        signals = get_abuse_signals(http_request)
+        flags = {
+            "urgency": verdict.urgency,
+            "threat": verdict.threat or bool(signals and signals.client_flags),
+            "sensitive_request": verdict.sensitive_request
+        }
+        suggestion, rejection = await analyzer.suggest_ui(http_request, flags, verdict.api_spec)
+        
+        if suggestion is not None:
             # Map LLM suggestion to response format
             return UIPlanResponse(
                 components=suggestion.get("suggested_components", []),
@@ -81,15 +85,19 @@ async def generate_ui_plan_endpoint(verdict: VerdictInput):
             )
             
         # Fallback to rules-based
-        ui_plan = generate_ui_plan({
-            "urgency": verdict.urgency,
-            "threat": verdict.threat,
-            "sensitive_request": verdict.sensitive_request
-        })
+        ui_plan = generate_ui_plan(flags)
         return UIPlanResponse(
             components=ui_plan["components"],
             restrictions=ui_plan["restrictions"],
-            warnings=[]
+            warnings=[f"AI suggestions skipped ({rejection})"] if rejection else []
+        )
+    except RequestCancelled as e:
+        print(f"generate_ui_plan cancelled: {e.reason}")
+        plan = get_conservative_ui_plan()
+        return UIPlanResponse(
+            components=plan["components"],
+            restrictions=plan["restrictions"],
+            warnings=[f"UI plan cancelled: {e.reason}"]
         )
     except Exception as e:
         print(f"Error in generate_ui_plan: {e}")
@@ -1,15 +1,28 @@
-"""Services package for business logic."""
-from services.safety_service import analyze_request, get_conservative_verdict
-from services.ui_service import generate_ui_plan, get_conservative_ui_plan
-from services.supabase_service import SupabaseService
-from services.llm_service import get_llm_service, LLMService
-
-__all__ = [
-    "analyze_request",
-    "get_conservative_verdict",
-    "generate_ui_plan",
-    "get_conservative_ui_plan",
-    "SupabaseService",
-    "get_llm_service",
-    "LLMService",
-]
+"""Services package for business logic.
+
+Exports are resolved lazily so importing a service (or this package) does not
+pull in provider and storage SDKs until they are actually used.
+"""
+import importlib
+from typing import Any
+
+_EXPORTS = {
+    "analyze_request": "services.safety_service",
+    "get_conservative_verdict": "services.safety_service",
+    "generate_ui_plan": "services.ui_service",
+    "get_conservative_ui_plan": "services.ui_service",
+    "SupabaseService": "services.supabase_service",
+    "get_llm_service": "services.llm_service",
+    "LLMService": "services.llm_service",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,339 @@
+"""
+Abuse Service - Fixed-memory flood and scan detection per client and endpoint.
+
+Every HTTP request is counted in sliding-window count-min sketches:
+
+- requests per client IP            -> "flood"
+- requests per path (all clients)   -> "endpoint_flood" (metrics and logs only)
+- distinct paths per client IP      -> "scan" (probing many URLs)
+- 404/405 responses per client IP   -> "scan" (probing URLs that don't exist)
+
+Distinct paths are counted without a per-client set: (client, path) pairs
+go into a windowed Bloom filter, and the client's distinct counter is
+bumped only for a pair the filter has not seen in the window.
+
+A window is split into slices. Each slice has its own sketch and a running
+total is kept. Expiry is lazy: a counter subtracts the slices that left the
+window since it was last touched, so an update or estimate touches `depth`
+counters (plus at most `slices` cells each) and no request ever sweeps a
+whole sketch. The Bloom filter is sliced the same way, so a (client, path)
+pair leaves it exactly when its distinct-path count leaves the window.
+Memory is fixed however many clients there are; collisions can only
+overestimate, by about requests / width. The heaviest clients and paths
+are kept in small top-k tables for /metrics.
+"""
+import json
+import logging
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.requests import HTTPConnection
+
+from config import settings
+
+logger = logging.getLogger("safety-middleware")
+
+_MASK64 = (1 << 64) - 1
+
+# Flags about the caller itself. endpoint_flood counts every client, so it
+# never marks one caller's verdict: that would let a crowd of clients, each
+# under its own limit, lock down everyone else.
+CLIENT_FLAGS = ("flood", "scan")
+
+Indexes = Tuple[int, ...]
+
+
+class WindowedCountMinSketch:
+    """Count-min sketch over a sliding window of `slices` time slices."""
+
+    def __init__(self, width: int, depth: int, window_seconds: float, slices: int = 6):
+        # Row indexes are bit fields of one 64-bit hash, so width is a power of two
+        self.bits = max(1, (width - 1).bit_length())
+        if self.bits * depth > 64:
+            raise ValueError(f"Sketch of depth {depth} needs width <= 2**{64 // depth}")
+        self.width = width = 1 << self.bits
+        self.depth = depth
+        self.slice_seconds = window_seconds / slices
+        self._slices = [array("I", bytes(4 * width * depth)) for _ in range(slices)]
+        self._total = array("I", bytes(4 * width * depth))
+        # Slice each counter was last brought up to date in; expiry is per counter, on touch
+        self._stamp = array("q", [int(time.monotonic() // self.slice_seconds)]) * (width * depth)
+
+    @property
+    def memory_bytes(self) -> int:
+        return (len(self._slices) * 4 + 4 + 8) * self.width * self.depth
+
+    def indexes(self, key: str) -> Indexes:
+        """Counter offsets for `key`; reusable across sketches of the same shape."""
+        return _indexes(key, self.bits, self.depth)
+
+    def _expire(self, i: int, slice_id: int) -> None:
+        # Subtract this counter's slices that left the window since it was last touched
+        slices = self._slices
+        last = self._stamp[i]
+        expired = 0
+        for step in range(1, min(slice_id - last, len(slices)) + 1):
+            expiring = slices[(last + step) % len(slices)]
+            expired += expiring[i]
+            expiring[i] = 0
+        self._total[i] -= expired
+        self._stamp[i] = slice_id
+
+    def add(self, idx: Indexes, now: float) -> int:
+        """Count one event; returns the new windowed estimate."""
+        slice_id = int(now // self.slice_seconds)
+        stamp, total = self._stamp, self._total
+        current = self._slices[slice_id % len(self._slices)]
+        for i in idx:
+            if stamp[i] != slice_id:
+                self._expire(i, slice_id)
+            current[i] += 1
+            total[i] += 1
+        return min([total[i] for i in idx])
+
+    def estimate(self, idx: Indexes, now: float) -> int:
+        slice_id = int(now // self.slice_seconds)
+        stamp = self._stamp
+        for i in idx:
+            if stamp[i] != slice_id:
+                self._expire(i, slice_id)
+        total = self._total
+        return min([total[i] for i in idx])
+
+
+class WindowedBloomFilter:
+    """Set membership over a sliding window of `slices` time slices."""
+
+    def __init__(self, window_seconds: float, bits: int = 18, hashes: int = 3, slices: int = 6):
+        # `hashes` partitions of 2**bits bits per slice; about 0.5% false positives at 150k keys per window
+        self.bits = bits
+        self.hashes = hashes
+        self.slice_seconds = window_seconds / slices
+        self._size = (hashes << bits) // 8
+        self._bitmaps = [bytearray(self._size) for _ in range(slices)]
+        self._slice_id = int(time.monotonic() // self.slice_seconds)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._size * len(self._bitmaps)
+
+    def add(self, key: str, now: float) -> bool:
+        """
+        Insert `key` unless it is in the window; returns True if it was not.
+        A key lives in the slice it was inserted in, so it leaves the filter
+        together with the count added for it in a sketch on the same slices.
+        """
+        slice_id = int(now // self.slice_seconds)
+        bitmaps = self._bitmaps
+        if slice_id != self._slice_id:
+            for step in range(1, min(slice_id - self._slice_id, len(bitmaps)) + 1):
+                bitmaps[(self._slice_id + step) % len(bitmaps)] = bytearray(self._size)
+            self._slice_id = slice_id
+        positions = [(i >> 3, 1 << (i & 7)) for i in _indexes(key, self.bits, self.hashes)]
+        for bitmap in bitmaps:
+            if all(bitmap[byte] & bit for byte, bit in positions):
+                return False
+        current = bitmaps[slice_id % len(bitmaps)]
+        for byte, bit in positions:
+            current[byte] |= bit
+        return True
+
+
+def _indexes(key: str, bits: int, depth: int) -> Indexes:
+    # Row r of a (depth x 2**bits) table uses bits r*bits .. (r+1)*bits of the key's hash
+    h = hash(key) & _MASK64
+    mask = (1 << bits) - 1
+    return tuple([(row << bits) | ((h >> (row * bits)) & mask) for row in range(depth)])
+
+
+class TopK:
+    """The `capacity` keys with the highest windowed estimates seen lately."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._counts: Dict[str, int] = {}
+        self._min_key: Optional[str] = None
+
+    def offer(self, key: str, estimate: int) -> None:
+        counts = self._counts
+        if key in counts:
+            counts[key] = estimate
+            if key == self._min_key:
+                self._min_key = None
+            return
+        if len(counts) < self.capacity:
+            counts[key] = estimate
+            self._min_key = None
+            return
+        if self._min_key is None:
+            self._min_key = min(counts, key=counts.__getitem__)
+        if estimate > counts[self._min_key]:
+            del counts[self._min_key]
+            counts[key] = estimate
+            self._min_key = None
+
+    def items(self) -> List[Tuple[str, int]]:
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+
+
+@dataclass
+class AbuseSignals:
+    """Windowed counts for one request's client and path, with the flags raised."""
+    client_requests: int
+    endpoint_requests: int
+    distinct_paths: int
+    not_found: int
+    flags: List[str] = field(default_factory=list)
+
+    @property
+    def client_flags(self) -> List[str]:
+        """The flags raised by this client's own behaviour."""
+        return [flag for flag in self.flags if flag in CLIENT_FLAGS]
+
+    def describe(self, flags: Optional[List[str]] = None) -> str:
+        """Human-readable signals for `flags` (default: all raised flags)."""
+        flags = self.flags if flags is None else flags
+        window = f"{settings.ABUSE_WINDOW_SECONDS:g}s"
+        parts = []
+        if "flood" in flags:
+            parts.append(f"client flood ({self.client_requests} requests/{window})")
+        if "endpoint_flood" in flags:
+            parts.append(f"endpoint flood ({self.endpoint_requests} requests/{window})")
+        if "scan" in flags:
+            parts.append(f"scanning ({self.distinct_paths} paths, {self.not_found} not found/{window})")
+        return ", ".join(parts)
+
+
+def _flagged(signals: AbuseSignals) -> AbuseSignals:
+    if signals.client_requests >= settings.ABUSE_CLIENT_MAX_REQUESTS:
+        signals.flags.append("flood")
+    if signals.endpoint_requests >= settings.ABUSE_ENDPOINT_MAX_REQUESTS:
+        signals.flags.append("endpoint_flood")
+    if signals.distinct_paths >= settings.ABUSE_SCAN_DISTINCT_PATHS or signals.not_found >= settings.ABUSE_SCAN_NOT_FOUND:
+        signals.flags.append("scan")
+    return signals
+
+
+class AbuseDetector:
+    """Per-process detector. Single event loop only."""
+
+    def __init__(self):
+        window, width, depth = settings.ABUSE_WINDOW_SECONDS, settings.ABUSE_SKETCH_WIDTH, settings.ABUSE_SKETCH_DEPTH
+        self._clients = WindowedCountMinSketch(width, depth, window)
+        self._endpoints = WindowedCountMinSketch(width, depth, window)
+        self._pairs = WindowedBloomFilter(window)
+        self._distinct = WindowedCountMinSketch(width, depth, window)
+        self._not_found = WindowedCountMinSketch(width, depth, window)
+        self.top_clients = TopK(settings.ABUSE_HEAVY_HITTERS)
+        self.top_endpoints = TopK(settings.ABUSE_HEAVY_HITTERS)
+        self.stats = {"requests": 0, "flood": 0, "endpoint_flood": 0, "scan": 0}
+
+    def observe(self, client_ip: str, path: str) -> AbuseSignals:
+        """Count a request and return the signals for its client and path."""
+        now = time.monotonic()
+        self.stats["requests"] += 1
+        client_idx = self._clients.indexes(client_ip)
+
+        client_requests = self._clients.add(client_idx, now)
+        endpoint_requests = self._endpoints.add(self._endpoints.indexes(path), now)
+        new_path = self._pairs.add(f"{client_ip} {path}", now)
+        if new_path:
+            distinct_paths = self._distinct.add(client_idx, now)
+        else:
+            distinct_paths = self._distinct.estimate(client_idx, now)
+        not_found = self._not_found.estimate(client_idx, now)
+
+        self.top_clients.offer(client_ip, client_requests)
+        self.top_endpoints.offer(path, endpoint_requests)
+
+        signals = _flagged(AbuseSignals(client_requests, endpoint_requests, distinct_paths, not_found))
+        for flag in signals.flags:
+            self.stats[flag] += 1
+
+        # Estimates grow by exactly one per request, so each crossing is logged once per window
+        if client_requests == settings.ABUSE_CLIENT_MAX_REQUESTS or endpoint_requests == settings.ABUSE_ENDPOINT_MAX_REQUESTS \
+                or (new_path and distinct_paths == settings.ABUSE_SCAN_DISTINCT_PATHS):
+            self._log(client_ip, path, signals)
+        return signals
+
+    def current(self, client_ip: str, path: str) -> AbuseSignals:
+        """Signals for a client and path without counting a request (long-lived connections)."""
+        now = time.monotonic()
+        client_idx = self._clients.indexes(client_ip)
+        return _flagged(AbuseSignals(
+            self._clients.estimate(client_idx, now),
+            self._endpoints.estimate(self._endpoints.indexes(path), now),
+            self._distinct.estimate(client_idx, now),
+            self._not_found.estimate(client_idx, now)
+        ))
+
+    def record_status(self, client_ip: str, status_code: int) -> None:
+        """Count responses that suggest URL probing."""
+        if status_code in (404, 405):
+            idx = self._not_found.indexes(client_ip)
+            if self._not_found.add(idx, time.monotonic()) == settings.ABUSE_SCAN_NOT_FOUND:
+                self._log(client_ip, None, None)
+
+    def _log(self, client_ip: str, path: Optional[str], signals: Optional[AbuseSignals]) -> None:
+        logger.warning(json.dumps({
+            "event": "abuse_signal",
+            "client_ip": client_ip,
+            "path": path,
+            "signals": signals.describe() if signals else "scanning (not found responses)",
+        }))
+
+    def snapshot(self) -> Dict[str, Any]:
+        sketches = (self._clients, self._endpoints, self._pairs, self._distinct, self._not_found)
+        return {
+            **self.stats,
+            "window_seconds": settings.ABUSE_WINDOW_SECONDS,
+            "memory_bytes": sum(s.memory_bytes for s in sketches),
+            "top_clients": self.top_clients.items()[:10],
+            "top_endpoints": self.top_endpoints.items()[:10],
+        }
+
+
+def get_abuse_signals(request: HTTPConnection) -> Optional[AbuseSignals]:
+    """Signals SafetyMiddleware attached to this request, if any."""
+    return getattr(request.state, "abuse_signals", None)
+
+
+def _client_ip(connection: HTTPConnection) -> str:
+    return connection.client.host if connection.client else "unknown"
+
+
+def observe_connection(connection: HTTPConnection) -> None:
+    """Count a WebSocket handshake as a request (SafetyMiddleware only sees HTTP)."""
+    if settings.ABUSE_DETECTION_ENABLED:
+        get_abuse_detector().observe(_client_ip(connection), connection.url.path)
+
+
+def get_connection_signals(connection: HTTPConnection) -> Optional[AbuseSignals]:
+    """Current signals for a long-lived connection's client, or None when detection is off."""
+    if not settings.ABUSE_DETECTION_ENABLED:
+        return None
+    return get_abuse_detector().current(_client_ip(connection), connection.url.path)
+
+
+def apply_abuse_signals(verdict: Dict[str, Any], signals: Optional[AbuseSignals]) -> Dict[str, Any]:
+    """Raise the threat flag on a verdict for a client showing flood or scan behaviour."""
+    if signals is None or not signals.client_flags:
+        return verdict
+    verdict = dict(verdict)
+    verdict["threat"] = True
+    verdict["explanation"] = f"{verdict.get('explanation', '')}. Abuse signals: {signals.describe(signals.client_flags)}".lstrip(". ")
+    return verdict
+
+
+# Singleton instance
+_abuse_detector: Optional[AbuseDetector] = None
+
+
+def get_abuse_detector() -> AbuseDetector:
+    """Get the abuse detector singleton instance."""
+    global _abuse_detector
+    if _abuse_detector is None:
+        _abuse_detector = AbuseDetector()
+    return _abuse_detector
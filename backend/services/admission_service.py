@@ -0,0 +1,241 @@
+"""
+Admission Service - Bounds LLM work per client and globally.
+
+Two gates run before any LLM call:
+- A token bucket per client (API key, else client IP). Buckets live in a
+  bounded LRU map so memory stays flat however many clients show up.
+- A global concurrency limit adapted with AIMD from observed provider
+  latency and rate-limit (429) responses.
+
+Calls within their client budget wait for a concurrency slot in the
+priority scheduler (services/scheduler_service.py) for a bounded time.
+Calls that don't get through degrade to the rules-based verdict instead
+of queuing indefinitely. Limits are per worker process.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.requests import HTTPConnection
+
+from config import settings
+from services.scheduler_service import LLMScheduler, PRIORITY_CLASSES, parse_class_map
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second, up to `burst` banked."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class AdaptiveLimiter:
+    """
+    Global concurrency limit with additive increase / multiplicative decrease.
+
+    The limit grows by ~1 per limit's worth of healthy samples and shrinks
+    when a sample is slower than `latency_tolerance` x the baseline latency
+    (a slowly rising minimum) or the provider returns 429. Decreases are
+    spaced at least one baseline latency apart so one congestion event
+    isn't counted once per in-flight request.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_tolerance: float,
+        backoff: float = 0.9,
+        throttle_backoff: float = 0.5
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.throttle_backoff = throttle_backoff
+        self.in_flight = 0
+        self.baseline_s: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"throttled": 0, "slow": 0, "decreases": 0}
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def observe(self, latency_s: float, throttled: bool = False) -> None:
+        """Feed one provider call outcome into the limit."""
+        with self._lock:
+            if self.baseline_s is None or latency_s < self.baseline_s:
+                self.baseline_s = latency_s
+            else:
+                # Let the baseline drift up slowly so it tracks a shifting provider
+                self.baseline_s *= 1.01
+
+            slow = latency_s > self.baseline_s * self.latency_tolerance
+            if throttled or slow:
+                self.stats["throttled" if throttled else "slow"] += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.baseline_s:
+                    factor = self.throttle_backoff if throttled else self.backoff
+                    self.limit = max(float(self.minimum), self.limit * factor)
+                    self._last_decrease = now
+                    self.stats["decreases"] += 1
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "baseline_ms": round(self.baseline_s * 1000, 1) if self.baseline_s else None,
+                **self.stats,
+            }
+
+
+class AdmissionController:
+    """Per-client token buckets in front of the priority scheduler and adaptive limiter."""
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_ENABLED
+        self.client_rate = settings.CLIENT_RATE_PER_SEC
+        self.client_burst = settings.CLIENT_BURST
+        self.max_clients = settings.ADMISSION_MAX_CLIENTS
+        self.limiter = AdaptiveLimiter(
+            initial=settings.LLM_CONCURRENCY_INITIAL,
+            minimum=settings.LLM_CONCURRENCY_MIN,
+            maximum=settings.LLM_CONCURRENCY_MAX,
+            latency_tolerance=settings.LLM_LATENCY_TOLERANCE
+        )
+        self.scheduler = LLMScheduler(
+            self.limiter,
+            weights=parse_class_map(settings.SCHED_WEIGHTS, 1.0),
+            max_wait_s={
+                cls: ms / 1000 for cls, ms in parse_class_map(settings.SCHED_MAX_WAIT_MS, 5000).items()
+            },
+            starvation_s=settings.SCHED_STARVATION_MS / 1000
+        )
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "rejected_client_rate": 0, "rejected_queue_wait": 0}
+
+    def _take_client_token(self, client_key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client_key)
+            if bucket is None:
+                bucket = TokenBucket(self.client_rate, self.client_burst)
+                self._buckets[client_key] = bucket
+                if len(self._buckets) > self.max_clients:
+                    # Evicted clients start over with a full bucket; fine for a bound
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_key)
+            return bucket.try_take(now)
+
+    async def admit(self, client_key: str, priority: str = "interactive", urgent: bool = False) -> Optional[str]:
+        """
+        Admit one LLM call, waiting in the priority scheduler for a slot.
+        Returns None when admitted (caller must call release() afterwards)
+        or the rejection reason.
+        """
+        if not self.enabled:
+            return None
+        if not self._take_client_token(client_key):
+            self.stats["rejected_client_rate"] += 1
+            return "client rate limit"
+        if not await self.scheduler.acquire(priority, urgent):
+            self.stats["rejected_queue_wait"] += 1
+            return f"LLM queue wait exceeded for {priority} work"
+        self.stats["admitted"] += 1
+        return None
+
+    def release(self) -> None:
+        if self.enabled:
+            self.scheduler.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tracked = len(self._buckets)
+        return {
+            "enabled": self.enabled,
+            "tracked_clients": tracked,
+            **self.stats,
+            "limiter": self.limiter.snapshot(),
+            "scheduler": self.scheduler.snapshot(),
+        }
+
+
+def get_client_key(request: HTTPConnection) -> str:
+    """Admission key: hashed API key when presented, else the client IP."""
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def get_priority(request: HTTPConnection) -> Tuple[str, bool]:
+    """Priority class and urgent flag from X-Priority-Class / X-Urgent headers."""
+    priority = request.headers.get("x-priority-class", "interactive").strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        priority = "interactive"
+    urgent = request.headers.get("x-urgent", "").strip().lower() in ("1", "true", "yes")
+    return priority, urgent
+
+
+async def call_admitted(request: HTTPConnection, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+    """
+    Admit the request's LLM call, run it and release the slot.
+    Returns (result, None), or (None, rejection reason) when not admitted.
+    """
+    admission = get_admission_controller()
+    priority, urgent = get_priority(request)
+    rejection = await admission.admit(get_client_key(request), priority, urgent)
+    if rejection is not None:
+        return None, rejection
+    try:
+        return await call(), None
+    finally:
+        admission.release()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for provider 429s (openai RateLimitError, google ResourceExhausted)."""
+    return getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429
+
+
+# Singleton instance
+_admission_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the admission controller singleton instance."""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
@@ -0,0 +1,407 @@
+"""
+Analyzer - The safety analysis pipeline, built once at startup.
+
+Stages, in the order a request meets them:
+
+1. normalize   AnalysisInput: method upper-cased, spec and intent trimmed
+2. rules       keyword detectors, or the chat session's delta matchers
+3. classifier  local model; decides whether the LLM is needed at all
+4. cache       a cached LLM verdict for the same prompt is served without
+               taking an admission slot
+5. llm         admitted, cancellable LLM call (or its streaming form)
+6. overlay     session ratchet, abuse signals and the audit record
+
+main.py's lifespan constructs one Analyzer, runs warmup() and stores it on
+app.state.analyzer; routes receive it through dependencies.get_analyzer.
+Services and settings are resolved here once instead of on every request.
+warmup() pushes a sample request through the rules, classifier, cache and
+UI plan paths so imports, model load and connection setup happen before
+the first request rather than during it.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.requests import HTTPConnection
+
+from config import settings
+from services.abuse_service import AbuseSignals, apply_abuse_signals
+from services.admission_service import call_admitted, get_client_key
+from services.audit_spool import build_audit_record, get_audit_spool, verdict_risk_score
+from services.cache_service import get_shared_cache
+from services.classifier_service import Classification, get_classifier_service, merge_classification
+from services.inflight_service import drain_while, get_inflight_registry, get_supersede_key
+from services.llm_service import LLMService, get_llm_service
+from services.safety_service import analyze_request
+from services.session_service import VERDICT_FLAGS, AnalysisSession, get_session_store
+from services.trace_service import span
+from services.ui_service import generate_ui_plan
+
+
+@dataclass
+class AnalysisInput:
+    """One normalized request, as every stage sees it."""
+    method: str
+    endpoint: str
+    user_intent: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    api_spec: str = ""  # "METHOD /endpoint"
+
+    def __post_init__(self):
+        self.api_spec = f"{self.method} {self.endpoint}"
+
+
+def core_verdict(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The flags and explanation out of a full LLM result."""
+    return {
+        "urgency": result.get("urgency", False),
+        "threat": result.get("threat", False),
+        "sensitive_request": result.get("sensitive_request", False),
+        "explanation": result.get("explanation", "")
+    }
+
+
+def llm_source(result: Dict[str, Any]) -> str:
+    """Audit source for an LLM result: its own verdict, or the fail-closed one."""
+    return "fail_closed" if "analysis_error" in result.get("detected_patterns", []) else "llm"
+
+
+class Analyzer:
+    """Safety analysis pipeline shared by the HTTP and WebSocket routes."""
+
+    def __init__(self):
+        self.local_mode = settings.LOCAL_MODE
+        self.sessions = get_session_store()
+        self.classifier = get_classifier_service()
+        self.cache = get_shared_cache()
+        self.inflight = get_inflight_registry()
+        self.spool = get_audit_spool()
+        self.llm: Optional[LLMService] = None
+        if not self.local_mode:
+            try:
+                self.llm = get_llm_service()
+            except Exception as e:
+                # Requests needing the LLM retry the setup and fail closed meanwhile
+                print(f"[Analyzer] LLM provider not available at startup: {e}")
+        self.stats = {"requests": 0, "repeats": 0, "rules": 0, "classifier": 0, "cache_hits": 0, "llm": 0}
+
+    # Stage 1: normalize
+
+    @staticmethod
+    def normalize(method: str, endpoint: str, user_intent: str, payload: Optional[Dict[str, Any]] = None) -> AnalysisInput:
+        return AnalysisInput(
+            method=method.strip().upper(),
+            endpoint=endpoint.strip(),
+            user_intent=user_intent.strip(),
+            payload=payload or {}
+        )
+
+    def open_session(self, connection: HTTPConnection, session_id: Optional[str], reset: bool = False) -> Optional[AnalysisSession]:
+        if not session_id:
+            return None
+        return self.sessions.get(get_client_key(connection), session_id, reset=reset)
+
+    # Stage 2: rules
+
+    def rules(self, inp: AnalysisInput, session: Optional[AnalysisSession] = None, rejection: Optional[str] = None) -> Dict[str, Any]:
+        """Rules verdict, over this turn's delta when in a session."""
+        if session is not None:
+            verdict = session.analyze_delta(inp.api_spec, inp.user_intent)
+        else:
+            verdict = analyze_request(
+                api_spec=inp.api_spec,
+                user_intent=inp.user_intent,
+                example_payloads=[],
+                constructed_input=inp.payload
+            )
+        if rejection is not None:
+            # Over the admission limit: rules verdict instead of queuing for the LLM
+            verdict["explanation"] += f". LLM analysis skipped ({rejection}); rules verdict applied"
+        return verdict
+
+    # Stage 3: classifier
+
+    def classify(self, inp: AnalysisInput) -> Optional[Classification]:
+        if self.classifier is None:
+            return None
+        with span("analyzer.classify"):
+            return self.classifier.classify(inp.api_spec, inp.user_intent, inp.payload.keys())
+
+    def needs_llm(self, classification: Optional[Classification]) -> bool:
+        """LLM mode, unless the classifier is confident."""
+        return not self.local_mode and (classification is None or classification.escalate)
+
+    # Stages 4 and 5: cache, llm
+
+    def _llm_service(self) -> LLMService:
+        if self.llm is None:
+            self.llm = get_llm_service()
+        return self.llm
+
+    def _llm_context(self, inp: AnalysisInput, session: Optional[AnalysisSession]) -> Optional[str]:
+        return session.context() if session is not None else None
+
+    async def _cached(self, inp: AnalysisInput, session_context: Optional[str]) -> Optional[Dict[str, Any]]:
+        result = await self._llm_service().cached_safety(
+            api_spec=inp.api_spec,
+            user_intent=inp.user_intent,
+            example_payloads=[],
+            constructed_input=inp.payload,
+            session_context=session_context
+        )
+        if result is not None:
+            self.stats["cache_hits"] += 1
+        return result
+
+    async def _llm_analysis(self, inp: AnalysisInput, session_context: Optional[str]) -> Dict[str, Any]:
+        print(f"Using {settings.LLM_PROVIDER} LLM for safety analysis...", flush=True)
+        self.stats["llm"] += 1
+        return await self._llm_service().analyze_safety(
+            api_spec=inp.api_spec,
+            user_intent=inp.user_intent,
+            example_payloads=[],
+            constructed_input=inp.payload,
+            session_context=session_context
+        )
+
+    async def _llm_stream(
+        self,
+        inp: AnalysisInput,
+        session_context: Optional[str],
+        on_lockdown: Callable[[Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        """Streaming _llm_analysis(): lockdown events go to on_lockdown, the final result is returned."""
+        self.stats["llm"] += 1
+        result: Dict[str, Any] = {}
+        async for event in self._llm_service().stream_safety(
+            api_spec=inp.api_spec,
+            user_intent=inp.user_intent,
+            example_payloads=[],
+            constructed_input=inp.payload,
+            session_context=session_context
+        ):
+            if event["event"] == "lockdown":
+                on_lockdown(event)
+            else:
+                result = event["verdict"]
+        return result
+
+    # Stage 6: overlay
+
+    def overlay(
+        self,
+        inp: AnalysisInput,
+        session: Optional[AnalysisSession],
+        verdict: Dict[str, Any],
+        source: str,
+        signals: Optional[AbuseSignals],
+        ui_contract: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Fold the verdict into the session, add abuse signals and write the audit record.
+        source is "llm", "cache" (a cached LLM verdict), "fail_closed", "classifier"
+        or "rules"; it is audited (as "overlay" when the session or abuse signals
+        changed a flag) so classifier training can pick out the LLM's own labels
+        once per input.
+        """
+        turn_flags = {flag: bool(verdict.get(flag)) for flag in VERDICT_FLAGS}
+        if session is not None:
+            # Failed analyses answer this turn strictly without locking in the session
+            verdict = session.record_turn(inp.api_spec, inp.user_intent, verdict, fold=source != "fail_closed")
+        # Flood/scan signals describe the client right now, so they are not folded into the session
+        verdict = apply_abuse_signals(verdict, signals)
+        if any(bool(verdict.get(flag)) != turn_flags[flag] for flag in VERDICT_FLAGS):
+            source = "overlay"
+
+        # Audit log: spooled locally, shipped to Supabase in the background
+        if self.spool:
+            self.spool.append(build_audit_record(
+                api_spec_text=inp.api_spec,
+                user_intent=inp.user_intent,
+                verdict={**verdict, "source": source},
+                ui_contract=ui_contract or {},
+                risk_score=verdict_risk_score(verdict),
+                endpoint=inp.endpoint
+            ))
+        return verdict
+
+    # Whole pipeline
+
+    async def analyze(
+        self,
+        request: Request,
+        inp: AnalysisInput,
+        session: Optional[AnalysisSession],
+        signals: Optional[AbuseSignals]
+    ) -> Dict[str, Any]:
+        """
+        Verdict for one /analyze-api request. The LLM call is cancelled (raising
+        RequestCancelled) on disconnect or when superseded via X-Supersede-Key.
+        """
+        verdict, _ = await self._analyze(
+            request, inp, session, signals,
+            lambda work: self.inflight.run(request, work, supersede_key=get_supersede_key(request))
+        )
+        return verdict
+
+    async def explore(
+        self,
+        connection: HTTPConnection,
+        inp: AnalysisInput,
+        signals: Optional[AbuseSignals]
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        analyze() for the explorer's settled input, returning (verdict, source).
+        No session, and the explorer cancels its own task on the next edit.
+        """
+        return await self._analyze(connection, inp, None, signals, lambda work: work)
+
+    async def _analyze(
+        self,
+        connection: HTTPConnection,
+        inp: AnalysisInput,
+        session: Optional[AnalysisSession],
+        signals: Optional[AbuseSignals],
+        run: Callable[[Awaitable[Tuple[Any, Optional[str]]]], Awaitable[Tuple[Any, Optional[str]]]]
+    ) -> Tuple[Dict[str, Any], str]:
+        """The whole pipeline; `run` wraps the admitted LLM call (cancellation)."""
+        self.stats["requests"] += 1
+        if session is not None and session.is_repeat(inp.api_spec, inp.user_intent):
+            self.stats["repeats"] += 1
+            return apply_abuse_signals(session.current_verdict(), signals), "repeat"
+
+        rejection = None
+        classification = self.classify(inp)
+        if self.needs_llm(classification):
+            session_context = self._llm_context(inp, session)
+            cached = await self._cached(inp, session_context)
+            if cached is not None:
+                return self.overlay(inp, session, core_verdict(cached), "cache", signals), "cache"
+            result, rejection = await run(
+                call_admitted(connection, lambda: self._llm_analysis(inp, session_context))
+            )
+            if rejection is None:
+                source = llm_source(result)
+                return self.overlay(inp, session, core_verdict(result), source, signals), source
+
+        # Rules plus the classifier (LOCAL_MODE=1, confident classifier, or not admitted)
+        return self._rules_and_classifier(inp, session, classification, rejection, signals)
+
+    def _rules_and_classifier(
+        self,
+        inp: AnalysisInput,
+        session: Optional[AnalysisSession],
+        classification: Optional[Classification],
+        rejection: Optional[str],
+        signals: Optional[AbuseSignals]
+    ) -> Tuple[Dict[str, Any], str]:
+        source = "classifier" if classification else "rules"
+        self.stats[source] += 1
+        verdict = merge_classification(self.rules(inp, session, rejection), classification)
+        return self.overlay(inp, session, verdict, source, signals), source
+
+    async def stream(
+        self,
+        connection: HTTPConnection,
+        inp: AnalysisInput,
+        session: Optional[AnalysisSession],
+        signals: Optional[AbuseSignals]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming analyze(): yields at most one {"event": "lockdown", "verdict": partial}
+        and then exactly one {"event": "verdict", "verdict": ...}. Cancelled like
+        analyze(), raising RequestCancelled before the verdict.
+        """
+        self.stats["requests"] += 1
+        if session is not None and session.is_repeat(inp.api_spec, inp.user_intent):
+            self.stats["repeats"] += 1
+            yield {"event": "verdict", "verdict": apply_abuse_signals(session.current_verdict(), signals)}
+            return
+
+        rejection = None
+        classification = self.classify(inp)
+        if self.needs_llm(classification):
+            session_context = self._llm_context(inp, session)
+            cached = await self._cached(inp, session_context)
+            if cached is not None:
+                yield {"event": "verdict", "verdict": self.overlay(inp, session, core_verdict(cached), "cache", signals)}
+                return
+            lockdowns: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+            running = asyncio.ensure_future(self.inflight.run(
+                connection,
+                call_admitted(connection, lambda: self._llm_stream(inp, session_context, lockdowns.put_nowait)),
+                supersede_key=get_supersede_key(connection)
+            ))
+            try:
+                async for event in drain_while(running, lockdowns):
+                    yield event
+                result, rejection = running.result()
+            finally:
+                # Closed early (the response was abandoned): take the LLM call with it
+                running.cancel()
+            if rejection is None:
+                verdict = self.overlay(inp, session, core_verdict(result), llm_source(result), signals)
+                yield {"event": "verdict", "verdict": verdict}
+                return
+
+        verdict, _ = self._rules_and_classifier(inp, session, classification, rejection, signals)
+        yield {"event": "verdict", "verdict": verdict}
+
+    async def suggest_ui(self, request: Request, verdict: Dict[str, Any], api_spec: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        LLM UI suggestions for a verdict, admitted and cancellable like analyze().
+        Returns (None, None) in LOCAL_MODE or without an api_spec, (None, reason)
+        when not admitted.
+        """
+        if self.local_mode or not api_spec:
+            return None, None
+
+        async def suggest():
+            print(f"Using {settings.LLM_PROVIDER} LLM for UI plan generation...", flush=True)
+            return await self._llm_service().generate_ui_suggestions(verdict=verdict, api_spec=api_spec)
+
+        return await self.inflight.run(
+            request,
+            call_admitted(request, suggest),
+            supersede_key=get_supersede_key(request)
+        )
+
+    # Startup
+
+    def warmup(self) -> Dict[str, float]:
+        """
+        Run a sample request through each stage so lazy imports, the classifier
+        model, the cache connection and the LLM client are set up before the
+        first request. Returns milliseconds per stage.
+        """
+        sample = self.normalize("POST", "/payments", "Urgently refund the card_number on my account", {"cvv": "000"})
+        timings: Dict[str, float] = {}
+
+        def timed(stage: str, work) -> None:
+            started = time.perf_counter()
+            try:
+                work()
+            except Exception as e:
+                print(f"[Analyzer] Warmup of {stage} failed: {e}")
+            timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+        timed("rules", lambda: (
+            self.rules(sample),
+            AnalysisSession("warmup").analyze_delta(sample.api_spec, sample.user_intent)
+        ))
+        if self.classifier is not None:
+            timed("classifier", lambda: (self.classifier.reload(), self.classify(sample)))
+        if self.cache is not None:
+            timed("cache", lambda: self.cache.get("warmup:probe"))
+        if self.llm is not None:
+            # Sets up the client and builds the prompt; no provider call is made
+            timed("llm", lambda: self._llm_service().safety_cache_key(
+                sample.api_spec, sample.user_intent, [], sample.payload
+            ))
+        timed("ui", lambda: generate_ui_plan(self.rules(sample)))
+        return timings
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"local_mode": self.local_mode, **self.stats}
@@ -0,0 +1,353 @@
+"""
+Audit Spool - Durable local buffer for audit records bound for Supabase.
+
+Request handlers call `append()`, which only queues the record in memory
+(microseconds). The queue is capped; if the writer falls that far behind
+the oldest queued records are dropped (counted in stats). A writer thread commits queued records to a SQLite
+database in WAL mode in batches, so one fsync covers many verdicts. A
+shipper thread claims unshipped rows with a lease and sends them to
+Supabase in bulk; every row carries a client-generated UUID that is used
+as the primary key upstream, so retries and concurrent shippers (one per
+worker) never create duplicates. Request latency does not depend on
+Supabase health.
+
+Compaction deletes shipped rows past the retention window and enforces a
+disk budget, dropping the oldest shipped rows first and, only if that is
+not enough, the oldest unshipped rows (counted in stats).
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from config import settings
+from services import trace_service
+
+logger = logging.getLogger("policy-aware-api")
+
+# Shipper backoff after a failed batch, doubled per consecutive failure
+SHIP_BACKOFF_MIN_S = 1.0
+SHIP_BACKOFF_MAX_S = 60.0
+# How long a claimed batch is reserved for one shipper before others may retry it
+SHIP_LEASE_S = 30.0
+COMPACT_EVERY_S = 30.0
+# Rows deleted per step while enforcing the disk budget
+COMPACT_STEP_ROWS = 100
+
+
+class AuditSpool:
+    """Append-only local audit log with batched fsync and background shipping."""
+
+    def __init__(
+        self,
+        path: str,
+        ship: Callable[[List[Dict[str, Any]]], bool],
+        flush_interval_s: float = 0.05,
+        batch_size: int = 256,
+        ship_batch_size: int = 500,
+        ship_interval_s: float = 1.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        retention_s: float = 24 * 3600,
+        max_pending: int = 50000
+    ):
+        self.path = path
+        self._ship = ship
+        self.flush_interval_s = flush_interval_s
+        self.batch_size = batch_size
+        self.ship_batch_size = ship_batch_size
+        self.ship_interval_s = ship_interval_s
+        self.max_bytes = max_bytes
+        self.retention_s = retention_s
+        self.max_pending = max_pending
+
+        self._pending: Deque[tuple] = deque()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "appended": 0, "written": 0, "write_batches": 0, "shipped": 0,
+            "ship_batches": 0, "ship_failures": 0, "dropped_pending": 0, "dropped_unshipped": 0, "compactions": 0,
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on a new file
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT NOT NULL UNIQUE, "
+            "payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "lease_until REAL, "
+            "shipped_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS spool_unshipped ON spool(seq) WHERE shipped_at IS NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS spool_shipped ON spool(shipped_at) WHERE shipped_at IS NOT NULL")
+        conn.close()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="audit-spool-writer", daemon=True)
+        self._shipper = threading.Thread(target=self._shipper_loop, name="audit-spool-shipper", daemon=True)
+        self._writer.start()
+        self._shipper.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")  # fsync per commit; commits are batched
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA journal_size_limit=8388608")  # Truncate the WAL back to 8 MB after checkpoints
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def append(self, record: Dict[str, Any], record_id: Optional[str] = None) -> str:
+        """
+        Queue an audit record for durable write and shipping.
+        Returns its idempotency key. Never blocks on disk or network.
+        """
+        record_id = record_id or str(uuid.uuid4())
+        if len(self._pending) >= self.max_pending:
+            try:
+                self._pending.popleft()
+            except IndexError:
+                pass  # The writer just took the batch
+            else:
+                self._count("dropped_pending")
+                if self.stats["dropped_pending"] % 1000 == 1:
+                    logger.error(f"Audit spool writer behind by {self.max_pending} records; dropping the oldest")
+        self._pending.append((record_id, json.dumps(record, default=str), time.time()))
+        self._count("appended")
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return record_id
+
+    def _writer_loop(self) -> None:
+        conn = self._connect()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            self._flush(conn)
+        self._flush(conn)
+        conn.close()
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        while self._pending:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popleft())
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO spool (id, payload, created_at) VALUES (?, ?, ?)", batch
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.error(f"Audit spool write failed, requeueing {len(batch)} records: {e}")
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                self._pending.extendleft(reversed(batch))
+                return
+            self._count("written", len(batch))
+            self._count("write_batches")
+
+    def _claim(self, conn: sqlite3.Connection) -> List[sqlite3.Row]:
+        now = time.time()
+        return conn.execute(
+            "UPDATE spool SET lease_until = ? WHERE seq IN ("
+            "  SELECT seq FROM spool WHERE shipped_at IS NULL "
+            "  AND (lease_until IS NULL OR lease_until < ?) ORDER BY seq LIMIT ?"
+            ") RETURNING seq, id, payload",
+            (now + SHIP_LEASE_S, now, self.ship_batch_size)
+        ).fetchall()
+
+    def _ship_unshipped(self, conn: sqlite3.Connection) -> bool:
+        """Ship claimed batches until none are left; False if a batch failed (its lease is released)."""
+        rows = self._claim(conn)
+        while rows:
+            records = [{"id": row[1], **json.loads(row[2])} for row in rows]
+            if not self._ship(records):
+                conn.execute(
+                    f"UPDATE spool SET lease_until = NULL WHERE seq IN ({','.join('?' * len(rows))})",
+                    [row[0] for row in rows]
+                )
+                self._count("ship_failures")
+                return False
+            conn.execute(
+                f"UPDATE spool SET shipped_at = ? WHERE seq IN ({','.join('?' * len(rows))})",
+                [time.time(), *[row[0] for row in rows]]
+            )
+            self._count("shipped", len(rows))
+            self._count("ship_batches")
+            rows = self._claim(conn)
+        return True
+
+    def _shipper_loop(self) -> None:
+        conn = self._connect()
+        backoff = 0.0
+        last_compaction = 0.0
+        while not self._stopping.wait(backoff or self.ship_interval_s):
+            try:
+                if self._ship_unshipped(conn):
+                    backoff = 0.0
+                else:
+                    backoff = min(SHIP_BACKOFF_MAX_S, max(SHIP_BACKOFF_MIN_S, backoff * 2))
+
+                if time.monotonic() - last_compaction >= COMPACT_EVERY_S:
+                    self._compact(conn)
+                    last_compaction = time.monotonic()
+            except Exception as e:
+                logger.error(f"Audit spool shipper error: {e}")
+                backoff = min(SHIP_BACKOFF_MAX_S, max(SHIP_BACKOFF_MIN_S, backoff * 2))
+        conn.close()
+
+    def _size_bytes(self) -> int:
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def _compact(self, conn: sqlite3.Connection) -> None:
+        """Apply retention and the disk budget, then return free pages to the OS."""
+        conn.execute(
+            "DELETE FROM spool WHERE shipped_at IS NOT NULL AND shipped_at < ?",
+            (time.time() - self.retention_s,)
+        )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        for shipped_only in (True, False):
+            while True:
+                (pages,) = conn.execute("PRAGMA page_count").fetchone()
+                (free,) = conn.execute("PRAGMA freelist_count").fetchone()
+                if (pages - free) * page_size <= self.max_bytes:
+                    break
+                where = "shipped_at IS NOT NULL" if shipped_only else "1 = 1"
+                deleted = conn.execute(
+                    f"DELETE FROM spool WHERE seq IN (SELECT seq FROM spool WHERE {where} ORDER BY seq LIMIT ?)",
+                    (COMPACT_STEP_ROWS,)
+                ).rowcount
+                if not deleted:
+                    break
+                if not shipped_only:
+                    self._count("dropped_unshipped", deleted)
+                    logger.error(f"Audit spool over {self.max_bytes} bytes; dropped {deleted} unshipped records")
+
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._count("compactions")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        try:
+            conn = self._connect()
+            (backlog,) = conn.execute("SELECT COUNT(*) FROM spool WHERE shipped_at IS NULL").fetchone()
+            conn.close()
+        except sqlite3.Error:
+            backlog = None
+        return {
+            **stats,
+            "in_memory": len(self._pending),
+            "unshipped": backlog,
+            "size_bytes": self._size_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self, timeout_s: float = 5.0) -> None:
+        """Flush queued records to disk and stop the background threads."""
+        self._stopping.set()
+        self._wakeup.set()
+        self._writer.join(timeout_s)
+        self._shipper.join(timeout_s)
+
+
+def build_audit_record(
+    api_spec_text: str,
+    user_intent: str,
+    verdict: Dict[str, Any],
+    ui_contract: Dict[str, Any],
+    risk_score: float,
+    endpoint: Optional[str] = None,
+    spec_name: str = "API Spec"
+) -> Dict[str, Any]:
+    """Shape one analysis into the rows shipped to api_specs and safety_verdicts."""
+    return {
+        "api_spec": {"id": str(uuid.uuid4()), "name": spec_name, "spec_text": api_spec_text},
+        "endpoint": endpoint,
+        "user_intent": user_intent,
+        "verdict_json": verdict,
+        "ui_contract_json": ui_contract,
+        "risk_score": risk_score,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def verdict_risk_score(verdict: Dict[str, Any]) -> float:
+    """Coarse risk score stored with audited verdicts."""
+    return 1.0 if verdict.get("threat") else 0.5 if verdict.get("sensitive_request") else 0.0
+
+
+def _ship_to_supabase(records: List[Dict[str, Any]]) -> bool:
+    from services.supabase_service import get_supabase_service
+
+    if not trace_service.sampled(settings.TRACE_SAMPLE_RATE):
+        return get_supabase_service().insert_audit_batch(records)
+    # The shipper thread has no request trace, so a sampled batch gets its own
+    with trace_service.start_trace("audit.ship", **{"audit.records": len(records)}) as root:
+        shipped = get_supabase_service().insert_audit_batch(records)
+        root.set("audit.shipped", shipped)
+        return shipped
+
+
+# Singleton instance
+_audit_spool: Optional[AuditSpool] = None
+_audit_spool_lock = threading.Lock()
+_unconfigured_logged = False
+
+
+def get_audit_spool() -> Optional[AuditSpool]:
+    """
+    Get the audit spool singleton (starts its threads), or None when disabled.
+    Without Supabase credentials nothing could ever ship, so there is no spool.
+    """
+    global _audit_spool, _unconfigured_logged
+    if _audit_spool is None and settings.AUDIT_SPOOL_ENABLED:
+        if not (settings.SUPABASE_URL and settings.SUPABASE_KEY):
+            if not _unconfigured_logged:
+                _unconfigured_logged = True
+                logger.warning("Supabase credentials not set. Audit logging disabled.")
+            return None
+        with _audit_spool_lock:
+            if _audit_spool is None:
+                if not settings.LOCAL_MODE:
+                    # The shipper thread imports the Supabase SDK, and with it httpx. Some
+                    # openai releases read sys.modules["httpx"] without the import lock and
+                    # fail on a half-imported module, so finish that import before the thread starts.
+                    import httpx  # noqa: F401
+                _audit_spool = AuditSpool(
+                    settings.AUDIT_SPOOL_PATH,
+                    ship=_ship_to_supabase,
+                    flush_interval_s=settings.AUDIT_SPOOL_FLUSH_MS / 1000,
+                    ship_batch_size=settings.AUDIT_SPOOL_SHIP_BATCH,
+                    max_bytes=settings.AUDIT_SPOOL_MAX_MB * 1024 * 1024,
+                    retention_s=settings.AUDIT_SPOOL_RETENTION_HOURS * 3600,
+                    max_pending=settings.AUDIT_SPOOL_MAX_PENDING
+                )
+    return _audit_spool
+
+
+def close_audit_spool() -> None:
+    """Flush and stop the spool (application shutdown)."""
+    global _audit_spool
+    if _audit_spool is not None:
+        _audit_spool.close()
+        _audit_spool = None
@@ -0,0 +1,199 @@
+"""
+Cache Service - Cross-worker cache tier backed by SQLite in WAL mode.
+
+All uvicorn workers on a host open the same database file, so a response
+cached by one worker is a hit for every other worker. WAL lets readers
+proceed while a writer commits; the page cache per connection is capped
+and the file is memory-mapped, so the OS page cache (shared between
+processes) holds the hot set instead of N private copies.
+
+Hit/miss counters are kept in memory and folded into the database in
+batches to avoid a write on every lookup.
+
+A lookup can wait on another worker's write lock, so async callers use
+aget()/aset(), which run in a thread, and a lock held past BUSY_TIMEOUT_MS
+is a miss (or a skipped write) rather than a stall.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger("policy-aware-api")
+
+# Fold local hit/miss counters into the shared table after this many lookups or seconds
+STATS_FLUSH_EVERY = 256
+STATS_FLUSH_SECONDS = 1.0
+# Run expiry/trim on roughly one in this many writes
+EVICT_EVERY = 64
+# Longest wait for another worker's write lock; the cache is best-effort
+BUSY_TIMEOUT_MS = 250
+
+
+class SharedCache:
+    """
+    Key-value cache shared by all worker processes on a host.
+    Values are JSON-serializable. Fail-safe: errors degrade to cache misses.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0, "sets": 0}
+        self._last_flush = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries(expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)",
+            [(name,) for name in self._pending]
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA cache_size=-2048")  # 2 MB private page cache
+            conn.execute("PRAGMA mmap_size=67108864")  # Shared OS page cache does the rest
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self._pending[name] += 1
+            now = time.monotonic()
+            if sum(self._pending.values()) < STATS_FLUSH_EVERY and now - self._last_flush < STATS_FLUSH_SECONDS:
+                return
+            pending, self._pending = self._pending, {k: 0 for k in self._pending}
+            self._last_flush = now
+        self._flush_stats(pending)
+
+    def _flush_stats(self, pending: Dict[str, int]) -> None:
+        try:
+            self._connection().executemany(
+                "UPDATE stats SET value = value + ? WHERE name = ?",
+                [(value, name) for name, value in pending.items() if value]
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache stats flush failed: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on miss/expiry/error."""
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return None
+
+        self._count("hits" if row else "misses")
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        """Store a value. Last writer wins."""
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            if random.randrange(EVICT_EVERY) == 0:
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache write failed: {e}")
+            return
+        self._count("sets")
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() in a worker thread, for use on the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        """set() in a worker thread, for use on the event loop."""
+        await asyncio.to_thread(self.set, key, value, ttl_seconds)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop expired entries, then the soonest-to-expire beyond max_entries."""
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY expires_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Host-wide counters (all workers) plus this process's unflushed deltas."""
+        with self._counter_lock:
+            pending = dict(self._pending)
+        try:
+            conn = self._connection()
+            totals = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            (entries,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        except sqlite3.Error as e:
+            return {"error": str(e)}
+
+        for name, value in pending.items():
+            totals[name] = totals.get(name, 0) + value
+        lookups = totals.get("hits", 0) + totals.get("misses", 0)
+        size_bytes = sum(
+            os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p)
+        )
+        return {
+            "backend": "sqlite-wal",
+            "entries": entries,
+            "hits": totals.get("hits", 0),
+            "misses": totals.get("misses", 0),
+            "sets": totals.get("sets", 0),
+            "hit_rate": round(totals.get("hits", 0) / lookups, 4) if lookups else 0.0,
+            "size_bytes": size_bytes,
+        }
+
+
+# Singleton instance (per worker process; the data itself is shared)
+_shared_cache: Optional[SharedCache] = None
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Get the shared cache singleton, or None when caching is disabled."""
+    global _shared_cache
+    if _shared_cache is None and settings.CACHE_ENABLED:
+        try:
+            _shared_cache = SharedCache(
+                settings.CACHE_PATH,
+                ttl_seconds=settings.CACHE_TTL_SECONDS,
+                max_entries=settings.CACHE_MAX_ENTRIES
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open shared cache at {settings.CACHE_PATH}: {e}")
+            return None
+    return _shared_cache
@@ -0,0 +1,220 @@
+"""
+Classifier Service - Hashed n-gram linear model between the rules and the LLM.
+
+Features are word unigrams and bigrams of the user intent, tokens of the
+API spec and payload keys, hashed into 2**bits buckets (crc32, so
+training and serving agree across processes). The model is one logistic
+regression per category stored as an .npz file:
+
+    weights   float32 (2**bits, 3)    columns: urgency, threat, sensitive_request
+    bias      float32 (3,)
+    bits      int
+    version   str
+
+Scoring a request is a gather and a sum over its feature rows. The model
+file is checked for a new mtime at most every CLASSIFIER_RELOAD_SECONDS, so
+a retrained model (see train_classifier.py) is picked up without a
+restart. The new file is loaded in a background thread while requests keep
+using the current model; only reload() (startup warmup) loads in place. NumPy is imported only once a model file exists; without a model
+(or without NumPy) classify() returns None and callers keep their current
+path.
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from config import settings
+
+CATEGORIES = ("urgency", "threat", "sensitive_request")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def extract_features(api_spec: str, user_intent: str, payload_keys: Iterable[str]) -> List[str]:
+    """Named features for one request; hashed by feature_indexes()."""
+    intent = _TOKEN.findall(user_intent.lower())
+    features = [f"i:{token}" for token in intent]
+    features += [f"i2:{a} {b}" for a, b in zip(intent, intent[1:])]
+    features += [f"s:{token}" for token in _TOKEN.findall(api_spec.lower())]
+    for key in payload_keys:
+        key = key.lower()
+        features.append(f"k:{key}")
+        features += [f"kt:{token}" for token in _TOKEN.findall(key)]
+    # Always present, so every request has at least one feature row
+    features.append(f"n:{min(len(intent) // 4, 8)}")
+    return features
+
+
+def feature_indexes(features: Sequence[str], bits: int) -> List[int]:
+    """Distinct hashed buckets for named features."""
+    mask = (1 << bits) - 1
+    return sorted({zlib.crc32(feature.encode("utf-8")) & mask for feature in features})
+
+
+@dataclass
+class Classification:
+    """Model output for one request."""
+    probabilities: Dict[str, float]
+    confidence: float  # Lowest per-category max(p, 1 - p)
+    escalate: bool  # Below CLASSIFIER_CONFIDENCE: ask the LLM
+    version: str
+
+    def flags(self) -> Dict[str, bool]:
+        return {category: p >= 0.5 for category, p in self.probabilities.items()}
+
+
+class LinearModel:
+    """Weights for one model version."""
+
+    def __init__(self, weights: "Any", bias: "Any", bits: int, version: str):
+        if weights.shape != (1 << bits, len(CATEGORIES)) or bias.shape != (len(CATEGORIES),):
+            raise ValueError(f"Model {version}: weights {weights.shape} do not match bits={bits}")
+        self.weights = weights
+        self.bias = bias
+        self.bits = bits
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str) -> "LinearModel":
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["weights"].astype(np.float32), data["bias"].astype(np.float32),
+                int(data["bits"]), str(data["version"])
+            )
+
+    def score_batch(self, rows: Sequence[Sequence[int]]) -> "Any":
+        """Probabilities, shape (len(rows), 3), for feature index rows (each non-empty)."""
+        import numpy as np
+
+        if len(rows) == 1:
+            # Single request: skip the flattening, which dominates at this size
+            logits = self.weights[list(rows[0])].sum(axis=0, keepdims=True) + self.bias
+            return 1.0 / (1.0 + np.exp(-logits))
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+        flat = np.fromiter((i for row in rows for i in row), dtype=np.int64, count=int(lengths.sum()))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        logits = np.add.reduceat(self.weights[flat], offsets, axis=0) + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+
+class ClassifierService:
+    """Serves the current model file, reloading it when it changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.model: Optional[LinearModel] = None
+        self._mtime_ns: Optional[int] = None
+        self._next_check = 0.0
+        self._loader: Optional[threading.Thread] = None
+        self.stats = {"classified": 0, "escalated": 0, "reloads": 0, "load_errors": 0}
+
+    def current_model(self) -> Optional[LinearModel]:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + settings.CLASSIFIER_RELOAD_SECONDS
+            mtime_ns = self._changed_mtime()
+            if mtime_ns is not None and (self._loader is None or not self._loader.is_alive()):
+                # Reading the file blocks; callers keep the current model until it is swapped in
+                self._mtime_ns = mtime_ns
+                self._loader = threading.Thread(target=self._load, name="classifier-reload", daemon=True)
+                self._loader.start()
+        return self.model
+
+    def reload(self) -> None:
+        """Load the model file now if it changed, in the calling thread."""
+        mtime_ns = self._changed_mtime()
+        if mtime_ns is not None:
+            self._mtime_ns = mtime_ns
+            self._load()
+
+    def _changed_mtime(self) -> Optional[int]:
+        """mtime of the model file if it differs from the loaded one."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None  # No model yet (or it was removed); keep serving what is loaded
+        return None if mtime_ns == self._mtime_ns else mtime_ns
+
+    def _load(self) -> None:
+        try:
+            self.model = LinearModel.load(self.path)
+            self.stats["reloads"] += 1
+            print(f"[Classifier] Loaded model {self.model.version} from {self.path}")
+        except Exception as e:
+            # ImportError (no NumPy) included; a bad file never replaces a good model
+            self.stats["load_errors"] += 1
+            print(f"[Classifier] Could not load {self.path}: {e}")
+
+    def classify_batch(self, requests: Sequence[Dict[str, Any]]) -> Optional[List[Classification]]:
+        """
+        Classify dicts with api_spec, user_intent and optional payload_keys.
+        Returns None when no model is loaded.
+        """
+        model = self.current_model()
+        if model is None or not requests:
+            return None
+        rows = [
+            feature_indexes(
+                extract_features(r["api_spec"], r["user_intent"], r.get("payload_keys", ())), model.bits
+            )
+            for r in requests
+        ]
+        probabilities = model.score_batch(rows)
+        results = []
+        for row in probabilities.tolist():
+            confidence = min(max(p, 1.0 - p) for p in row)
+            escalate = confidence < settings.CLASSIFIER_CONFIDENCE
+            results.append(Classification(
+                probabilities={c: round(p, 4) for c, p in zip(CATEGORIES, row)},
+                confidence=round(confidence, 4),
+                escalate=escalate,
+                version=model.version
+            ))
+            self.stats["classified"] += 1
+            self.stats["escalated"] += escalate
+        return results
+
+    def classify(self, api_spec: str, user_intent: str, payload_keys: Iterable[str] = ()) -> Optional[Classification]:
+        """Classify one request; None when no model is loaded."""
+        results = self.classify_batch([
+            {"api_spec": api_spec, "user_intent": user_intent, "payload_keys": list(payload_keys)}
+        ])
+        return results[0] if results else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "version": self.model.version if self.model else None,
+            **self.stats,
+        }
+
+
+def merge_classification(verdict: Dict[str, Any], result: Optional[Classification]) -> Dict[str, Any]:
+    """OR the classifier's flags into a rules verdict and note them in the explanation."""
+    if result is None:
+        return verdict
+    verdict = dict(verdict)
+    flagged = [c for c, flag in result.flags().items() if flag]
+    for category in flagged:
+        verdict[category] = True
+    scores = ", ".join(f"{c} {result.probabilities[c]:.2f}" for c in flagged) or "no concerns"
+    verdict["explanation"] = f"{verdict.get('explanation', '')}. Classifier {result.version}: {scores}"
+    return verdict
+
+
+# Singleton instance
+_classifier_service: Optional[ClassifierService] = None
+
+
+def get_classifier_service() -> Optional[ClassifierService]:
+    """Get the classifier service singleton, or None when disabled."""
+    global _classifier_service
+    if _classifier_service is None and settings.CLASSIFIER_ENABLED:
+        _classifier_service = ClassifierService(settings.CLASSIFIER_MODEL_PATH)
+    return _classifier_service
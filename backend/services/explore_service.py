@@ -0,0 +1,121 @@
+"""
+Explore Service - Live analysis for one explorer WebSocket connection.
+
+The explorer sends an edit for every change to the endpoint, method,
+intent or payload. Each edit is merged into the connection's state and
+answered right away with the rules verdict and UI plan (microseconds; no
+HTTP request, middleware stack or JSON body parsing per edit). Once the
+input has settled for the debounce window it goes through the same
+pipeline as /analyze-api (classifier, cache, admitted LLM call, abuse
+signals, audit); a new edit cancels a pending or in-flight analysis, so
+typing never queues stale work.
+
+Messages pushed back carry the edit sequence number they reflect, so the
+client can drop anything older than its latest edit.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi.requests import HTTPConnection
+from pydantic import BaseModel, Field
+
+from config import settings
+from services.abuse_service import apply_abuse_signals, get_connection_signals
+from services.analyzer import AnalysisInput, Analyzer
+from services.ui_service import generate_ui_plan
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Process-wide counters for GET /metrics
+EXPLORE_STATS = {
+    "connections": 0, "open": 0, "edits": 0, "settled": 0,
+    "settle_cancelled": 0, "rules_us_max": 0.0,
+}
+
+
+class ExploreEdit(BaseModel):
+    """One incremental edit; omitted fields keep their previous value."""
+    endpoint: Optional[str] = Field(default=None, max_length=2048)
+    method: Optional[str] = Field(default=None, max_length=16)
+    user_intent: Optional[str] = Field(default=None, max_length=8192)
+    payload: Optional[Dict[str, Any]] = None
+
+
+class ExploreSession:
+    """State and pending LLM work for one connection."""
+
+    def __init__(self, connection: HTTPConnection, send: Send, analyzer: Analyzer):
+        self.connection = connection
+        self.send = send
+        self.analyzer = analyzer
+        self.endpoint = ""
+        self.method = "GET"
+        self.user_intent = ""
+        self.payload: Dict[str, Any] = {}
+        self.seq = 0
+        self._settle_task: Optional["asyncio.Task[None]"] = None
+        EXPLORE_STATS["connections"] += 1
+        EXPLORE_STATS["open"] += 1
+
+    def _input(self) -> AnalysisInput:
+        return self.analyzer.normalize(self.method, self.endpoint, self.user_intent, dict(self.payload))
+
+    async def edit(self, edit: ExploreEdit) -> None:
+        """Apply an edit, push the rules verdict and (re)start the debounce timer."""
+        for name, value in edit.model_dump(exclude_none=True).items():
+            setattr(self, name, value.upper() if name == "method" else value)
+        self.seq += 1
+        EXPLORE_STATS["edits"] += 1
+
+        started = time.perf_counter()
+        verdict = apply_abuse_signals(self.analyzer.rules(self._input()), get_connection_signals(self.connection))
+        ui_plan = generate_ui_plan(verdict)
+        rules_us = round((time.perf_counter() - started) * 1e6, 1)
+        EXPLORE_STATS["rules_us_max"] = max(EXPLORE_STATS["rules_us_max"], rules_us)
+
+        await self.send({
+            "type": "verdict", "source": "rules", "seq": self.seq,
+            "verdict": verdict, "ui_plan": ui_plan, "rules_us": rules_us
+        })
+        if not self.analyzer.local_mode:
+            self._schedule(settings.WS_DEBOUNCE_MS / 1000)
+
+    def analyze_now(self) -> None:
+        """Skip the debounce window (the user pressed Analyze)."""
+        if not self.analyzer.local_mode and self.seq:
+            self._schedule(0.0)
+
+    def _schedule(self, delay_s: float) -> None:
+        self.cancel()
+        self._settle_task = asyncio.ensure_future(self._settle(self.seq, delay_s))
+
+    def cancel(self) -> None:
+        """Cancel the pending or in-flight analysis, if any."""
+        if self._settle_task is not None and not self._settle_task.done():
+            self._settle_task.cancel()
+        self._settle_task = None
+
+    def close(self) -> None:
+        self.cancel()
+        EXPLORE_STATS["open"] -= 1
+
+    async def _settle(self, seq: int, delay_s: float) -> None:
+        await asyncio.sleep(delay_s)
+        try:
+            await self._analyze_settled(seq)
+        except asyncio.CancelledError:
+            EXPLORE_STATS["settle_cancelled"] += 1
+            raise
+        except Exception as e:
+            print(f"Error in explore analysis: {e}")
+
+    async def _analyze_settled(self, seq: int) -> None:
+        # Snapshot the settled input; later edits cancel this task
+        inp = self._input()
+        EXPLORE_STATS["settled"] += 1
+        verdict, source = await self.analyzer.explore(self.connection, inp, get_connection_signals(self.connection))
+        await self.send({
+            "type": "verdict", "source": source, "seq": seq,
+            "verdict": verdict, "ui_plan": generate_ui_plan(verdict)
+        })
@@ -0,0 +1,131 @@
+"""
+Inflight Service - Cancels LLM work nobody is waiting for.
+
+LLM calls (including their wait in the admission queue) run as a child
+task while a watcher waits on the connection. The child is cancelled when:
+
+- the client disconnects (navigated away, closed the tab), or
+- a newer request arrives with the same X-Supersede-Key from the same
+  client (the explorer re-sends the intent while the user types).
+
+Cancellation propagates into the provider SDK, which closes the HTTP
+request, and the scheduler hands the concurrency slot to the next waiter.
+The handler gets RequestCancelled and skips the audit write, since no
+verdict was delivered. Streamed analysis runs the same way; drain_while()
+passes its early events (lockdown) on while the child task runs.
+
+The watcher blocks on receive() rather than polling is_disconnected():
+is_disconnected() only looks at messages that are already queued, and
+behind BaseHTTPMiddleware layers it never sees the disconnect.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+from fastapi import Request
+
+from services.admission_service import get_client_key
+
+
+class RequestCancelled(Exception):
+    """The LLM work for this request was cancelled before it completed."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Inflight:
+    __slots__ = ("task", "reason")
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str) -> bool:
+        if self.reason is None and not self.task.done():
+            self.reason = reason
+            self.task.cancel()
+            return True
+        return False
+
+
+class InflightRegistry:
+    """Per-process registry of supersedable LLM work. Single event loop only."""
+
+    def __init__(self):
+        self._by_key: Dict[str, _Inflight] = {}
+        self.stats = {"completed": 0, "cancelled_disconnected": 0, "cancelled_superseded": 0}
+
+    async def run(self, request: Request, work: Awaitable[Any], supersede_key: Optional[str] = None) -> Any:
+        """
+        Await `work`, cancelling it if the client disconnects or a newer request
+        takes over supersede_key. Raises RequestCancelled in those cases.
+        """
+        inflight = _Inflight(asyncio.ensure_future(work))
+        if supersede_key:
+            older = self._by_key.get(supersede_key)
+            if older is not None and older.cancel("superseded by a newer request"):
+                self.stats["cancelled_superseded"] += 1
+            self._by_key[supersede_key] = inflight
+
+        watcher = asyncio.ensure_future(self._watch_disconnect(request, inflight))
+        try:
+            await asyncio.wait({inflight.task})
+        except asyncio.CancelledError:
+            # The handler itself was cancelled (shutdown); take the child with it
+            inflight.task.cancel()
+            raise
+        finally:
+            watcher.cancel()
+            if supersede_key and self._by_key.get(supersede_key) is inflight:
+                del self._by_key[supersede_key]
+
+        if inflight.task.cancelled() and inflight.reason is not None:
+            raise RequestCancelled(inflight.reason)
+        self.stats["completed"] += 1
+        return inflight.task.result()
+
+    async def _watch_disconnect(self, request: Request, inflight: _Inflight) -> None:
+        # The body has been read by now, so the next message is the disconnect
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        if inflight.cancel("client disconnected"):
+            self.stats["cancelled_disconnected"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"supersedable": len(self._by_key), **self.stats}
+
+
+async def drain_while(task: "asyncio.Future[Any]", queue: "asyncio.Queue[Any]") -> AsyncIterator[Any]:
+    """Yield what is put on `queue` until `task` is done, then whatever is left."""
+    while not task.done():
+        getter = asyncio.ensure_future(queue.get())
+        try:
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if getter.done() and not getter.cancelled():
+            yield getter.result()
+    while not queue.empty():
+        yield queue.get_nowait()
+
+
+def get_supersede_key(request: Request) -> Optional[str]:
+    """X-Supersede-Key scoped to the client, or None when the header is absent."""
+    key = request.headers.get("x-supersede-key")
+    if not key:
+        return None
+    return f"{get_client_key(request)}:{key[:128]}"
+
+
+# Singleton instance
+_inflight_registry: Optional[InflightRegistry] = None
+
+
+def get_inflight_registry() -> InflightRegistry:
+    """Get the inflight registry singleton instance."""
+    global _inflight_registry
+    if _inflight_registry is None:
+        _inflight_registry = InflightRegistry()
+    return _inflight_registry
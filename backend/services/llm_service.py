@@ -1,8 +1,17 @@
+import asyncio
+import hashlib
 import json
-from typing import Any, Dict, List, Optional
-from openai import OpenAI
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 from config import settings
+from services.cache_service import get_shared_cache
+from services.admission_service import get_admission_controller, is_rate_limit_error
+from services.stream_json import JSONStreamParser
+from services.trace_service import SPAN_KIND_CLIENT, span
 
+SAFETY_TEMPERATURE = 0.1
+# Start of the explanation in _failed_safety_verdict(); marks fail-closed verdicts in the audit log
+FAILED_ANALYSIS_PREFIX = "LLM analysis failed:"
 
 
 class LLMService:
@@ -15,7 +24,29 @@ class LLMService:
     
     def _initialize_client(self):
         """Initialize the appropriate LLM client based on provider."""
-        if self.provider == "openai":
+        if self.provider == "replay":
+            from services.replay_store import ReplayStore
+
+            self.replay_store = ReplayStore(settings.LLM_REPLAY_PATH)
+            self.replay_mode = settings.LLM_REPLAY_MODE
+            self.model = settings.LLM_MODEL
+            print(
+                f"[LLM] Replay provider ({self.replay_mode}) using {settings.LLM_REPLAY_PATH}, "
+                f"{len(self.replay_store)} recorded responses"
+            )
+            if self.replay_mode == "record":
+                # Recording captures responses from a real upstream provider
+                self._initialize_upstream(settings.LLM_REPLAY_UPSTREAM)
+            elif self.replay_mode != "replay":
+                raise ValueError(f"Unknown LLM_REPLAY_MODE: {self.replay_mode}")
+        else:
+            self._initialize_upstream(self.provider)
+
+    def _initialize_upstream(self, provider: str):
+        """Initialize a real provider client (openai or gemini)."""
+        self.upstream = provider
+
+        if provider == "openai":
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY is required when using OpenAI provider")
             
@@ -25,68 +56,240 @@ class LLMService:
             
             # Use AsyncOpenAI for async operations
             from openai import AsyncOpenAI
-            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            self.client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL
+            )
             self.model = settings.LLM_MODEL or "gpt-4o-mini"
             
-        elif self.provider == "gemini":
+        elif provider == "gemini":
             if not settings.GEMINI_API_KEY:
                 raise ValueError("GEMINI_API_KEY is required when using Gemini provider")
             
             import google.generativeai as genai
-            genai.configure(api_key=settings.GEMINI_API_KEY)
+            if settings.GEMINI_API_ENDPOINT:
+                genai.configure(
+                    api_key=settings.GEMINI_API_KEY,
+                    transport="rest",
+                    client_options={"api_endpoint": settings.GEMINI_API_ENDPOINT}
+                )
+            else:
+                genai.configure(api_key=settings.GEMINI_API_KEY)
             self.client = genai
             self.model = settings.LLM_MODEL or "gemini-2.0-flash-exp" # Default to latest flash
             print(f"[LLM] Initialized Gemini client with model {self.model}")
             
         else:
-            raise ValueError(f"Unknown LLM provider: {self.provider}")
+            raise ValueError(f"Unknown LLM provider: {provider}")
+
+    async def _complete_json(self, system_prompt: str, prompt: str, temperature: float) -> Dict[str, Any]:
+        """
+        Run a JSON-mode completion and parse it, consulting the shared cache first.
+        Only responses that parse are cached, so failures are never replayed from cache.
+        """
+        cache = get_shared_cache()
+        if cache is None:
+            return json.loads(await self._complete(system_prompt, prompt, temperature))
+
+        cache_key = self._cache_key(system_prompt, prompt, temperature)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        result = json.loads(await self._complete(system_prompt, prompt, temperature))
+        await cache.aset(cache_key, result)
+        return result
+
+    def _cache_key(self, system_prompt: str, prompt: str, temperature: float) -> str:
+        material = json.dumps([self.provider, self.model, system_prompt, prompt, temperature])
+        return "llm:" + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def _complete(self, system_prompt: str, prompt: str, temperature: float) -> str:
+        """
+        Run one JSON-mode completion and return the raw response text.
+        Latency and 429s are fed to the adaptive concurrency limiter.
+        """
+        limiter = get_admission_controller().limiter
+        started = time.perf_counter()
+        try:
+            with span("llm.complete", kind=SPAN_KIND_CLIENT, **self._span_attributes()):
+                text = await self._provider_complete(system_prompt, prompt, temperature)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                limiter.observe(time.perf_counter() - started, throttled=True)
+            raise
+        limiter.observe(time.perf_counter() - started)
+        return text
+
+    def _span_attributes(self) -> Dict[str, Any]:
+        return {
+            "llm.provider": self.provider,
+            "llm.upstream": getattr(self, "upstream", self.provider),
+            "llm.model": self.model,
+            "llm.replay_mode": getattr(self, "replay_mode", None)
+        }
+
+    async def _provider_complete(self, system_prompt: str, prompt: str, temperature: float) -> str:
+        """
+        Get a completion from the provider.
+        The replay provider serves recorded responses, or records new ones.
+        """
+        if self.provider != "replay":
+            return await self._call_upstream(system_prompt, prompt, temperature)
+
+        key = self.replay_store.key(system_prompt, prompt, temperature)
+
+        if self.replay_mode == "replay":
+            record = self.replay_store.get(key)
+            if record is None:
+                raise LookupError("No recorded response for this prompt (replay miss)")
+            delay = record.latency_ms * settings.LLM_REPLAY_LATENCY_SCALE / 1000
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return record.response
+
+        started = time.perf_counter()
+        text = await self._call_upstream(system_prompt, prompt, temperature)
+        self.replay_store.append(
+            key,
+            response=text,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            provider=self.upstream,
+            model=self.model
+        )
+        return text
+
+    async def _call_upstream(self, system_prompt: str, prompt: str, temperature: float) -> str:
+        """Send one completion request to the upstream provider."""
+        if self.upstream == "openai":
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"}
+            )
+            return response.choices[0].message.content
+
+        # Combine system prompt and user prompt because simple generate_content doesn't have system role easily separate in all versions
+        full_prompt = f"{system_prompt}\n\n{prompt}"
+        model = self.client.GenerativeModel(self.model)
+        # Ensure JSON response
+        response = await model.generate_content_async(
+            full_prompt,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        return response.text
+
+    async def _stream_complete(self, system_prompt: str, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of _complete_json: yields response text as it arrives.
+        Shares the cache and replay store with the non-streaming path; a cached or
+        replayed response arrives as one chunk.
+        """
+        cache = get_shared_cache()
+        cache_key = self._cache_key(system_prompt, prompt, temperature)
+        cached = await cache.aget(cache_key) if cache else None
+        if cached is not None:
+            yield json.dumps(cached)
+            return
+
+        if self.provider == "replay" and self.replay_mode == "replay":
+            yield await self._complete(system_prompt, prompt, temperature)
+            return
+
+        limiter = get_admission_controller().limiter
+        chunks = []
+        # Not made current: this generator may be closed from another context
+        stream_span = span("llm.stream", kind=SPAN_KIND_CLIENT, **self._span_attributes())
+        started = time.perf_counter()
+        try:
+            async for chunk in self._stream_upstream(system_prompt, prompt, temperature):
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            stream_span.set_error(e)
+            if is_rate_limit_error(e):
+                limiter.observe(time.perf_counter() - started, throttled=True)
+            raise
+        finally:
+            stream_span.set("llm.chunks", len(chunks))
+            stream_span.end()
+        latency_s = time.perf_counter() - started
+        limiter.observe(latency_s)
+
+        text = "".join(chunks)
+        if self.provider == "replay":
+            self.replay_store.append(
+                self.replay_store.key(system_prompt, prompt, temperature),
+                response=text,
+                latency_ms=latency_s * 1000,
+                provider=self.upstream,
+                model=self.model
+            )
+        if cache:
+            try:
+                result = json.loads(text)
+            except ValueError:
+                return  # Only responses that parse are cached
+            await cache.aset(cache_key, result)
+
+    async def _stream_upstream(self, system_prompt: str, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """Stream one completion from the upstream provider."""
+        if self.upstream == "openai":
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                response_format={"type": "json_object"},
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            return
+
+        full_prompt = f"{system_prompt}\n\n{prompt}"
+        model = self.client.GenerativeModel(self.model)
+        response = await model.generate_content_async(
+            full_prompt,
+            generation_config={"response_mime_type": "application/json"},
+            stream=True
+        )
+        async for chunk in response:
+            yield chunk.text
     
     async def analyze_safety(
         self,
         api_spec: str,
         user_intent: str,
         example_payloads: List[Dict[str, Any]],
-        constructed_input: Dict[str, Any]
+        constructed_input: Dict[str, Any],
+        session_context: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Use LLM to perform deep safety analysis of an API request.
+        session_context is a digest of earlier chat turns (see session_service).
         """
         prompt = self._build_safety_prompt(
-            api_spec, user_intent, example_payloads, constructed_input
+            api_spec, user_intent, example_payloads, constructed_input, session_context
         )
         
         try:
             print(f"[LLM] Sending safety analysis request to {self.provider}...")
             
-            if self.provider == "openai":
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": self._get_system_prompt()
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.1,
-                    response_format={"type": "json_object"}
-                )
-                result = json.loads(response.choices[0].message.content)
-                
-            elif self.provider == "gemini":
-                # Combine system prompt and user prompt because simple generate_content doesn't have system role easily separate in all versions
-                full_prompt = f"{self._get_system_prompt()}\n\nUser Request:\n{prompt}"
-                
-                model = self.client.GenerativeModel(self.model)
-                # Ensure JSON response
-                response = await model.generate_content_async(
-                    full_prompt,
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                result = json.loads(response.text)
+            result = await self._complete_json(self._get_system_prompt(), prompt, SAFETY_TEMPERATURE)
             
             print("[LLM] Received analysis response")
             return self._validate_response(result)
@@ -95,15 +298,106 @@ class LLMService:
             import traceback
             traceback.print_exc()
             print(f"LLM analysis error: {e}")
-            return {
-                "urgency": True,
-                "threat": False,
-                "sensitive_request": True,
-                "explanation": f"LLM analysis failed: {str(e)}. Applying conservative safety measures.",
-                "risk_score": 7,
-                "recommendations": ["Manual review recommended"],
-                "detected_patterns": ["analysis_error"]
-            }
+            return self._failed_safety_verdict(e)
+
+    def safety_cache_key(
+        self,
+        api_spec: str,
+        user_intent: str,
+        example_payloads: List[Dict[str, Any]],
+        constructed_input: Dict[str, Any],
+        session_context: Optional[str] = None
+    ) -> str:
+        """Shared cache key of the analyze_safety call for this input."""
+        prompt = self._build_safety_prompt(
+            api_spec, user_intent, example_payloads, constructed_input, session_context
+        )
+        return self._cache_key(self._get_system_prompt(), prompt, SAFETY_TEMPERATURE)
+
+    async def cached_safety(
+        self,
+        api_spec: str,
+        user_intent: str,
+        example_payloads: List[Dict[str, Any]],
+        constructed_input: Dict[str, Any],
+        session_context: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        The cached analyze_safety result for this input, or None.
+        Lets callers answer a cache hit without taking an admission slot.
+        """
+        cache = get_shared_cache()
+        if cache is None:
+            return None
+        cached = await cache.aget(self.safety_cache_key(
+            api_spec, user_intent, example_payloads, constructed_input, session_context
+        ))
+        if cached is None:
+            return None
+        try:
+            return self._validate_response(cached)
+        except (TypeError, ValueError):
+            return None  # Leave an odd entry to the normal path
+
+    async def stream_safety(
+        self,
+        api_spec: str,
+        user_intent: str,
+        example_payloads: List[Dict[str, Any]],
+        constructed_input: Dict[str, Any],
+        session_context: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming safety analysis. Yields {"event": "lockdown", "verdict": {...}}
+        as soon as the streamed JSON shows "threat": true or a risk_score at or
+        above STREAM_LOCKDOWN_RISK (the verdict holds only the fields seen so far),
+        then always exactly one {"event": "verdict", "verdict": {...}} with the
+        validated result, or the fail-closed verdict if the output is malformed.
+        """
+        prompt = self._build_safety_prompt(
+            api_spec, user_intent, example_payloads, constructed_input, session_context
+        )
+        parser = JSONStreamParser()
+        partial: Dict[str, Any] = {}
+        chunks = []
+        locked_down = False
+
+        try:
+            async for chunk in self._stream_complete(self._get_system_prompt(), prompt, SAFETY_TEMPERATURE):
+                chunks.append(chunk)
+                for event in parser.feed(chunk):
+                    if event.kind != "value" or len(event.path) != 1:
+                        continue
+                    partial[event.path[0]] = event.value
+                    risk = partial.get("risk_score")
+                    if not locked_down and (
+                        partial.get("threat") is True
+                        or (isinstance(risk, (int, float)) and risk >= settings.STREAM_LOCKDOWN_RISK)
+                    ):
+                        locked_down = True
+                        yield {"event": "lockdown", "verdict": dict(partial)}
+            parser.close()
+            result = self._validate_response(json.loads("".join(chunks)))
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"LLM streaming analysis error: {e}")
+            result = self._failed_safety_verdict(e)
+            # A threat seen before the output broke still counts
+            result["threat"] = partial.get("threat") is True
+        yield {"event": "verdict", "verdict": result}
+
+    def _failed_safety_verdict(self, error: Exception) -> Dict[str, Any]:
+        """Fail-closed verdict used when the LLM call or its output fails."""
+        return {
+            "urgency": True,
+            "threat": False,
+            "sensitive_request": True,
+            "explanation": f"{FAILED_ANALYSIS_PREFIX} {str(error)}. Applying conservative safety measures.",
+            "risk_score": 7,
+            "recommendations": ["Manual review recommended"],
+            "detected_patterns": ["analysis_error"]
+        }
 
     def _get_system_prompt(self):
         return """You are a security analyst specialized in API safety. 
@@ -124,11 +418,19 @@ and threat patterns. Return your analysis as JSON with the following structure:
         api_spec: str,
         user_intent: str,
         example_payloads: List[Dict[str, Any]],
-        constructed_input: Dict[str, Any]
+        constructed_input: Dict[str, Any],
+        session_context: Optional[str] = None
     ) -> str:
         """Build the prompt for safety analysis."""
+        conversation = ""
+        if session_context:
+            conversation = f"""
+## Conversation So Far
+{session_context}
+Analyze the new message below in that context.
+"""
         return f"""Analyze this API request for security risks:
-
+{conversation}
 ## API Specification
 {api_spec}
 
@@ -189,32 +491,7 @@ Suggest UI components and restrictions. Return as JSON:
         system_prompt = "You are a UI/UX expert focusing on secure API interfaces."
 
         try:
-            if self.provider == "openai":
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    temperature=0.2,
-                    response_format={"type": "json_object"}
-                )
-                result = json.loads(response.choices[0].message.content)
-            
-            elif self.provider == "gemini":
-                full_prompt = f"{system_prompt}\n\n{prompt}"
-                model = self.client.GenerativeModel(self.model)
-                response = await model.generate_content_async(
-                    full_prompt,
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                result = json.loads(response.text)
+            result = await self._complete_json(system_prompt, prompt, 0.2)
                 
             return result
             
@@ -0,0 +1,112 @@
+"""
+Replay Store - Append-only on-disk store of recorded LLM responses.
+
+Backs the `replay` LLM provider. Each record is a fixed-size header
+(prompt hash, latency, payload length) followed by a zlib-compressed JSON
+payload. Opening the store scans headers only, so the in-memory index
+(prompt hash -> record location) is cheap to rebuild and no separate
+index file has to be kept consistent. A torn record at the tail, e.g.
+from a crash mid-append, is truncated away on open.
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+MAGIC = b"LLMR1\n"
+# sha256 digest, latency in ms, compressed payload length
+HEADER = struct.Struct(">32sfI")
+
+
+@dataclass
+class ReplayRecord:
+    """A recorded completion."""
+    response: str
+    latency_ms: float
+    provider: str
+    model: str
+
+
+class ReplayStore:
+    """Append-only prompt-hash -> response store. Later records win."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, Tuple[int, int, float]] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @staticmethod
+    def key(system_prompt: str, prompt: str, temperature: float) -> bytes:
+        """Hash of everything that determines a completion."""
+        material = json.dumps([system_prompt, prompt, round(temperature, 3)], ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).digest()
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(MAGIC)
+            return
+
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not an LLM replay store")
+            offset = len(MAGIC)
+            size = os.fstat(f.fileno()).st_size
+            while offset + HEADER.size <= size:
+                digest, latency_ms, length = HEADER.unpack(f.read(HEADER.size))
+                payload_offset = offset + HEADER.size
+                if payload_offset + length > size:
+                    break
+                self._index[digest] = (payload_offset, length, latency_ms)
+                offset = payload_offset + length
+                f.seek(offset)
+
+        if offset < size:
+            # Torn write at the tail; drop it so later appends stay aligned
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+
+    def get(self, key: bytes) -> Optional[ReplayRecord]:
+        """Return the latest record for a prompt hash, or None."""
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        payload_offset, length, latency_ms = entry
+        with open(self.path, "rb") as f:
+            f.seek(payload_offset)
+            payload = json.loads(zlib.decompress(f.read(length)))
+        return ReplayRecord(
+            response=payload["response"],
+            latency_ms=latency_ms,
+            provider=payload.get("provider", ""),
+            model=payload.get("model", "")
+        )
+
+    def append(self, key: bytes, response: str, latency_ms: float, provider: str, model: str) -> None:
+        """Append a record. A single write keeps concurrent appenders from interleaving."""
+        payload = zlib.compress(json.dumps(
+            {"response": response, "provider": provider, "model": model},
+            ensure_ascii=False
+        ).encode("utf-8"))
+        record = HEADER.pack(key, latency_ms, len(payload)) + payload
+
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, record)
+                end = os.lseek(fd, 0, os.SEEK_CUR)
+            finally:
+                os.close(fd)
+            self._index[key] = (end - len(payload), len(payload), latency_ms)
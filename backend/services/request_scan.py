@@ -0,0 +1,95 @@
+"""
+Request Scan - Rules analysis of an oversized analysis request as it streams in.
+
+Bodies over their route's limit (see BodyLimitMiddleware) are never
+buffered or validated as a whole. Each chunk is decoded and pushed through
+JSONStreamParser, and every completed value goes straight to the keyword
+detectors; only the token being parsed and the matches so far are kept.
+Fields are read as AnalyzeRequest would (others are ignored):
+
+    api_spec.*                                         spec text: sensitive fields, threats
+    user_intent                                        threats, urgency
+    payload, constructed_input, example_payloads       keys: sensitive fields
+
+The verdict is fail-closed whatever the scan found: the request is
+rejected, and the matches only add to the explanation and the threat flag.
+"""
+import codecs
+from typing import Any, Dict, List, Optional
+
+from services.safety_service import (
+    build_verdict, detect_sensitive_fields, detect_threats, detect_urgency, get_conservative_verdict
+)
+from services.stream_json import JSONStreamParser, StreamEvent, StreamJSONError
+
+PAYLOAD_FIELDS = ("payload", "constructed_input", "example_payloads")
+# Characters of the intent kept for the audit record
+INTENT_HEAD_CHARS = 512
+
+
+class RequestScan:
+    """Incremental detector state for one request body."""
+
+    def __init__(self, max_value_chars: int):
+        self.max_value_chars = max_value_chars
+        self.bytes = 0
+        self.method = ""
+        self.endpoint = ""
+        self.intent_head = ""
+        self.sensitive_fields: List[str] = []
+        self.threats: List[str] = []
+        self.urgency = False
+        self.complete = False
+        self.stopped: Optional[str] = None  # Why scanning ended before the end of the body
+        self._parser = JSONStreamParser()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, chunk: bytes, final: bool = False) -> None:
+        """Scan the next chunk; raises StreamJSONError (or UnicodeDecodeError) on malformed input."""
+        self.bytes += len(chunk)
+        events = self._parser.feed(self._decoder.decode(chunk, final))
+        if final:
+            events += self._parser.close()
+            self.complete = True
+        for event in events:
+            self._on_event(event)
+        if self._parser.pending > self.max_value_chars:
+            raise StreamJSONError(f"Value over {self.max_value_chars} characters")
+
+    def _add(self, found: List[str], new: List[str]) -> None:
+        for item in new:
+            if item not in found:
+                found.append(item)
+
+    def _on_event(self, event: StreamEvent) -> None:
+        if event.kind == "key":
+            if event.path and event.path[0] in PAYLOAD_FIELDS:
+                self._add(self.sensitive_fields, detect_sensitive_fields("", {event.value: None}))
+            return
+        if event.kind != "value" or not isinstance(event.value, str) or not event.path:
+            return
+
+        field, text = event.path[0], event.value
+        if field == "api_spec":
+            if event.path == ("api_spec", "method"):
+                self.method = text
+            elif event.path == ("api_spec", "endpoint"):
+                self.endpoint = text
+            self._add(self.sensitive_fields, detect_sensitive_fields(text, {}))
+            self._add(self.threats, detect_threats("", text))
+        elif field == "user_intent":
+            self.intent_head = text[:INTENT_HEAD_CHARS]
+            self._add(self.threats, detect_threats(text, ""))
+            self.urgency = self.urgency or detect_urgency(text)
+
+    def verdict(self, reason: str) -> Dict[str, Any]:
+        """Fail-closed verdict for the rejected request, with what the scan found."""
+        found = build_verdict(self.sensitive_fields, self.threats, self.urgency)
+        if self.complete:
+            extent = "whole body"
+        else:
+            extent = f"first {self.bytes} bytes; {self.stopped or ('stopped at the first threat' if self.threats else 'incomplete')}"
+        verdict = get_conservative_verdict()
+        verdict["threat"] = found["threat"]
+        verdict["explanation"] = f"{reason}; conservative block applied. Streamed scan ({extent}): {found['explanation']}"
+        return verdict
@@ -1,6 +1,8 @@
 from typing import Any, Dict, List
 import re
 
+from services.trace_service import span
+
 
 # Sensitive field patterns
 SENSITIVE_FIELDS = [
@@ -72,11 +74,17 @@ def analyze_request(
     - sensitive_request: bool
     - explanation: str
     """
-    sensitive_fields = detect_sensitive_fields(api_spec, constructed_input)
-    threats = detect_threats(user_intent, api_spec)
-    urgency = detect_urgency(user_intent)
-    
-    # Build explanation
+    with span("rules.detect_sensitive_fields"):
+        sensitive_fields = detect_sensitive_fields(api_spec, constructed_input)
+    with span("rules.detect_threats"):
+        threats = detect_threats(user_intent, api_spec)
+    with span("rules.detect_urgency"):
+        urgency = detect_urgency(user_intent)
+    return build_verdict(sensitive_fields, threats, urgency)
+
+
+def build_verdict(sensitive_fields: List[str], threats: List[str], urgency: bool) -> Dict[str, Any]:
+    """Verdict and explanation for what the detectors found."""
     explanations = []
     
     if sensitive_fields:
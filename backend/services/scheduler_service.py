@@ -0,0 +1,196 @@
+"""
+Scheduler Service - Priority-aware queue in front of LLM calls.
+
+Calls wait here for a slot under the adaptive concurrency limit instead of
+being served FIFO. Three classes share capacity with weighted fair queuing
+(virtual finish tags), so bulk work gets its weighted share without making
+interactive requests wait behind it:
+
+- interactive: explorer/UI traffic. `urgent` requests jump the queue.
+- background: catalog audits and other bulk work.
+- replay: record/replay and evaluation runs.
+
+A class whose oldest waiter has waited past the starvation bound is served
+next regardless of weights. Every wait is bounded; on timeout the caller
+degrades (rules verdict) instead of queuing indefinitely.
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+PRIORITY_CLASSES = ("interactive", "background", "replay")
+
+
+@dataclass
+class _Waiter:
+    priority: str
+    future: "asyncio.Future[bool]"
+    enqueued_at: float
+    finish_tag: float
+
+
+@dataclass
+class _ClassStats:
+    dispatched: int = 0
+    timeouts: int = 0
+    cancelled: int = 0
+    starvation_promotions: int = 0
+    wait_ms_total: float = 0.0
+    wait_ms_max: float = 0.0
+    recent_wait_ms: Deque[float] = field(default_factory=lambda: deque(maxlen=256))
+
+    def record_wait(self, wait_ms: float) -> None:
+        self.dispatched += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        self.recent_wait_ms.append(wait_ms)
+
+
+class LLMScheduler:
+    """
+    Weighted fair queue over a slot limiter (anything with try_acquire/release,
+    normally the AdaptiveLimiter). Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        limiter: Any,
+        weights: Dict[str, float],
+        max_wait_s: Dict[str, float],
+        starvation_s: float
+    ):
+        self.limiter = limiter
+        self.weights = {cls: max(0.01, weights.get(cls, 1.0)) for cls in PRIORITY_CLASSES}
+        self.max_wait_s = {cls: max_wait_s.get(cls, 5.0) for cls in PRIORITY_CLASSES}
+        self.starvation_s = starvation_s
+        self._urgent: Deque[_Waiter] = deque()
+        self._queues: Dict[str, Deque[_Waiter]] = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._last_finish = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+        self._stats = {cls: _ClassStats() for cls in PRIORITY_CLASSES}
+
+    def _queued(self) -> int:
+        return len(self._urgent) + sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, priority: str = "interactive", urgent: bool = False) -> bool:
+        """
+        Wait for an LLM slot. Returns True when a slot was granted (caller must
+        release()), False when the class's max wait elapsed first.
+        """
+        if priority not in self._queues:
+            priority = "interactive"
+        urgent = urgent and priority == "interactive"
+        stats = self._stats[priority]
+
+        # Fast path: nobody waiting and capacity available
+        if self._queued() == 0 and self.limiter.try_acquire():
+            stats.record_wait(0.0)
+            return True
+
+        loop = asyncio.get_running_loop()
+        start = max(self._virtual_time, self._last_finish[priority])
+        finish_tag = start + 1.0 / self.weights[priority]
+        self._last_finish[priority] = finish_tag
+        waiter = _Waiter(priority, loop.create_future(), time.monotonic(), finish_tag)
+        (self._urgent if urgent else self._queues[priority]).append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait_s[priority])
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was handed over as the timeout fired (wait_for can lose
+                # that race on Python 3.12+); give it back
+                self.release()
+            else:
+                self._remove(waiter)
+            stats.timeouts += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was handed over just as we were cancelled; give it back
+                self.release()
+            else:
+                self._remove(waiter)
+            stats.cancelled += 1
+            raise
+
+        stats.record_wait((time.monotonic() - waiter.enqueued_at) * 1000)
+        return True
+
+    def release(self) -> None:
+        """Return a slot and hand freed capacity to the next waiters."""
+        self.limiter.release()
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._urgent if waiter in self._urgent else self._queues[waiter.priority]
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        if self._urgent:
+            return self._urgent.popleft()
+
+        heads = [q[0] for q in self._queues.values() if q]
+        if not heads:
+            return None
+
+        now = time.monotonic()
+        oldest = min(heads, key=lambda w: w.enqueued_at)
+        if now - oldest.enqueued_at >= self.starvation_s:
+            chosen = oldest
+            self._stats[chosen.priority].starvation_promotions += 1
+        else:
+            chosen = min(heads, key=lambda w: w.finish_tag)
+            self._virtual_time = max(self._virtual_time, chosen.finish_tag - 1.0 / self.weights[chosen.priority])
+        return self._queues[chosen.priority].popleft()
+
+    def _dispatch(self) -> None:
+        while self._queued():
+            if not self.limiter.try_acquire():
+                return
+            granted = False
+            while not granted:
+                waiter = self._next_waiter()
+                if waiter is None:
+                    break
+                if not waiter.future.done():
+                    waiter.future.set_result(True)
+                    granted = True
+            if not granted:
+                # Only timed-out/cancelled waiters were left
+                self.limiter.release()
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        classes = {}
+        for cls, stats in self._stats.items():
+            recent = sorted(stats.recent_wait_ms)
+            classes[cls] = {
+                "queue_depth": len(self._queues[cls]) + sum(1 for w in self._urgent if w.priority == cls),
+                "weight": self.weights[cls],
+                "max_wait_ms": self.max_wait_s[cls] * 1000,
+                "dispatched": stats.dispatched,
+                "timeouts": stats.timeouts,
+                "cancelled": stats.cancelled,
+                "starvation_promotions": stats.starvation_promotions,
+                "wait_ms_mean": round(stats.wait_ms_total / stats.dispatched, 2) if stats.dispatched else 0.0,
+                "wait_ms_p95_recent": round(recent[int(0.95 * (len(recent) - 1))], 2) if recent else 0.0,
+                "wait_ms_max": round(stats.wait_ms_max, 2),
+            }
+        return {"urgent_queued": len(self._urgent), "classes": classes}
+
+
+def parse_class_map(raw: str, default: float) -> Dict[str, float]:
+    """Parse "interactive=8,background=2" into a per-class dict."""
+    values = {cls: default for cls in PRIORITY_CLASSES}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            if name.strip() in values:
+                values[name.strip()] = float(value)
+    return values
@@ -0,0 +1,199 @@
+"""
+Session Service - Server-side state for multi-turn analysis (chat explorer).
+
+Each chat turn used to be analyzed from scratch. A session keeps what
+earlier turns established, so a turn only analyzes its delta:
+
+- Rules matchers run on the new message only; the API spec is rescanned
+  only when it changes. Matches accumulate in the session as each turn
+  is recorded.
+- The session verdict is a ratchet: flags can be raised by any turn but
+  are only cleared by an explicit reset.
+- The LLM gets a compact digest of prior turns instead of the transcript,
+  so prompts stay short however long the conversation runs.
+
+Sessions live in a bounded LRU per worker process and are evicted after
+an idle timeout. Session IDs are scoped to the client key, so one client
+cannot read or reset another client's session.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from services.safety_service import detect_sensitive_fields, detect_threats, detect_urgency
+
+VERDICT_FLAGS = ("urgency", "threat", "sensitive_request")
+# Characters of each prior message kept in the LLM context digest
+CONTEXT_MESSAGE_CHARS = 160
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class AnalysisSession:
+    """Accumulated state for one chat session."""
+    session_id: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    turns: int = 0
+    verdict: Dict[str, bool] = field(default_factory=lambda: {flag: False for flag in VERDICT_FLAGS})
+    explanations: List[str] = field(default_factory=list)
+    threats: Set[str] = field(default_factory=set)
+    sensitive_fields: Set[str] = field(default_factory=set)
+    spec_digest: Optional[str] = None
+    last_intent_digest: Optional[str] = None
+    recent_intents: Deque[str] = field(default_factory=lambda: deque(maxlen=settings.SESSION_CONTEXT_TURNS))
+
+    def is_repeat(self, api_spec: str, user_intent: str) -> bool:
+        """True when this turn re-sends exactly what the previous turn analyzed."""
+        return (
+            self.turns > 0
+            and self.spec_digest == _digest(api_spec)
+            and self.last_intent_digest == _digest(user_intent.strip().lower())
+        )
+
+    def _matches(self, api_spec: str, user_intent: str) -> Tuple[Set[str], Set[str]]:
+        """Sensitive fields and threats over the session so far plus this turn, without storing them."""
+        spec_changed = self.spec_digest != _digest(api_spec)
+        sensitive_fields = self.sensitive_fields | set(detect_sensitive_fields(api_spec, {}) if spec_changed else [])
+        # Threat keywords in the spec were matched when the spec first arrived
+        threats = self.threats | set(detect_threats(user_intent, api_spec if spec_changed else ""))
+        return sensitive_fields, threats
+
+    def analyze_delta(self, api_spec: str, user_intent: str) -> Dict[str, Any]:
+        """
+        Rules analysis of what is new in this turn, over everything the session
+        has seen. Does not change the session; record_turn() folds the turn in.
+        """
+        sensitive_fields, threats = self._matches(api_spec, user_intent)
+        urgency = detect_urgency(user_intent)
+
+        explanations = []
+        if sensitive_fields:
+            explanations.append(f"Sensitive fields detected: {', '.join(sorted(sensitive_fields))}")
+        if threats:
+            explanations.append(f"Threat signals: {', '.join(sorted(threats))}")
+        if urgency:
+            explanations.append("Urgency detected in request")
+        if not explanations:
+            explanations.append("No safety concerns detected")
+
+        return {
+            "urgency": urgency,
+            "threat": bool(threats),
+            "sensitive_request": bool(sensitive_fields),
+            "explanation": ". ".join(explanations),
+        }
+
+    def context(self) -> Optional[str]:
+        """Compact digest of prior turns for the LLM prompt (None on the first turn)."""
+        if self.turns == 0:
+            return None
+        raised = [flag for flag in VERDICT_FLAGS if self.verdict[flag]] or ["none"]
+        lines = [
+            f"Prior turns: {self.turns}",
+            f"Flags already raised: {', '.join(raised)}",
+        ]
+        if self.threats or self.sensitive_fields:
+            lines.append(f"Signals so far: {', '.join(sorted(self.threats | self.sensitive_fields))}")
+        if self.recent_intents:
+            lines.append("Recent messages:")
+            lines.extend(f"- {intent}" for intent in self.recent_intents)
+        return "\n".join(lines)
+
+    def record_turn(self, api_spec: str, user_intent: str, verdict: Dict[str, Any], fold: bool = True) -> Dict[str, Any]:
+        """
+        Apply a turn's verdict and return the session verdict.
+        Flags only ever go from False to True here, and the turn's rules matches
+        join the session's. With fold=False (the turn's analysis failed) the
+        turn is answered strictly but the session keeps its prior state, so a
+        retry of the same message is analyzed again rather than answered as a
+        repeat.
+        """
+        merged = {flag: self.verdict[flag] or bool(verdict.get(flag)) for flag in VERDICT_FLAGS}
+        held = [flag for flag in VERDICT_FLAGS if self.verdict[flag] and not verdict.get(flag)]
+        explanation = str(verdict.get("explanation", ""))
+        if held:
+            explanation += f". Session verdict held from earlier turns: {', '.join(held)}"
+
+        if fold:
+            self.sensitive_fields, self.threats = self._matches(api_spec, user_intent)
+            self.turns += 1
+            self.spec_digest = _digest(api_spec)
+            self.last_intent_digest = _digest(user_intent.strip().lower())
+            self.recent_intents.append(" ".join(user_intent.split())[:CONTEXT_MESSAGE_CHARS])
+            self.verdict = merged
+            self.explanations.append(explanation)
+            del self.explanations[:-settings.SESSION_CONTEXT_TURNS]
+        return {**merged, "explanation": explanation}
+
+    def current_verdict(self) -> Dict[str, Any]:
+        explanation = self.explanations[-1] if self.explanations else "No safety concerns detected"
+        return {**self.verdict, "explanation": f"{explanation}. Unchanged since previous turn"}
+
+
+class SessionStore:
+    """Bounded LRU of sessions with idle eviction."""
+
+    def __init__(self, max_sessions: int, idle_seconds: float):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, AnalysisSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "resets": 0, "evicted_idle": 0, "evicted_capacity": 0}
+
+    def _evict_idle(self, now: float) -> None:
+        # Oldest-touched sessions sit at the front of the LRU
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.stats["evicted_idle"] += 1
+
+    def get(self, client_key: str, session_id: str, reset: bool = False) -> AnalysisSession:
+        """Get (or start) a session for this client. reset=True starts it over."""
+        key = f"{client_key}:{session_id}"
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(key)
+            if session is not None and reset:
+                del self._sessions[key]
+                session = None
+                self.stats["resets"] += 1
+            if session is None:
+                session = AnalysisSession(session_id)
+                self._sessions[key] = session
+                self.stats["created"] += 1
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.stats["evicted_capacity"] += 1
+            else:
+                self._sessions.move_to_end(key)
+            session.last_seen = now
+            return session
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            active = len(self._sessions)
+        return {"active": active, "max_sessions": self.max_sessions, **self.stats}
+
+
+# Singleton instance
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Get the session store singleton instance."""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(settings.SESSION_MAX, settings.SESSION_IDLE_SECONDS)
+    return _session_store
@@ -0,0 +1,212 @@
+"""
+Incremental JSON parser - acts on a document while it is still arriving.
+
+Text is pushed in chunks of any size with `feed()`, which returns the
+events completed so far:
+
+    start_object / end_object / start_array / end_array   (path of the container)
+    key     (path of the enclosing object, value = key name)
+    value   (path of the scalar, value = decoded str/int/float/bool/None)
+    end     (top-level value complete)
+
+Paths are tuples of object keys and array indexes, e.g. ("threat",) or
+("recommendations", 0). Consumers can react to `("threat",) = True` long
+before the rest of the document (a streamed LLM response, a large request
+body) has arrived. Malformed input raises StreamJSONError as soon as it is
+detectable; `close()` raises if the document is incomplete.
+
+Scanning uses str.find and compiled regexes, and a pending string is never
+rescanned from its start, so cost is linear in the input however it is
+chunked.
+"""
+import json
+import re
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_NUMBER_PREFIX = re.compile(r"-?[0-9]*\.?[0-9]*(?:[eE][+-]?[0-9]*)?")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+# Parser states: what the next token may be
+_VALUE, _VALUE_OR_END, _KEY_OR_END, _KEY, _COLON, _COMMA_OR_END, _DONE = range(7)
+
+
+class StreamJSONError(ValueError):
+    """The input is not valid JSON (or exceeds the parser's limits)."""
+
+
+class StreamEvent(NamedTuple):
+    kind: str
+    path: Path
+    value: Any = None
+
+
+class JSONStreamParser:
+    """Push parser for one JSON document."""
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self.done = False
+        self.consumed = 0  # Characters fed so far
+        self._buf = ""
+        self._pos = 0
+        self._string_scan: Optional[int] = None  # Resume offset inside a pending string
+        self._stack: List[list] = []  # [kind, current key or index]
+        self._state = _VALUE
+
+    @property
+    def pending(self) -> int:
+        """Characters held for a token that has not completed yet (e.g. a long string)."""
+        return len(self._buf) - self._pos
+
+    def _path(self) -> Path:
+        return tuple(frame[1] for frame in self._stack)
+
+    def feed(self, text: str) -> List[StreamEvent]:
+        """Consume a chunk and return the events it completed."""
+        self.consumed += len(text)
+        self._buf = self._buf[self._pos:] + text
+        if self._string_scan is not None:
+            self._string_scan -= self._pos
+        self._pos = 0
+        events: List[StreamEvent] = []
+        self._parse(events, final=False)
+        return events
+
+    def close(self) -> List[StreamEvent]:
+        """Signal end of input; raises StreamJSONError if the document is incomplete."""
+        events: List[StreamEvent] = []
+        self._parse(events, final=True)
+        if not self.done:
+            raise StreamJSONError("Unexpected end of JSON input")
+        return events
+
+    def _error(self, message: str) -> StreamJSONError:
+        return StreamJSONError(f"{message} at offset {self.consumed - len(self._buf) + self._pos}")
+
+    def _parse(self, events: List[StreamEvent], final: bool) -> None:
+        buf = self._buf
+        while True:
+            self._pos = _WHITESPACE.match(buf, self._pos).end()
+            if self._pos >= len(buf):
+                return
+            if self._state == _DONE:
+                raise self._error("Extra data after JSON document")
+
+            char = buf[self._pos]
+            if char == '"':
+                end = self._scan_string(buf)
+                if end < 0:
+                    return  # Wait for the closing quote
+                try:
+                    text = json.loads(buf[self._pos:end + 1])
+                except ValueError:
+                    raise self._error("Invalid string")
+                self._pos = end + 1
+                self._on_string(text, events)
+            elif char in "{[":
+                if self._state not in (_VALUE, _VALUE_OR_END):
+                    raise self._error(f"Unexpected {char!r}")
+                if len(self._stack) >= self.max_depth:
+                    raise self._error("JSON nested too deeply")
+                kind = "object" if char == "{" else "array"
+                events.append(StreamEvent("start_" + kind, self._path()))
+                self._stack.append([kind, None if kind == "object" else 0])
+                self._state = _KEY_OR_END if kind == "object" else _VALUE_OR_END
+                self._pos += 1
+            elif char in "}]":
+                kind = "object" if char == "}" else "array"
+                opening = _KEY_OR_END if kind == "object" else _VALUE_OR_END
+                if not self._stack or self._stack[-1][0] != kind or self._state not in (opening, _COMMA_OR_END):
+                    raise self._error(f"Unexpected {char!r}")
+                self._stack.pop()
+                events.append(StreamEvent("end_" + kind, self._path()))
+                self._pos += 1
+                self._after_value(events)
+            elif char == ":":
+                if self._state != _COLON:
+                    raise self._error("Unexpected ':'")
+                self._state = _VALUE
+                self._pos += 1
+            elif char == ",":
+                if self._state != _COMMA_OR_END:
+                    raise self._error("Unexpected ','")
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    self._state = _KEY
+                else:
+                    frame[1] += 1
+                    self._state = _VALUE
+                self._pos += 1
+            else:
+                if self._state not in (_VALUE, _VALUE_OR_END):
+                    raise self._error(f"Unexpected {char!r}")
+                if not self._scalar(buf, events, final):
+                    return
+
+    def _scan_string(self, buf: str) -> int:
+        """Index of the closing quote of the string starting at _pos, or -1 if not yet arrived."""
+        i = self._string_scan if self._string_scan is not None else self._pos + 1
+        while True:
+            j = buf.find('"', i)
+            if j < 0:
+                # Nothing before len(buf) - 1 can close the string; keep the last
+                # char in case it is a backslash escaping the next chunk's quote
+                self._string_scan = max(self._pos + 1, len(buf) - 1)
+                return -1
+            backslashes = 0
+            k = j - 1
+            while k > self._pos and buf[k] == "\\":
+                backslashes += 1
+                k -= 1
+            if backslashes % 2 == 0:
+                self._string_scan = None
+                return j
+            i = j + 1
+
+    def _on_string(self, text: str, events: List[StreamEvent]) -> None:
+        if self._state in (_KEY, _KEY_OR_END):
+            self._stack[-1][1] = text
+            events.append(StreamEvent("key", self._path()[:-1], text))
+            self._state = _COLON
+        elif self._state in (_VALUE, _VALUE_OR_END):
+            events.append(StreamEvent("value", self._path(), text))
+            self._after_value(events)
+        else:
+            raise self._error("Unexpected string")
+
+    def _scalar(self, buf: str, events: List[StreamEvent], final: bool) -> bool:
+        """Parse a number or literal at _pos. Returns False when more input is needed."""
+        rest = buf[self._pos:self._pos + 5]
+        for literal, value in _LITERALS.items():
+            if rest.startswith(literal):
+                self._pos += len(literal)
+                events.append(StreamEvent("value", self._path(), value))
+                self._after_value(events)
+                return True
+            if not final and literal.startswith(rest) and self._pos + len(rest) == len(buf):
+                return False
+
+        if not final and _NUMBER_PREFIX.match(buf, self._pos).end() == len(buf):
+            return False  # "2", "2.", "2e" may continue in the next chunk
+        match = _NUMBER.match(buf, self._pos)
+        if match:
+            # Whatever follows must be a delimiter; "12x" fails on the next token
+            text = match.group()
+            self._pos = match.end()
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+            events.append(StreamEvent("value", self._path(), value))
+            self._after_value(events)
+            return True
+        raise self._error("Invalid value")
+
+    def _after_value(self, events: List[StreamEvent]) -> None:
+        if self._stack:
+            self._state = _COMMA_OR_END
+        else:
+            self._state = _DONE
+            self.done = True
+            events.append(StreamEvent("end", ()))
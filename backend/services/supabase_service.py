@@ -1,16 +1,23 @@
 import os
 import logging
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict, List, Tuple, TYPE_CHECKING
 import json
 from datetime import datetime
 
-from supabase import create_client, Client
-from pydantic import BaseModel
-
 from config import settings
+from services.trace_service import SPAN_KIND_CLIENT, span
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger("policy-aware-api")
 
+# Columns returned by the audit listing (see sql/schema.sql for the indexes behind it)
+VERDICT_AUDIT_COLUMNS = (
+    "id,created_at,endpoint,api_spec_id,user_intent,risk_score,"
+    "threat,sensitive_request,verdict_json,ui_contract_json"
+)
+
 
 class SupabaseService:
     """
@@ -22,10 +29,13 @@ class SupabaseService:
     def __init__(self):
         self.url = settings.SUPABASE_URL
         self.key = settings.SUPABASE_KEY
-        self.client: Optional[Client] = None
+        self.client: Optional["Client"] = None
         
         if self.url and self.key:
             try:
+                # Imported here so rules-only workers never load the supabase client stack
+                from supabase import create_client
+
                 self.client = create_client(self.url, self.key)
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
@@ -41,7 +51,8 @@ class SupabaseService:
             # Check if spec mainly exists to avoid dupes? 
             # For now just insert as new record
             data = {"name": name, "spec_text": spec_text}
-            response = self.client.table("api_specs").insert(data).execute()
+            with span("supabase.insert", kind=SPAN_KIND_CLIENT, **{"db.table": "api_specs", "db.rows": 1}):
+                response = self.client.table("api_specs").insert(data).execute()
             
             if response.data and len(response.data) > 0:
                 return response.data[0]["id"]
@@ -70,7 +81,8 @@ class SupabaseService:
                 "ui_contract_json": ui_contract,
                 "risk_score": risk_score
             }
-            response = self.client.table("safety_verdicts").insert(data).execute()
+            with span("supabase.insert", kind=SPAN_KIND_CLIENT, **{"db.table": "safety_verdicts", "db.rows": 1}):
+                response = self.client.table("safety_verdicts").insert(data).execute()
             
             if response.data and len(response.data) > 0:
                 return response.data[0]["id"]
@@ -80,6 +92,123 @@ class SupabaseService:
             logger.error(f"Supabase error inserting verdict: {e}")
             return None
 
+    def insert_audit_batch(self, records: List[Dict[str, Any]]) -> bool:
+        """
+        Bulk insert spooled audit records (see services/audit_spool.py).
+        Rows carry client-generated ids, so re-sending a batch is a no-op.
+        Returns True when the batch is stored.
+        """
+        if not self.client:
+            return False
+        
+        try:
+            specs = [record["api_spec"] for record in records]
+            verdicts = [
+                {
+                    "id": record["id"],
+                    "api_spec_id": record["api_spec"]["id"],
+                    "endpoint": record.get("endpoint"),
+                    "user_intent": record["user_intent"],
+                    "verdict_json": record["verdict_json"],
+                    "ui_contract_json": record["ui_contract_json"],
+                    "risk_score": record["risk_score"],
+                    "created_at": record["created_at"]
+                }
+                for record in records
+            ]
+            with span("supabase.upsert", kind=SPAN_KIND_CLIENT, **{"db.table": "api_specs", "db.rows": len(specs)}):
+                self.client.table("api_specs").upsert(
+                    specs, on_conflict="id", ignore_duplicates=True, returning="minimal"
+                ).execute()
+            with span("supabase.upsert", kind=SPAN_KIND_CLIENT, **{"db.table": "safety_verdicts", "db.rows": len(verdicts)}):
+                self.client.table("safety_verdicts").upsert(
+                    verdicts, on_conflict="id", ignore_duplicates=True, returning="minimal"
+                ).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Supabase error shipping {len(records)} audit records: {e}")
+            return False
+
+    def query_verdicts(
+        self,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        min_risk: Optional[float] = None,
+        max_risk: Optional[float] = None,
+        threat: Optional[bool] = None,
+        sensitive: Optional[bool] = None,
+        endpoint: Optional[str] = None,
+        columns: str = VERDICT_AUDIT_COLUMNS
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        One page of safety verdicts, newest first, using keyset pagination:
+        `after` is the (created_at, id) of the last row of the previous page.
+        `columns` may embed related rows, e.g. "...,api_specs(spec_text)".
+        Returns None on error (distinct from an empty page).
+        """
+        if not self.client:
+            return None
+        
+        try:
+            query = self.client.table("safety_verdicts").select(columns)
+            if since:
+                query = query.gte("created_at", since)
+            if until:
+                query = query.lt("created_at", until)
+            if min_risk is not None:
+                query = query.gte("risk_score", min_risk)
+            if max_risk is not None:
+                query = query.lte("risk_score", max_risk)
+            if threat is not None:
+                query = query.eq("threat", threat)
+            if sensitive is not None:
+                query = query.eq("sensitive_request", sensitive)
+            if endpoint:
+                query = query.eq("endpoint", endpoint)
+            if after:
+                created_at, row_id = after
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{row_id})'
+                )
+            response = (
+                query.order("created_at", desc=True)
+                .order("id", desc=True)
+                .limit(limit)
+                .execute()
+            )
+            return response.data
+        except Exception as e:
+            logger.error(f"Supabase error querying verdicts: {e}")
+            return None
+
+    def query_verdict_rollups(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        limit: int = 1000
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Hourly per-endpoint verdict counts, newest bucket first. None on error."""
+        if not self.client:
+            return None
+        
+        try:
+            query = self.client.table("safety_verdict_rollups_hourly").select("*")
+            if since:
+                query = query.gte("bucket", since)
+            if until:
+                query = query.lt("bucket", until)
+            if endpoint:
+                query = query.eq("endpoint", endpoint)
+            response = query.order("bucket", desc=True).order("endpoint").limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Supabase error querying verdict rollups: {e}")
+            return None
+
     def get_active_policies(self) -> List[Dict[str, Any]]:
         """Fetch active policies."""
         if not self.client:
@@ -91,3 +220,15 @@ class SupabaseService:
         except Exception as e:
             logger.error(f"Supabase error fetching policies: {e}")
             return []
+
+
+# Singleton instance
+_supabase_service: Optional[SupabaseService] = None
+
+
+def get_supabase_service() -> SupabaseService:
+    """Get the Supabase service singleton instance."""
+    global _supabase_service
+    if _supabase_service is None:
+        _supabase_service = SupabaseService()
+    return _supabase_service
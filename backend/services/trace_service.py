@@ -0,0 +1,259 @@
+"""
+Trace Service - Opt-in trace spans and per-request profiles, written locally.
+
+A trace is started for a sampled request (TRACE_SAMPLE_RATE) by
+TracingMiddleware, or for a sampled audit shipment. Inside it, span() opens
+a child of the current span; the current span lives in a ContextVar, so it
+follows awaits and tasks created from the request. Outside a trace span()
+returns a shared no-op object, which is all the instrumented code pays when
+tracing is off.
+
+Finished traces are appended to TRACE_EXPORT_PATH, one OTLP/JSON
+ExportTraceServiceRequest per line (the layout the OpenTelemetry
+Collector's otlpjsonfile receiver reads). The file is rotated to <path>.1
+once it passes TRACE_EXPORT_MAX_MB.
+
+Profiles are cProfile captures written to PROFILE_DIR as .prof files
+(open with `python -m pstats` or snakeviz); only PROFILE_MAX_FILES are kept.
+cProfile sees the whole event loop thread, so a profile also contains any
+other request that ran while it was open; only one is open at a time.
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+SERVICE_NAME = "policy-aware-api"
+
+# OTLP enum values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+_STATUS_ERROR = 2
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+class Span:
+    """One timed operation in a trace; also its own context manager."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: "Trace", parent_id: Optional[str], name: str, kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.finish(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.set_error(exc)
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass  # Exited from another context (e.g. a generator closed by another task)
+        self.end()
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced."""
+
+    trace_id = None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Spans of one trace; exported when its root span ends."""
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+
+    def finish(self, span: Span) -> None:
+        self.spans.append(span)
+        if span.parent_id is None:
+            get_trace_exporter().export(self)
+
+
+def sampled(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
+
+
+def start_trace(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Span:
+    """Root span of a new trace; use it as a context manager."""
+    return Span(Trace(), None, name, kind, attributes)
+
+
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+    """
+    Child of the current span, or a no-op outside a trace. Use it as a context
+    manager to make it current; async generators, which may be resumed or
+    closed from another context, call .end() instead.
+    """
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, parent.span_id, name, kind, attributes)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(trace: Trace) -> Dict[str, Any]:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in trace.spans:
+        record = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": s.kind,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(s.attributes),
+        }
+        if s.parent_id:
+            record["parentSpanId"] = s.parent_id
+        if s.error:
+            record["status"] = {"code": _STATUS_ERROR, "message": s.error}
+        spans.append(record)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME, "process.pid": os.getpid()})},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Appends finished traces to a local OTLP/JSON lines file."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()  # The audit shipper thread exports too
+        self.stats = {"exported": 0, "export_errors": 0}
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(to_otlp(trace), separators=(",", ":")) + "\n"
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    size = f.tell()
+                if size > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            self.stats["exported"] += 1
+        except OSError as e:
+            self.stats["export_errors"] += 1
+            print(f"[Trace] Could not export trace {trace.trace_id}: {e}")
+
+
+# One cProfile capture at a time: a second profiler would replace the first's hook
+_profile_lock = threading.Lock()
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9]+")
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    """Start a cProfile capture, or None when one is already running."""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def save_profile(profiler: cProfile.Profile, name: str, trace_id: str) -> Optional[str]:
+    """Stop the capture, write it to PROFILE_DIR and drop the oldest files beyond PROFILE_MAX_FILES."""
+    profiler.disable()
+    _profile_lock.release()
+    slug = _UNSAFE_FILENAME.sub("_", name).strip("_")[:60]
+    filename = f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{slug}-{trace_id[:16]}.prof"
+    path = os.path.join(settings.PROFILE_DIR, filename)
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(path)
+        profiles = sorted(
+            (entry for entry in os.scandir(settings.PROFILE_DIR) if entry.name.endswith(".prof")),
+            key=lambda entry: entry.stat().st_mtime_ns
+        )
+        for entry in profiles[:max(0, len(profiles) - settings.PROFILE_MAX_FILES)]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"[Trace] Could not write profile {path}: {e}")
+        return None
+    return path
+
+
+# Singleton instance
+_trace_exporter: Optional[TraceExporter] = None
+
+
+def get_trace_exporter() -> TraceExporter:
+    """Get the trace exporter singleton instance."""
+    global _trace_exporter
+    if _trace_exporter is None:
+        _trace_exporter = TraceExporter(settings.TRACE_EXPORT_PATH, int(settings.TRACE_EXPORT_MAX_MB * 1024 * 1024))
+    return _trace_exporter
@@ -4,6 +4,7 @@
 ALTER TABLE api_specs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE safety_verdicts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE policies ENABLE ROW LEVEL SECURITY;
+ALTER TABLE safety_verdict_rollups_hourly ENABLE ROW LEVEL SECURITY;
 
 -- Policies for api_specs
 CREATE POLICY "Enable insert public" ON api_specs FOR INSERT WITH CHECK (true);
@@ -15,3 +16,6 @@ CREATE POLICY "Enable select public" ON safety_verdicts FOR SELECT USING (true);
 
 -- Policies for policies table
 CREATE POLICY "Enable select public" ON policies FOR SELECT USING (true);
+
+-- Policies for hourly rollups (written only by the safety_verdicts trigger)
+CREATE POLICY "Enable select public" ON safety_verdict_rollups_hourly FOR SELECT USING (true);
@@ -18,3 +18,43 @@ SELECT * FROM safety_verdicts ORDER BY created_at DESC LIMIT 100;
 
 -- Get Verdict by API Spec ID
 SELECT * FROM safety_verdicts WHERE api_spec_id = $1;
+
+-- Audit listing, first page (keyset pagination, newest first)
+SELECT id, created_at, endpoint, user_intent, risk_score, threat, sensitive_request, verdict_json
+FROM safety_verdicts
+WHERE created_at >= $1 AND created_at < $2
+ORDER BY created_at DESC, id DESC
+LIMIT 50;
+
+-- Audit listing, next page: continue after the last (created_at, id) seen
+SELECT id, created_at, endpoint, user_intent, risk_score, threat, sensitive_request, verdict_json
+FROM safety_verdicts
+WHERE (created_at, id) < ($1, $2)
+ORDER BY created_at DESC, id DESC
+LIMIT 50;
+
+-- Threat verdicts for one endpoint (uses safety_verdicts_endpoint_created_id_idx)
+SELECT * FROM safety_verdicts
+WHERE endpoint = $1 AND threat
+ORDER BY created_at DESC, id DESC
+LIMIT 50;
+
+-- Hourly counts per endpoint
+SELECT endpoint, bucket, total, threats, sensitive, urgent, risk_sum / NULLIF(total, 0) AS avg_risk
+FROM safety_verdict_rollups_hourly
+WHERE bucket >= $1 AND bucket < $2
+ORDER BY bucket DESC, endpoint;
+
+-- Backfill endpoint on rows written before the column existed
+UPDATE safety_verdicts v SET endpoint = split_part(s.spec_text, ' ', 2)
+FROM api_specs s
+WHERE v.api_spec_id = s.id AND v.endpoint IS NULL;
+
+-- Rebuild rollups from scratch (e.g. after the backfill above)
+TRUNCATE safety_verdict_rollups_hourly;
+INSERT INTO safety_verdict_rollups_hourly (endpoint, bucket, total, threats, sensitive, urgent, risk_sum)
+SELECT COALESCE(endpoint, ''), date_trunc('hour', created_at), count(*),
+       count(*) FILTER (WHERE threat), count(*) FILTER (WHERE sensitive_request),
+       count(*) FILTER (WHERE COALESCE((verdict_json->>'urgency')::boolean, false)),
+       COALESCE(sum(risk_score), 0)
+FROM safety_verdicts GROUP BY 1, 2;
@@ -45,6 +45,80 @@ CREATE TABLE IF NOT EXISTS safety_verdicts (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Audit query columns (idempotent, so this also upgrades existing tables).
+-- Flags are generated from verdict_json; endpoint is written by the audit shipper.
+ALTER TABLE safety_verdicts ADD COLUMN IF NOT EXISTS endpoint TEXT;
+ALTER TABLE safety_verdicts ADD COLUMN IF NOT EXISTS threat BOOLEAN
+    GENERATED ALWAYS AS (COALESCE((verdict_json->>'threat')::boolean, false)) STORED;
+ALTER TABLE safety_verdicts ADD COLUMN IF NOT EXISTS sensitive_request BOOLEAN
+    GENERATED ALWAYS AS (COALESCE((verdict_json->>'sensitive_request')::boolean, false)) STORED;
+
+-- Keyset pagination: every listing orders by (created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS safety_verdicts_created_id_idx
+    ON safety_verdicts (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS safety_verdicts_endpoint_created_id_idx
+    ON safety_verdicts (endpoint, created_at DESC, id DESC);
+-- Flagged rows are a small fraction; partial indexes keep these filters cheap
+CREATE INDEX IF NOT EXISTS safety_verdicts_threat_created_id_idx
+    ON safety_verdicts (created_at DESC, id DESC) WHERE threat;
+CREATE INDEX IF NOT EXISTS safety_verdicts_sensitive_created_id_idx
+    ON safety_verdicts (created_at DESC, id DESC) WHERE sensitive_request;
+CREATE INDEX IF NOT EXISTS safety_verdicts_high_risk_created_id_idx
+    ON safety_verdicts (created_at DESC, id DESC, risk_score) WHERE risk_score >= 0.5;
+-- Tiny index for wide time-range scans over append-ordered data
+CREATE INDEX IF NOT EXISTS safety_verdicts_created_brin_idx
+    ON safety_verdicts USING brin (created_at);
+
+-- Hourly rollups per endpoint, maintained incrementally on insert
+CREATE TABLE IF NOT EXISTS safety_verdict_rollups_hourly (
+    endpoint TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    threats BIGINT NOT NULL DEFAULT 0,
+    sensitive BIGINT NOT NULL DEFAULT 0,
+    urgent BIGINT NOT NULL DEFAULT 0,
+    risk_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (endpoint, bucket)
+);
+CREATE INDEX IF NOT EXISTS safety_verdict_rollups_bucket_idx
+    ON safety_verdict_rollups_hourly (bucket DESC);
+
+-- Statement-level trigger: one aggregated upsert per bulk insert from the shipper.
+-- SECURITY DEFINER: inserts arrive as the anon role, which has no write policy on
+-- the rollup table; the function runs as its owner (the table owner) instead.
+CREATE OR REPLACE FUNCTION safety_verdicts_rollup() RETURNS trigger
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO safety_verdict_rollups_hourly AS r
+        (endpoint, bucket, total, threats, sensitive, urgent, risk_sum)
+    SELECT
+        COALESCE(endpoint, ''),
+        date_trunc('hour', created_at),
+        count(*),
+        count(*) FILTER (WHERE threat),
+        count(*) FILTER (WHERE sensitive_request),
+        count(*) FILTER (WHERE COALESCE((verdict_json->>'urgency')::boolean, false)),
+        COALESCE(sum(risk_score), 0)
+    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (endpoint, bucket) DO UPDATE SET
+        total = r.total + EXCLUDED.total,
+        threats = r.threats + EXCLUDED.threats,
+        sensitive = r.sensitive + EXCLUDED.sensitive,
+        urgent = r.urgent + EXCLUDED.urgent,
+        risk_sum = r.risk_sum + EXCLUDED.risk_sum;
+    RETURN NULL;
+END;
+$$;
+ALTER FUNCTION safety_verdicts_rollup() OWNER TO CURRENT_USER;
+REVOKE EXECUTE ON FUNCTION safety_verdicts_rollup() FROM PUBLIC;
+
+DROP TRIGGER IF EXISTS safety_verdicts_rollup_trg ON safety_verdicts;
+CREATE TRIGGER safety_verdicts_rollup_trg
+    AFTER INSERT ON safety_verdicts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION safety_verdicts_rollup();
+
 -- Policies table
 CREATE TABLE IF NOT EXISTS policies (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -0,0 +1,68 @@
+"""
+Tests for the abuse detector's windowed sketches and how its flags reach verdicts.
+"""
+from services.abuse_service import AbuseSignals, WindowedBloomFilter, WindowedCountMinSketch, apply_abuse_signals
+
+T0 = 1000.0  # Start of a 10 s slice for a 60 s window of 6 slices
+
+
+def test_sketch_counts_slide_out_of_the_window():
+    sketch = WindowedCountMinSketch(1024, 4, window_seconds=60)
+    idx = sketch.indexes("10.0.0.1")
+    for second in range(60):
+        sketch.add(idx, T0 + second)
+
+    # At T0+60 the window is slices [1010, 1070): the first slice's 10 events have left
+    assert sketch.estimate(idx, T0 + 60) == 50
+    assert sketch.estimate(idx, T0 + 95) == 20
+    assert sketch.estimate(idx, T0 + 500) == 0
+    assert sketch.add(idx, T0 + 500) == 1
+
+
+def test_sketch_keys_expire_independently():
+    sketch = WindowedCountMinSketch(1024, 4, window_seconds=60)
+    old, new = sketch.indexes("old"), sketch.indexes("new")
+    sketch.add(old, T0)
+    for second in range(0, 70, 5):
+        sketch.add(new, T0 + second)
+
+    assert sketch.estimate(old, T0 + 65) == 0
+    assert sketch.estimate(new, T0 + 65) == 12
+
+
+def test_bloom_filter_forgets_a_key_with_its_slice():
+    bloom = WindowedBloomFilter(window_seconds=60)
+    assert bloom.add("10.0.0.1 /a", T0)
+    assert not bloom.add("10.0.0.1 /a", T0 + 30)
+    assert not bloom.add("10.0.0.1 /a", T0 + 59)
+    # Gone once the slice it was inserted in leaves the window, not at a fixed reset
+    assert bloom.add("10.0.0.1 /a", T0 + 60)
+    assert bloom.add("10.0.0.1 /b", T0 + 60)
+
+
+def test_distinct_paths_are_not_recounted_within_the_window():
+    bloom = WindowedBloomFilter(window_seconds=60)
+    distinct = WindowedCountMinSketch(1024, 4, window_seconds=60)
+    idx = distinct.indexes("10.0.0.1")
+    count = 0
+    # Three paths hit every 5 s for two minutes
+    for second in range(0, 120, 5):
+        for path in ("/a", "/b", "/c"):
+            if bloom.add(f"10.0.0.1 {path}", T0 + second):
+                count = distinct.add(idx, T0 + second)
+            else:
+                count = distinct.estimate(idx, T0 + second)
+            assert count <= 3
+
+
+def test_endpoint_flood_does_not_raise_threat():
+    verdict = {"threat": False, "explanation": "No safety concerns detected"}
+    crowd = AbuseSignals(client_requests=3, endpoint_requests=50000, distinct_paths=1, not_found=0,
+                         flags=["endpoint_flood"])
+    assert apply_abuse_signals(verdict, crowd) == verdict
+
+    flooding = AbuseSignals(client_requests=900, endpoint_requests=50000, distinct_paths=1, not_found=0,
+                            flags=["flood", "endpoint_flood"])
+    result = apply_abuse_signals(verdict, flooding)
+    assert result["threat"] is True
+    assert "client flood" in result["explanation"] and "endpoint flood" not in result["explanation"]
@@ -0,0 +1,73 @@
+"""
+Tests for the Analyzer pipeline's audit sources.
+"""
+import pytest
+from starlette.requests import Request
+
+from services.analyzer import Analyzer
+from services.inflight_service import InflightRegistry
+
+CACHED = {
+    "urgency": False, "threat": True, "sensitive_request": False, "explanation": "Cached LLM verdict",
+    "risk_score": 8, "recommendations": [], "detected_patterns": [],
+}
+
+
+class CachedLLM:
+    """Every prompt is in the cache; a provider call would fail the test."""
+
+    async def cached_safety(self, **kwargs):
+        return dict(CACHED)
+
+    async def analyze_safety(self, **kwargs):
+        raise AssertionError("cache hit went to the provider")
+
+    async def stream_safety(self, **kwargs):
+        raise AssertionError("cache hit went to the provider")
+        yield
+
+
+class RecordingSpool:
+    def __init__(self):
+        self.records = []
+
+    def append(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = Analyzer()
+    analyzer.local_mode = False
+    analyzer.classifier = None
+    analyzer.llm = CachedLLM()
+    analyzer.inflight = InflightRegistry()
+    analyzer.spool = RecordingSpool()
+    return analyzer
+
+
+def make_request():
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "method": "POST", "path": "/analyze-api", "headers": [],
+             "client": ("10.0.0.9", 5000), "query_string": b""}
+    return Request(scope, receive)
+
+
+async def test_cache_hits_are_audited_as_cache(analyzer):
+    inp = analyzer.normalize("POST", "/payments", "send money to my landlord")
+
+    verdict = await analyzer.analyze(make_request(), inp, None, None)
+    streamed = [event async for event in analyzer.stream(make_request(), inp, None, None)]
+
+    assert verdict["threat"] is True
+    assert streamed == [{"event": "verdict", "verdict": verdict}]
+    assert [record["verdict_json"]["source"] for record in analyzer.spool.records] == ["cache", "cache"]
+    assert analyzer.stats["cache_hits"] == 2 and analyzer.stats["llm"] == 0
+
+
+async def test_explorer_reports_the_cache_source(analyzer):
+    inp = analyzer.normalize("POST", "/payments", "send money to my landlord")
+    verdict, source = await analyzer.explore(make_request(), inp, None)
+    assert source == "cache" and verdict["threat"] is True
@@ -0,0 +1,152 @@
+"""
+Tests for the audit spool: the in-memory cap, leases, retention and the disk budget.
+
+The background threads are parked (long intervals, large batches) and the
+spool's steps are driven directly on a connection of the test's own.
+"""
+import time
+
+import pytest
+
+from services import audit_spool
+from services.audit_spool import AuditSpool
+
+
+class Shipper:
+    """Stands in for Supabase: records shipped batches, or fails while `failing`."""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def __call__(self, records):
+        if self.failing:
+            return False
+        self.batches.append([record["id"] for record in records])
+        return True
+
+
+@pytest.fixture
+def shipper():
+    return Shipper()
+
+
+@pytest.fixture
+def make_spool(tmp_path, shipper):
+    spools = []
+
+    def make(**kwargs):
+        spool = AuditSpool(
+            str(tmp_path / f"spool{len(spools)}.sqlite3"), ship=shipper,
+            flush_interval_s=3600, ship_interval_s=3600, batch_size=100000, **kwargs
+        )
+        spools.append(spool)
+        return spool, spool._connect()
+
+    yield make
+    for spool in spools:
+        spool.close()
+
+
+def fill(spool, conn, count, size=10):
+    ids = [spool.append({"intent": "x" * size}, record_id=f"r{i:05d}") for i in range(count)]
+    spool._flush(conn)
+    return ids
+
+
+def rows(conn, where="1 = 1"):
+    return [row[0] for row in conn.execute(f"SELECT id FROM spool WHERE {where} ORDER BY seq")]
+
+
+def test_pending_queue_drops_the_oldest_past_its_cap(make_spool):
+    spool, conn = make_spool(max_pending=3)
+    ids = [spool.append({"n": i}) for i in range(5)]
+
+    stats = spool.snapshot()
+    assert stats["in_memory"] == 3 and stats["dropped_pending"] == 2
+
+    spool._flush(conn)
+    assert rows(conn) == ids[2:]
+
+
+def test_claimed_rows_are_leased_to_one_shipper(make_spool):
+    spool, conn = make_spool(ship_batch_size=2)
+    ids = fill(spool, conn, 3)
+
+    first = spool._claim(conn)
+    other_shipper = spool._claim(spool._connect())
+
+    assert [row[1] for row in first] == ids[:2]
+    assert [row[1] for row in other_shipper] == ids[2:]
+    assert spool._claim(conn) == []
+
+
+def test_expired_lease_is_reclaimed(make_spool, monkeypatch):
+    monkeypatch.setattr(audit_spool, "SHIP_LEASE_S", 0.05)
+    spool, conn = make_spool()
+    ids = fill(spool, conn, 2)
+    assert len(spool._claim(conn)) == 2
+    assert spool._claim(conn) == []
+
+    # The shipper holding the lease died; once it expires another one picks the rows up
+    time.sleep(0.06)
+    assert [row[1] for row in spool._claim(conn)] == ids
+
+
+def test_failed_batch_releases_its_lease(make_spool, shipper):
+    spool, conn = make_spool()
+    ids = fill(spool, conn, 3)
+
+    shipper.failing = True
+    assert spool._ship_unshipped(conn) is False
+    assert rows(conn, "lease_until IS NULL") == ids
+
+    shipper.failing = False
+    assert spool._ship_unshipped(conn) is True
+    assert shipper.batches == [ids]
+    assert rows(conn, "shipped_at IS NULL") == []
+    assert spool.snapshot()["ship_failures"] == 1
+
+
+def test_retention_deletes_only_old_shipped_rows(make_spool):
+    spool, conn = make_spool(retention_s=3600)
+    shipped = fill(spool, conn, 4)
+    spool._ship_unshipped(conn)
+    conn.execute("UPDATE spool SET shipped_at = ? WHERE id IN (?, ?)", (time.time() - 7200, *shipped[:2]))
+    unshipped = [spool.append({"n": i}) for i in range(2)]
+    spool._flush(conn)
+
+    spool._compact(conn)
+
+    assert rows(conn) == shipped[2:] + unshipped
+
+
+def test_disk_budget_drops_shipped_rows_first(make_spool):
+    spool, conn = make_spool(max_bytes=1024 * 1024)
+    shipped = fill(spool, conn, 1000, size=1000)
+    spool._ship_unshipped(conn)
+    unshipped = [spool.append({"intent": "y" * 1000}) for _ in range(200)]
+    spool._flush(conn)
+
+    spool._compact(conn)
+
+    assert rows(conn, "shipped_at IS NULL") == unshipped
+    assert 0 < len(rows(conn, "shipped_at IS NOT NULL")) < len(shipped)
+    # Oldest shipped rows went first
+    assert rows(conn, "shipped_at IS NOT NULL") == shipped[-len(rows(conn, "shipped_at IS NOT NULL")):]
+    assert spool.snapshot()["dropped_unshipped"] == 0
+
+
+def test_disk_budget_drops_the_oldest_unshipped_rows_last(make_spool):
+    spool, conn = make_spool(max_bytes=256 * 1024)
+    fill(spool, conn, 200, size=1000)
+    spool._ship_unshipped(conn)
+    unshipped = [spool.append({"intent": "y" * 1000}) for _ in range(1000)]
+    spool._flush(conn)
+
+    spool._compact(conn)
+
+    kept = rows(conn)
+    assert rows(conn, "shipped_at IS NOT NULL") == []
+    assert kept and kept == unshipped[-len(kept):]
+    assert spool.snapshot()["dropped_unshipped"] == len(unshipped) - len(kept)
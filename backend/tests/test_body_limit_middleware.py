@@ -0,0 +1,192 @@
+"""
+Tests for BodyLimitMiddleware and the streamed scan of oversized analysis requests.
+
+The middleware is driven directly over ASGI so each test controls how the
+body arrives: with or without Content-Length, in which chunks, and whether
+the client disconnects.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from config import settings
+from middleware.body_limit_middleware import BodyLimitMiddleware
+from services.request_scan import RequestScan
+from services.stream_json import StreamJSONError
+
+LIMIT_KB = 1
+
+
+class FakeAnalyzer:
+    """Records the audit records the middleware writes through the app's Analyzer."""
+
+    def __init__(self):
+        self.audited = []
+
+    def normalize(self, method, endpoint, intent):
+        return {"method": method, "endpoint": endpoint, "intent": intent}
+
+    def overlay(self, inp, session, verdict, source, signals):
+        self.audited.append((inp, source))
+        return verdict
+
+
+async def downstream(scope, receive, send):
+    """Stands in for the routes: reads the whole body, then answers 200."""
+    more = True
+    while more:
+        message = await receive()
+        more = message.get("more_body", False)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "BODY_LIMITS_KB", f"/analyze-api={LIMIT_KB},/analyze-api/stream={LIMIT_KB},*={LIMIT_KB}")
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_MB", 1)
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_SECONDS", 5)
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_VALUE_KB", 4096)
+
+
+async def call(path, chunks, content_length=True, disconnect_after=None):
+    """Send `chunks` as one request; returns (status, body, messages read, analyzer)."""
+    analyzer = FakeAnalyzer()
+    headers = [(b"content-type", b"application/json")]
+    if content_length:
+        headers.append((b"content-length", str(sum(len(c) for c in chunks)).encode()))
+    scope = {
+        "type": "http", "method": "POST", "path": path, "headers": headers, "client": ("10.0.0.1", 1234),
+        "query_string": b"", "app": SimpleNamespace(state=SimpleNamespace(analyzer=analyzer)),
+    }
+    pending = list(enumerate(chunks))
+    reads = 0
+
+    async def receive():
+        nonlocal reads
+        reads += 1
+        if not pending or (disconnect_after is not None and reads > disconnect_after):
+            return {"type": "http.disconnect"}
+        i, chunk = pending.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await BodyLimitMiddleware(downstream)(scope, receive, send)
+    status = next((m["status"] for m in sent if m["type"] == "http.response.start"), None)
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, body, reads, analyzer
+
+
+def request_body(intent="list my orders", padding=4096):
+    return json.dumps({
+        "api_spec": {"method": "POST", "endpoint": "/users/password"},
+        "user_intent": intent,
+        "payload": {"card_number": "4111", "notes": "x" * padding},
+    }).encode()
+
+
+def split(body, size=512):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def verdict_of(path, body):
+    if path.endswith("/stream"):
+        line, = body.decode().splitlines()
+        event = json.loads(line)
+        assert event["event"] == "verdict" and "ui_plan" in event
+        return event["verdict"]
+    return json.loads(body)
+
+
+async def test_body_within_limit_passes_through(limits):
+    status, body, _, analyzer = await call("/analyze-api", [b'{"user_intent": "hi"}'])
+    assert (status, body) == (200, b"{}")
+    assert analyzer.audited == []
+
+
+@pytest.mark.parametrize("path", ["/analyze-api", "/analyze-api/stream"])
+@pytest.mark.parametrize("content_length", [True, False], ids=["content-length", "chunked"])
+async def test_oversized_analysis_body_gets_a_scanned_fail_closed_413(limits, path, content_length):
+    status, body, _, analyzer = await call(path, split(request_body()), content_length=content_length)
+
+    assert status == 413
+    verdict = verdict_of(path, body)
+    assert verdict["sensitive_request"] is True and verdict["urgency"] is True
+    assert "over the 1024-byte limit" in verdict["explanation"]
+    assert "whole body" in verdict["explanation"]
+    assert "password" in verdict["explanation"] and "card_number" in verdict["explanation"]
+    assert analyzer.audited == [({"method": "POST", "endpoint": "/users/password", "intent": "list my orders"}, "fail_closed")]
+
+
+async def test_other_routes_get_a_plain_413(limits):
+    status, body, _, analyzer = await call("/generate-ui-plan", split(request_body()), content_length=False)
+    assert status == 413
+    assert json.loads(body)["blocked"] is True
+    assert analyzer.audited == []
+
+
+async def test_scan_stops_at_the_first_threat(limits):
+    chunks = split(request_body(intent="exploit the auth bypass", padding=64 * 1024))
+
+    status, body, reads, _ = await call("/analyze-api", chunks)
+
+    assert status == 413
+    verdict = json.loads(body)
+    assert verdict["threat"] is True
+    assert "stopped at the first threat" in verdict["explanation"]
+    assert reads < len(chunks)
+
+
+async def test_scan_stops_at_the_byte_budget(limits, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_MB", 4 / 1024)  # 4 KB
+    status, body, reads, _ = await call("/analyze-api", split(request_body(padding=64 * 1024), 1024))
+
+    assert status == 413
+    assert "first 4096 bytes; scan limit of" in json.loads(body)["explanation"]
+    assert reads <= 5
+
+
+async def test_scan_stops_at_the_time_budget(limits, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_SECONDS", 0)
+    status, body, _, _ = await call("/analyze-api/stream", split(request_body()))
+
+    assert status == 413
+    assert "scan time limit of 0s reached" in verdict_of("/analyze-api/stream", body)["explanation"]
+
+
+async def test_disconnect_during_scan_sends_nothing_and_audits_nothing(limits):
+    status, body, _, analyzer = await call("/analyze-api", split(request_body(padding=16 * 1024)), disconnect_after=4)
+    assert status is None and body == b""
+    assert analyzer.audited == []
+
+
+async def test_oversized_single_value_stops_the_scan(limits, monkeypatch):
+    monkeypatch.setattr(settings, "ANALYZE_SCAN_MAX_VALUE_KB", 2)
+    status, body, _, _ = await call("/analyze-api", split(request_body(padding=16 * 1024)))
+
+    assert status == 413
+    assert "malformed input: Value over 2048 characters" in json.loads(body)["explanation"]
+
+
+def test_request_scan_raises_on_a_huge_string():
+    scan = RequestScan(max_value_chars=100)
+    scan.feed(b'{"user_intent": "' + b"a" * 90)
+    with pytest.raises(StreamJSONError, match="Value over 100 characters"):
+        scan.feed(b"a" * 20)
+
+
+def test_request_scan_reads_fields_across_chunks():
+    scan = RequestScan(max_value_chars=1024)
+    for chunk in split(request_body(intent="urgent: hack the vault", padding=10), 7):
+        scan.feed(chunk)
+    scan.feed(b"", final=True)
+
+    assert scan.complete
+    assert (scan.method, scan.endpoint, scan.intent_head) == ("POST", "/users/password", "urgent: hack the vault")
+    assert "hack" in scan.threats and scan.urgency
+    assert scan.sensitive_fields == ["password", "card_number"]
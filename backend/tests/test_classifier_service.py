@@ -0,0 +1,52 @@
+"""
+Tests for serving the classifier model file and picking up a retrained one.
+"""
+import os
+
+import numpy as np
+
+from config import settings
+from services.classifier_service import CATEGORIES, ClassifierService
+
+
+def write_model(path, version, bias, bits=4):
+    np.savez(
+        path, weights=np.zeros((1 << bits, len(CATEGORIES)), dtype=np.float32),
+        bias=np.full(len(CATEGORIES), bias, dtype=np.float32), bits=bits, version=version
+    )
+
+
+def test_changed_model_is_loaded_off_the_calling_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_RELOAD_SECONDS", 0)
+    path = str(tmp_path / "model.npz")
+    write_model(path, "v1", bias=-4.0)
+    service = ClassifierService(path)
+    service.reload()
+    assert service.model.version == "v1"
+
+    write_model(path, "v2", bias=4.0)
+    os.utime(path, ns=(1, 1))  # A distinct mtime however fast the rewrite was
+
+    # The caller gets the current model straight away; the new one arrives from the loader
+    assert service.current_model().version == "v1"
+    service._loader.join(5)
+    assert service.current_model().version == "v2"
+    assert service.classify("GET /x", "hello").flags() == {c: True for c in CATEGORIES}
+    assert service.stats["reloads"] == 2
+
+
+def test_bad_file_keeps_the_loaded_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CLASSIFIER_RELOAD_SECONDS", 0)
+    path = str(tmp_path / "model.npz")
+    write_model(path, "v1", bias=0.0)
+    service = ClassifierService(path)
+    service.reload()
+
+    with open(path, "wb") as f:
+        f.write(b"not a model")
+    os.utime(path, ns=(1, 1))
+    service.current_model()
+    service._loader.join(5)
+
+    assert service.current_model().version == "v1"
+    assert service.stats["load_errors"] == 1
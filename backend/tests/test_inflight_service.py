@@ -0,0 +1,131 @@
+"""
+Tests for cancelling LLM work nobody is waiting for, on the streaming analysis path.
+"""
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from services.admission_service import get_admission_controller
+from services.analyzer import Analyzer
+from services.inflight_service import InflightRegistry, RequestCancelled, drain_while
+
+
+class HangingLLM:
+    """Streams a lockdown, then waits for the rest of the output until cancelled."""
+
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+        self.locked_down = asyncio.Event()
+
+    async def cached_safety(self, **kwargs):
+        return None
+
+    async def stream_safety(self, **kwargs):
+        yield {"event": "lockdown", "verdict": {"threat": True}}
+        self.locked_down.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+class RecordingSpool:
+    def __init__(self):
+        self.records = []
+
+    def append(self, record):
+        self.records.append(record)
+
+
+def make_request(disconnected: asyncio.Event, supersede_key=None):
+    headers = [(b"x-supersede-key", supersede_key.encode())] if supersede_key else []
+    scope = {"type": "http", "method": "POST", "path": "/analyze-api/stream", "headers": headers,
+             "client": ("10.0.0.9", 5000), "query_string": b""}
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    return Request(scope, receive)
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = Analyzer()
+    analyzer.local_mode = False
+    analyzer.classifier = None
+    analyzer.llm = HangingLLM()
+    analyzer.inflight = InflightRegistry()
+    analyzer.spool = RecordingSpool()
+    return analyzer
+
+
+async def collect(analyzer, request, events):
+    inp = analyzer.normalize("POST", "/payments", "send money to my landlord")
+    async for event in analyzer.stream(request, inp, None, None):
+        events.append(event)
+
+
+async def test_disconnect_cancels_the_streamed_llm_call_without_auditing(analyzer):
+    disconnected = asyncio.Event()
+    in_flight = get_admission_controller().limiter.in_flight
+    events = []
+    task = asyncio.create_task(collect(analyzer, make_request(disconnected), events))
+    await asyncio.wait_for(analyzer.llm.locked_down.wait(), 1)
+
+    disconnected.set()
+    with pytest.raises(RequestCancelled, match="client disconnected"):
+        await asyncio.wait_for(task, 1)
+
+    assert analyzer.llm.cancelled.is_set()
+    assert [event["event"] for event in events] == ["lockdown"]
+    assert analyzer.spool.records == []
+    assert analyzer.inflight.stats["cancelled_disconnected"] == 1
+    assert get_admission_controller().limiter.in_flight == in_flight
+
+
+async def test_newer_stream_supersedes_the_older_one(analyzer):
+    never = asyncio.Event()
+    older = asyncio.create_task(collect(analyzer, make_request(never, "typing"), []))
+    await asyncio.wait_for(analyzer.llm.locked_down.wait(), 1)
+
+    first_llm, analyzer.llm = analyzer.llm, HangingLLM()
+    newer = asyncio.create_task(collect(analyzer, make_request(never, "typing"), []))
+    with pytest.raises(RequestCancelled, match="superseded"):
+        await asyncio.wait_for(older, 1)
+
+    assert first_llm.cancelled.is_set()
+    await asyncio.wait_for(analyzer.llm.locked_down.wait(), 1)
+    newer.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await newer
+    await asyncio.wait_for(analyzer.llm.cancelled.wait(), 1)
+    assert analyzer.spool.records == []
+
+
+async def test_abandoned_stream_cancels_the_llm_call(analyzer):
+    never = asyncio.Event()
+    inp = analyzer.normalize("POST", "/payments", "send money")
+    stream = analyzer.stream(make_request(never), inp, None, None)
+
+    assert (await stream.__anext__())["event"] == "lockdown"
+    await stream.aclose()
+    await asyncio.wait_for(analyzer.llm.cancelled.wait(), 1)
+    assert analyzer.spool.records == []
+
+
+async def test_drain_while_passes_events_on_then_the_rest():
+    queue = asyncio.Queue()
+
+    async def work():
+        queue.put_nowait(1)
+        await asyncio.sleep(0.01)
+        queue.put_nowait(2)
+        queue.put_nowait(3)
+        return "done"
+
+    task = asyncio.ensure_future(work())
+    assert [item async for item in drain_while(task, queue)] == [1, 2, 3]
+    assert task.result() == "done"
@@ -0,0 +1,91 @@
+"""
+Tests for the chat session ratchet: delta analysis, folding turns and repeat detection.
+"""
+from services.session_service import AnalysisSession, SessionStore
+
+SPEC = "POST /users/password"
+
+
+def turn(session, intent, verdict=None, fold=True, spec=SPEC):
+    """Analyze a turn with the session's rules and record it, as the rules path does."""
+    rules = session.analyze_delta(spec, intent)
+    return session.record_turn(spec, intent, verdict or rules, fold=fold)
+
+
+def test_flags_never_go_from_true_to_false():
+    session = AnalysisSession("s")
+    first = turn(session, "urgent: hack the admin account")
+    assert first["threat"] and first["urgency"] and first["sensitive_request"]
+
+    later = turn(session, "thanks, show my orders", verdict={"urgency": False, "threat": False,
+                                                             "sensitive_request": False, "explanation": "fine"})
+    assert later["threat"] and later["urgency"] and later["sensitive_request"]
+    assert "Session verdict held from earlier turns: urgency, threat, sensitive_request" in later["explanation"]
+    assert session.verdict == {"urgency": True, "threat": True, "sensitive_request": True}
+
+
+def test_threats_in_earlier_turns_stay_in_the_rules_verdict():
+    session = AnalysisSession("s")
+    turn(session, "try an injection on the login")
+    verdict = session.analyze_delta(SPEC, "list my orders")
+    assert verdict["threat"] is True
+    assert "injection" in verdict["explanation"]
+
+
+def test_analyze_delta_does_not_change_the_session():
+    session = AnalysisSession("s")
+    session.analyze_delta(SPEC, "exploit the bypass")
+    assert session.threats == set() and session.sensitive_fields == set()
+    assert session.turns == 0 and session.spec_digest is None
+
+    assert session.analyze_delta("GET /orders", "list my orders")["threat"] is False
+
+
+def test_unfolded_turn_leaves_no_trace():
+    session = AnalysisSession("s")
+    turn(session, "list my orders", spec="GET /orders")
+
+    strict = {"urgency": True, "threat": False, "sensitive_request": True, "explanation": "LLM analysis failed"}
+    answered = turn(session, "exploit the bypass", verdict=strict, fold=False)
+
+    # This turn is answered strictly...
+    assert answered["urgency"] and answered["sensitive_request"]
+    # ...but neither its flags nor its matches are kept
+    assert session.turns == 1
+    assert session.verdict == {"urgency": False, "threat": False, "sensitive_request": False}
+    assert session.threats == set() and session.sensitive_fields == set()
+    assert session.analyze_delta("GET /orders", "list my orders")["threat"] is False
+    # A retry of the failed message is analyzed again, not answered as a repeat
+    assert not session.is_repeat(SPEC, "exploit the bypass")
+    assert "exploit the bypass" not in (session.context() or "")
+
+
+def test_folded_turn_commits_its_matches():
+    session = AnalysisSession("s")
+    turn(session, "exploit the bypass")
+    assert session.threats == {"exploit", "bypass"}
+    assert session.sensitive_fields == {"password"}
+    assert "Signals so far: bypass, exploit, password" in session.context()
+
+
+def test_repeat_detection():
+    session = AnalysisSession("s")
+    assert not session.is_repeat(SPEC, "Show my orders")
+    turn(session, "Show my orders")
+
+    assert session.is_repeat(SPEC, "  show my ORDERS ")
+    assert not session.is_repeat(SPEC, "show my invoices")
+    assert not session.is_repeat("GET /orders", "show my orders")
+    assert session.current_verdict()["explanation"].endswith("Unchanged since previous turn")
+
+
+def test_store_scopes_sessions_to_clients_and_resets():
+    store = SessionStore(max_sessions=10, idle_seconds=60)
+    mine = store.get("client-a", "chat")
+    turn(mine, "hack it")
+
+    assert store.get("client-a", "chat") is mine
+    assert store.get("client-b", "chat") is not mine
+    fresh = store.get("client-a", "chat", reset=True)
+    assert fresh is not mine and fresh.verdict["threat"] is False
+    assert store.snapshot()["resets"] == 1
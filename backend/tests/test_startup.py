@@ -0,0 +1,50 @@
+"""
+Cold-start budget: importing main must stay fast and must not pull in provider/storage SDKs.
+
+Each check runs in a fresh interpreter, since this process has already imported the app.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Generous for a slow CI box; `python -m bench.startup --budget-ms` is the tighter local check
+IMPORT_BUDGET_MS = 1500
+RUNS = 3
+
+# Loaded on first use by LLMService, SupabaseService and ClassifierService, never at import
+LAZY_MODULES = ("openai", "supabase", "postgrest", "google.generativeai", "numpy")
+
+PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "print(json.dumps({'ms': (time.perf_counter() - started) * 1000, 'modules': sorted(sys.modules)}))\n"
+)
+
+
+def _import_main(local_mode: str) -> dict:
+    env = {**os.environ, "LOCAL_MODE": local_mode}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("local_mode", ["1", "0"])
+def test_import_main_within_budget_and_without_sdks(local_mode):
+    runs = [_import_main(local_mode) for _ in range(RUNS)]
+
+    fastest = min(run["ms"] for run in runs)
+    assert fastest < IMPORT_BUDGET_MS, f"import main took {fastest:.0f}ms, budget {IMPORT_BUDGET_MS}ms"
+
+    loaded = sorted({
+        name for name in runs[0]["modules"]
+        for root in LAZY_MODULES if name == root or name.startswith(root + ".")
+    })
+    assert loaded == [], f"imported at startup: {', '.join(loaded)}"
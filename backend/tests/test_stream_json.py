@@ -0,0 +1,169 @@
+"""
+Tests for the incremental JSON parser and the streaming safety analysis built on it.
+"""
+import json
+
+import pytest
+
+from services.llm_service import LLMService
+from services.stream_json import JSONStreamParser, StreamEvent, StreamJSONError
+
+DOCUMENT = json.dumps({
+    "threat": True,
+    "explanation": 'He said "drop table" \\ twice é',
+    "risk_score": 9,
+    "ratio": -12.5e-3,
+    "recommendations": ["block", {"nested": [1, None, False]}],
+})
+
+
+def parse(chunks):
+    parser = JSONStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    return events
+
+
+def values(events):
+    return {event.path: event.value for event in events if event.kind == "value"}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(DOCUMENT)])
+def test_any_chunking_gives_the_same_events(size):
+    whole = parse([DOCUMENT])
+    chunked = parse([DOCUMENT[i:i + size] for i in range(0, len(DOCUMENT), size)])
+
+    assert chunked == whole
+    assert values(whole) == {
+        ("threat",): True,
+        ("explanation",): 'He said "drop table" \\ twice é',
+        ("risk_score",): 9,
+        ("ratio",): -12.5e-3,
+        ("recommendations", 0): "block",
+        ("recommendations", 1, "nested", 0): 1,
+        ("recommendations", 1, "nested", 1): None,
+        ("recommendations", 1, "nested", 2): False,
+    }
+    assert whole[-1] == StreamEvent("end", ())
+
+
+def test_escape_split_across_chunks():
+    # The backslash ends one chunk and the quote it escapes starts the next
+    assert values(parse(['{"a": "x\\', '"y"}'])) == {("a",): 'x"y'}
+    assert values(parse(['{"a": "\\u00', 'e9\\\\', '"}'])) == {("a",): "é\\"}
+
+
+def test_number_split_across_chunks_waits_for_a_delimiter():
+    parser = JSONStreamParser()
+    assert values(parser.feed('{"n": 1')) == {}
+    assert values(parser.feed("2.5e")) == {}
+    assert values(parser.feed("3,")) == {("n",): 12500.0}
+
+    top_level = JSONStreamParser()
+    assert top_level.feed("42") == []
+    assert top_level.close() == [StreamEvent("value", (), 42), StreamEvent("end", ())]
+
+
+def test_threat_is_reported_before_the_document_ends():
+    parser = JSONStreamParser()
+    events = parser.feed('{"threat": true, "explanation": "Long text that has not fin')
+
+    assert StreamEvent("value", ("threat",), True) in events
+    assert not parser.done
+    assert parser.pending > 0
+
+
+def test_truncated_input_raises_on_close():
+    for truncated in ['{"threat": true', '{"a": "unterminated', '[1, 2', '{"a":', "tru"]:
+        parser = JSONStreamParser()
+        parser.feed(truncated)
+        with pytest.raises(StreamJSONError):
+            parser.close()
+
+
+def test_trailing_data_raises():
+    parser = JSONStreamParser()
+    parser.feed('{"a": 1}  \n')
+    with pytest.raises(StreamJSONError, match="Extra data"):
+        parser.feed('{"b": 2}')
+
+
+@pytest.mark.parametrize("text", ['{"a" 1}', '{"a": 1,}', "[1 2]", '{"a": tru}', '{"a": 1]', "nul,"])
+def test_malformed_input_raises_when_detectable(text):
+    with pytest.raises(StreamJSONError):
+        parse([text])
+
+
+def test_depth_limit():
+    parser = JSONStreamParser(max_depth=3)
+    with pytest.raises(StreamJSONError, match="nested too deeply"):
+        parser.feed("[[[[")
+
+
+class StreamingLLM(LLMService):
+    """LLMService whose provider stream is a fixed list of chunks; records how far it was read."""
+
+    def __init__(self, chunks):
+        self.provider = "fake"
+        self.chunks = chunks
+        self.sent = 0
+
+    async def _stream_complete(self, system_prompt, prompt, temperature):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+
+async def collect(llm):
+    events = []
+    async for event in llm.stream_safety("spec", "intent", [], {"q": "x"}):
+        events.append((event, llm.sent))
+    return events
+
+
+async def test_stream_safety_locks_down_before_the_verdict():
+    chunks = ['{"threat": tr', 'ue, "risk_score": 9, ', '"explanation": "injection"', "}"]
+    llm = StreamingLLM(chunks)
+
+    events = await collect(llm)
+
+    (lockdown, read_at_lockdown), (verdict, _) = events
+    assert lockdown == {"event": "lockdown", "verdict": {"threat": True}}
+    assert read_at_lockdown == 2  # Emitted while the provider was still streaming
+    assert verdict["event"] == "verdict"
+    assert verdict["verdict"]["threat"] is True
+    assert verdict["verdict"]["risk_score"] == 9
+    assert verdict["verdict"]["explanation"] == "injection"
+
+
+async def test_stream_safety_without_threat_sends_only_the_verdict():
+    llm = StreamingLLM(['{"threat": false, "risk_score": 2', ', "explanation": "ok"}'])
+
+    events = [event for event, _ in await collect(llm)]
+
+    assert [event["event"] for event in events] == ["verdict"]
+    assert events[0]["verdict"]["threat"] is False
+
+
+@pytest.mark.parametrize("chunks", [
+    ['{"threat": false, "risk_score": 2', ', "explanation": '],  # Truncated
+    ['{"threat": false} trailing'],
+    ["not json"],
+])
+async def test_stream_safety_fails_closed_on_malformed_output(chunks):
+    events = [event for event, _ in await collect(StreamingLLM(chunks))]
+
+    assert [event["event"] for event in events] == ["verdict"]
+    verdict = events[0]["verdict"]
+    assert "analysis_error" in verdict["detected_patterns"]
+    assert verdict["sensitive_request"] is True and verdict["threat"] is False
+
+
+async def test_stream_safety_keeps_a_threat_seen_before_the_output_broke():
+    events = [event for event, _ in await collect(StreamingLLM(['{"threat": true, "explanation": "cut']))]
+
+    assert [event["event"] for event in events] == ["lockdown", "verdict"]
+    assert events[1]["verdict"]["threat"] is True
+    assert "analysis_error" in events[1]["verdict"]["detected_patterns"]
@@ -0,0 +1,237 @@
+"""
+Train the local safety classifier (services/classifier_service.py).
+
+Labels come from audited verdicts. By default only verdicts the LLM
+produced (verdict_json.source == "llm") are used, so the model learns the
+LLM's judgement rather than the keyword rules'. Fail-closed verdicts are
+never used, including ones audited as "llm" before they had their own
+source (recognized by their explanation). Neither are cache hits ("cache"),
+which repeat a label the LLM already gave for the same input and would
+weight popular inputs by their traffic. Sources:
+
+    supabase   safety_verdicts joined with api_specs.spec_text (query_verdicts)
+    spool      the local audit spool (AUDIT_SPOOL_PATH), shipped or not
+    dataset    a labeled JSONL file in the bench/evaluate.py format
+
+The model is written as models/safety_classifier-<version>.npz and then
+atomically copied over CLASSIFIER_MODEL_PATH, which running workers reload
+on their next mtime check. Roll back by copying an older version over it.
+
+Usage:
+    python train_classifier.py --source supabase --since 2026-09-01T00:00:00Z
+    python train_classifier.py --source dataset --dataset bench/data/eval_sample.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from config import settings
+from services.classifier_service import CATEGORIES, LinearModel, extract_features, feature_indexes
+from services.llm_service import FAILED_ANALYSIS_PREFIX
+from services.supabase_service import VERDICT_AUDIT_COLUMNS
+
+Example = Dict[str, Any]  # api_spec, user_intent, payload_keys, labels
+
+
+def _from_audit_row(spec_text: str, user_intent: str, verdict: Dict[str, Any], all_sources: bool) -> Optional[Example]:
+    source = verdict.get("source")
+    if source in ("fail_closed", "cache") or (not all_sources and source != "llm"):
+        return None
+    if str(verdict.get("explanation", "")).startswith(FAILED_ANALYSIS_PREFIX):
+        return None  # Conservative all-flags verdict, not a label
+    return {
+        "api_spec": spec_text or "",
+        "user_intent": user_intent or "",
+        "payload_keys": [],
+        "labels": {c: bool(verdict.get(c, False)) for c in CATEGORIES},
+    }
+
+
+def load_supabase(since: Optional[str], limit: int, all_sources: bool) -> Iterator[Example]:
+    from services.supabase_service import get_supabase_service
+
+    service = get_supabase_service()
+    after = None
+    seen = 0
+    while seen < limit:
+        rows = service.query_verdicts(
+            limit=min(1000, limit - seen), after=after, since=since,
+            columns=VERDICT_AUDIT_COLUMNS + ",api_specs(spec_text)"
+        )
+        if rows is None:
+            raise RuntimeError("Querying safety_verdicts failed (see log)")
+        if not rows:
+            return
+        for row in rows:
+            spec = (row.get("api_specs") or {}).get("spec_text", "")
+            example = _from_audit_row(spec, row.get("user_intent"), row.get("verdict_json") or {}, all_sources)
+            if example:
+                yield example
+        seen += len(rows)
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def load_spool(path: str, all_sources: bool) -> Iterator[Example]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        for (payload,) in conn.execute("SELECT payload FROM spool ORDER BY seq"):
+            record = json.loads(payload)
+            example = _from_audit_row(
+                record["api_spec"]["spec_text"], record["user_intent"], record["verdict_json"], all_sources
+            )
+            if example:
+                yield example
+    finally:
+        conn.close()
+
+
+def load_dataset(path: str) -> Iterator[Example]:
+    from bench.evaluate import load_dataset as load_labeled
+
+    for item in load_labeled(path):
+        yield {
+            "api_spec": f"{item['api_spec']['method']} {item['api_spec']['endpoint']}",
+            "user_intent": item["user_intent"],
+            "payload_keys": list((item.get("payload") or {}).keys()),
+            "labels": item["labels"],
+        }
+
+
+def _rows(examples: List[Example], bits: int) -> List[List[int]]:
+    return [
+        feature_indexes(extract_features(e["api_spec"], e["user_intent"], e["payload_keys"]), bits)
+        for e in examples
+    ]
+
+
+def train(
+    rows: List[List[int]],
+    labels: "np.ndarray",
+    bits: int,
+    epochs: int,
+    learning_rate: float,
+    l2: float,
+    batch_size: int,
+    seed: int
+):
+    """Logistic regression per category, Adagrad over sparse binary features."""
+    rng = np.random.default_rng(seed)
+    weights = np.zeros((1 << bits, len(CATEGORIES)), dtype=np.float32)
+    bias = np.zeros(len(CATEGORIES), dtype=np.float32)
+    g_weights = np.full_like(weights, 1e-8)
+    g_bias = np.full_like(bias, 1e-8)
+
+    for _ in range(epochs):
+        order = rng.permutation(len(rows))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            lengths = np.array([len(rows[i]) for i in batch])
+            flat = np.concatenate([rows[i] for i in batch])
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+            logits = np.add.reduceat(weights[flat], offsets, axis=0) + bias
+            error = 1.0 / (1.0 + np.exp(-logits)) - labels[batch]
+
+            # Gradient only for the buckets this batch touched
+            touched, inverse = np.unique(flat, return_inverse=True)
+            grad = np.zeros((len(touched), len(CATEGORIES)), dtype=np.float32)
+            np.add.at(grad, inverse, np.repeat(error, lengths, axis=0))
+            grad = grad / len(batch) + l2 * weights[touched]
+            g_weights[touched] += grad ** 2
+            weights[touched] -= learning_rate * grad / np.sqrt(g_weights[touched])
+
+            grad_bias = error.mean(axis=0)
+            g_bias += grad_bias ** 2
+            bias -= learning_rate * grad_bias / np.sqrt(g_bias)
+    return weights, bias
+
+
+def save_model(weights: "np.ndarray", bias: "np.ndarray", bits: int, version: str, n_examples: int) -> str:
+    """Write the versioned file, then atomically replace CLASSIFIER_MODEL_PATH with it."""
+    target = settings.CLASSIFIER_MODEL_PATH
+    directory = os.path.dirname(target) or "."
+    os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(target))
+    versioned = os.path.join(directory, f"{stem}-{version}{ext or '.npz'}")
+    with open(versioned, "wb") as f:
+        np.savez(
+            f, weights=weights, bias=bias, bits=np.int64(bits), version=np.str_(version),
+            n_examples=np.int64(n_examples)
+        )
+    LinearModel.load(versioned)  # Refuse to publish a file the service can't load
+
+    tmp = f"{target}.tmp"
+    shutil.copyfile(versioned, tmp)
+    os.replace(tmp, target)
+    return versioned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train the local safety classifier from audited verdicts")
+    parser.add_argument("--source", default="supabase", choices=["supabase", "spool", "dataset"])
+    parser.add_argument("--since", help="supabase: only verdicts created at or after this ISO timestamp")
+    parser.add_argument("--limit", type=int, default=200000, help="supabase: maximum rows to read")
+    parser.add_argument("--spool-path", default=settings.AUDIT_SPOOL_PATH)
+    parser.add_argument("--dataset", help="dataset: labeled JSONL file")
+    parser.add_argument("--all-sources", action="store_true",
+                        help="Also learn from rules and classifier verdicts (not just the LLM's)")
+    parser.add_argument("--bits", type=int, default=18, help="Feature buckets = 2**bits")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of examples held out for scoring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true", help="Train and score without publishing the model")
+    args = parser.parse_args()
+
+    if args.source == "supabase":
+        examples = list(load_supabase(args.since, args.limit, args.all_sources))
+    elif args.source == "spool":
+        examples = list(load_spool(args.spool_path, args.all_sources))
+    else:
+        if not args.dataset:
+            parser.error("--source dataset needs --dataset")
+        examples = list(load_dataset(args.dataset))
+    if not examples:
+        raise SystemExit("No usable examples (LLM verdicts carry source=llm; see --all-sources)")
+
+    random.Random(args.seed).shuffle(examples)
+    n_holdout = int(len(examples) * args.holdout) if len(examples) >= 10 else 0
+    holdout, training = examples[:n_holdout], examples[n_holdout:]
+    print(f"[train] {len(training)} training and {len(holdout)} holdout examples from {args.source}")
+
+    rows = _rows(training, args.bits)
+    labels = np.array([[e["labels"][c] for c in CATEGORIES] for e in training], dtype=np.float32)
+    started = time.perf_counter()
+    weights, bias = train(rows, labels, args.bits, args.epochs, args.learning_rate, args.l2, args.batch_size, args.seed)
+    print(f"[train] {args.epochs} epochs in {time.perf_counter() - started:.1f}s")
+
+    version = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    if holdout:
+        from bench.evaluate import score
+
+        model = LinearModel(weights, bias, args.bits, version)
+        probabilities = model.score_batch(_rows(holdout, args.bits))
+        items = [{"id": str(i), "labels": e["labels"]} for i, e in enumerate(holdout)]
+        predictions = [{c: bool(p >= 0.5) for c, p in zip(CATEGORIES, row)} for row in probabilities.tolist()]
+        for category, result in score(items, predictions).items():
+            if category != "any":
+                print(f"[train] holdout {category:<18} precision {result['precision']}  recall {result['recall']}")
+
+    if args.dry_run:
+        print("[train] Dry run; model not published")
+        return
+    versioned = save_model(weights, bias, args.bits, version, len(training))
+    print(f"[train] Model {version} written to {versioned} and published as {settings.CLASSIFIER_MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()